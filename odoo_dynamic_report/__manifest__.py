@@ -48,6 +48,7 @@
         # Data
         'data/report_paperformat.xml',
         'data/default_templates.xml',
+        'data/ir_cron.xml',
         
         # Views
         'views/report_template_views.xml',
@@ -55,9 +56,11 @@
         
         # Wizard
         'wizard/report_preview_wizard_views.xml',
+        'wizard/report_bulk_print_wizard_views.xml',
     ],
     'assets': {
         'web.assets_backend': [
+            'odoo_dynamic_report/static/src/js/field_catalog.js',
             'odoo_dynamic_report/static/src/js/template_designer.js',
             'odoo_dynamic_report/static/src/js/field_selector.js',
             'odoo_dynamic_report/static/src/css/template_designer.css',
@@ -3,7 +3,9 @@
 
 from odoo import http
 from odoo.http import request, Response
+from werkzeug.wsgi import wrap_file
 import json
+import tempfile
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -12,14 +14,27 @@ _logger = logging.getLogger(__name__)
 class ReportTemplateController(http.Controller):
 
     @http.route('/report_template/get_model_fields', type='json', auth='user')
-    def get_model_fields(self, model_name, include_related=True, max_depth=2):
-        """Get all fields for a given model"""
+    def get_model_fields(self, model_name, include_related=True, max_depth=2, version=None):
+        """Get all fields for a given model
+
+        Clients send the version of the fields they have cached; the fields
+        are only returned when it is outdated.
+        """
         try:
             parser = request.env['report.parser']
+            current = parser.get_fields_version(model_name, include_related, max_depth)
+            if version and version == current:
+                return {
+                    'success': True,
+                    'version': current,
+                    'not_modified': True,
+                }
+            
             fields = parser.get_available_fields(model_name, include_related, max_depth)
             
             return {
                 'success': True,
+                'version': current,
                 'fields': fields
             }
         except Exception as e:
@@ -72,9 +87,39 @@ class ReportTemplateController(http.Controller):
                 'error': str(e)
             }
 
+    @http.route('/report_template/upload', type='http', auth='user', methods=['POST'])
+    def upload_template(self, template_id, ufile, **kwargs):
+        """Store an uploaded template file and return placeholder information
+
+        The file is sent as multipart form data, so it is received as is
+        instead of base64 encoded in a JSON-RPC call, and is parsed and
+        stored from its stream.
+        """
+        try:
+            template = request.env['report.template'].browse(int(template_id))
+            
+            if not template.exists():
+                return request.not_found()
+            
+            result = template._upload_template_file(ufile.stream, ufile.filename)
+            
+            return request.make_json_response({
+                'success': True,
+                **result
+            })
+        except Exception as e:
+            _logger.exception("Error uploading template")
+            return request.make_json_response({
+                'success': False,
+                'error': str(e)
+            })
+
     @http.route('/report_template/preview', type='http', auth='user')
-    def preview_template(self, template_id, record_id=None, **kwargs):
-        """Generate preview of template"""
+    def preview_template(self, template_id, record_id=None, full=None, **kwargs):
+        """Generate preview of template
+
+        Loops and the body are cut in the preview unless full is set.
+        """
         try:
             template = request.env['report.template'].browse(int(template_id))
             
@@ -82,22 +127,19 @@ class ReportTemplateController(http.Controller):
                 return request.not_found()
             
             # Get sample record
-            if record_id:
-                record_ids = [int(record_id)]
-            else:
-                # Get first available record
-                model = request.env[template.model_name]
-                sample_record = model.search([], limit=1)
-                if not sample_record:
-                    return Response(
-                        json.dumps({'error': 'No records found'}),
-                        content_type='application/json',
-                        status=404
-                    )
-                record_ids = [sample_record.id]
+            record_id = self._get_preview_record_id(template, record_id)
+            if not record_id:
+                return Response(
+                    json.dumps({'error': 'No records found'}),
+                    content_type='application/json',
+                    status=404
+                )
+            record_ids = [record_id]
             
             # Generate report
             generator = request.env['report.docx.generator']
+            if not full:
+                generator = generator._with_preview_limits()
             docx_content = generator.generate_report(template, record_ids)
             
             # Return as download
@@ -118,6 +160,48 @@ class ReportTemplateController(http.Controller):
                 status=500
             )
 
+    @http.route('/report_template/preview_html', type='json', auth='user')
+    def preview_template_html(self, template_id, record_id=None, refresh=False):
+        """Render template with a sample record as HTML for inline display
+
+        Cached previews are rendered again when refresh is set.
+        """
+        try:
+            template = request.env['report.template'].browse(int(template_id))
+            
+            if not template.exists() or not template.template_data:
+                return {
+                    'success': False,
+                    'error': 'Template not found or has no data'
+                }
+            
+            record_id = self._get_preview_record_id(template, record_id)
+            if not record_id:
+                return {
+                    'success': False,
+                    'error': 'No records found'
+                }
+            
+            generator = request.env['report.docx.generator']
+            return {
+                'success': True,
+                'record_id': record_id,
+                'html': generator.render_preview_html(template, record_id, refresh=bool(refresh)),
+            }
+        except Exception as e:
+            _logger.exception("Error generating preview")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def _get_preview_record_id(self, template, record_id=None):
+        """Return the given record ID, or the first record of the template model"""
+        if record_id:
+            return int(record_id)
+        sample_record = request.env[template.model_name].search([], limit=1)
+        return sample_record.id
+
     @http.route('/report_template/download/<int:template_id>', type='http', auth='user')
     def download_template(self, template_id, **kwargs):
         """Download the template file"""
@@ -144,7 +228,7 @@ class ReportTemplateController(http.Controller):
             return request.not_found()
 
     @http.route('/report_template/generate', type='http', auth='user')
-    def generate_report(self, template_id, record_ids, **kwargs):
+    def generate_report(self, template_id, record_ids, output_mode=None, **kwargs):
         """Generate report for specific records"""
         try:
             template = request.env['report.template'].browse(int(template_id))
@@ -158,22 +242,139 @@ class ReportTemplateController(http.Controller):
             elif not isinstance(record_ids, list):
                 record_ids = [int(record_ids)]
             
+            if (output_mode or template.output_mode) == 'zip':
+                return self._generate_report_zip(template, record_ids)
+            
             # Generate report
             generator = request.env['report.docx.generator']
-            docx_content = generator.generate_report(template, record_ids)
+            response = self._docx_response(
+                f"{template.name}.docx",
+                lambda output: generator.generate_report(template, record_ids, output),
+            )
             
             # Increment usage
             template.increment_usage()
             
-            # Return as download
-            filename = f"{template.name}.docx"
-            return request.make_response(
-                docx_content,
-                headers=[
-                    ('Content-Type', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
-                    ('Content-Disposition', f'attachment; filename="{filename}"')
-                ]
+            return response
+            
+        except Exception as e:
+            _logger.exception("Error generating report")
+            return Response(
+                json.dumps({'error': str(e)}),
+                content_type='application/json',
+                status=500
             )
+
+    def _generate_report_zip(self, template, record_ids):
+        """Stream a ZIP archive with one document per record"""
+        generator = request.env['report.docx.generator']
+        response = self._zip_response(
+            f"{template.name}.zip",
+            lambda output: generator.generate_report_zip(template, record_ids, output),
+        )
+        
+        # Increment usage
+        template.increment_usage()
+        
+        return response
+
+    def _zip_response(self, filename, write):
+        """Return a download of the archive written by write(output)"""
+        return self._file_response(filename, 'application/zip', write)
+
+    def _docx_response(self, filename, write):
+        """Return a download of the document written by write(output)"""
+        return self._file_response(
+            filename,
+            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+            write,
+        )
+
+    def _file_response(self, filename, content_type, write):
+        """Return a download of the file written by write(output)
+
+        The file is written to a temporary file streamed to the client,
+        rather than held in memory.
+        """
+        output = tempfile.TemporaryFile()
+        try:
+            write(output)
+        except Exception:
+            output.close()
+            raise
+        size = output.tell()
+        output.seek(0)
+        return request.make_response(
+            wrap_file(request.httprequest.environ, output),
+            headers=[
+                ('Content-Type', content_type),
+                ('Content-Length', str(size)),
+                ('Content-Disposition', f'attachment; filename="{filename}"')
+            ]
+        )
+
+    @http.route('/report_template/generate_pack', type='http', auth='user')
+    def generate_report_pack(self, template_ids, record_ids, output_mode='merged', **kwargs):
+        """Generate the reports of several templates for the same records"""
+        try:
+            templates = request.env['report.template'].browse(
+                [int(tid) for tid in template_ids.split(',')]
+            ).exists()
+            
+            if not templates:
+                return request.not_found()
+            
+            record_ids = [int(rid) for rid in record_ids.split(',')]
+            
+            # Generate all reports from one prefetch
+            generator = request.env['report.docx.generator']
+            response = self._zip_response(
+                "documents.zip",
+                lambda output: generator.generate_report_pack(templates, record_ids, output_mode, output),
+            )
+            
+            # Increment usage
+            for template in templates:
+                template.increment_usage()
+            
+            return response
+            
+        except Exception as e:
+            _logger.exception("Error generating report pack")
+            return Response(
+                json.dumps({'error': str(e)}),
+                content_type='application/json',
+                status=500
+            )
+
+    @http.route('/report_template/generate_domain', type='http', auth='user')
+    def generate_report_domain(self, wizard_id, **kwargs):
+        """Generate report for the records matching a bulk print wizard domain"""
+        try:
+            wizard = request.env['report.bulk.print.wizard'].browse(int(wizard_id))
+            
+            if not wizard.exists():
+                return request.not_found()
+            
+            template = wizard.template_id
+            
+            # Generate report, reading matching ids in chunks
+            generator = request.env['report.docx.generator']
+            response = self._docx_response(
+                f"{template.name}.docx",
+                lambda output: generator.generate_report_domain(
+                    template,
+                    wizard._get_domain(),
+                    order=wizard.order or None,
+                    limit=wizard.limit or None,
+                    output=output,
+                ),
+            )
+            
+            # Increment usage
+            template.increment_usage()
+            
+            return response
             
         except Exception as e:
             _logger.exception("Error generating report")
@@ -4,3 +4,5 @@
 from . import report_template
 from . import report_field_mapping
 from . import ir_actions_report
+from . import report_prerendered_document
+from . import report_template_cost
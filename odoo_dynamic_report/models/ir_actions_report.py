@@ -3,10 +3,15 @@
 
 from odoo import models, api, _
 from odoo.exceptions import UserError
+from odoo.tools import split_every
+from odoo.tools.pdf import merge_pdf
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Documents converted to PDF per call when printing several records
+PDF_BATCH_SIZE = 20
+
 
 class IrActionsReport(models.Model):
     _inherit = 'ir.actions.report'
@@ -34,7 +39,7 @@ class IrActionsReport(models.Model):
                 _("No template found for report %s") % report_sudo.name
             )
         
-        if not template.template_data:
+        if not template.template_checksum:
             raise UserError(
                 _("Template '%s' has no template file uploaded") % template.name
             )
@@ -47,12 +52,45 @@ class IrActionsReport(models.Model):
         # Increment usage counter
         template.increment_usage()
         
+        # Serve the document rendered in the background if still up to date
+        if len(res_ids) == 1:
+            record = self.env[template.model_name].browse(res_ids)
+            prerendered = template._get_prerendered(record)
+            if prerendered:
+                return prerendered, template.output_format
+        
+        # Convert the document of each record in batches
+        if template.output_format == 'pdf' and len(res_ids) > 1:
+            return self._render_docx_template_pdf(template, res_ids), 'pdf'
+        
         # Generate the DOCX
         docx_generator = self.env['report.docx.generator']
         docx_content = docx_generator.generate_report(template, res_ids)
         
+        if template.output_format == 'pdf':
+            pdf_content = self.env['report.pdf.converter'].convert([docx_content])[0]
+            return pdf_content, 'pdf'
+        
         return docx_content, 'docx'
 
+    def _render_docx_template_pdf(self, template, res_ids):
+        """Render one document per record and merge their PDF conversions
+
+        Documents are converted in batches of PDF_BATCH_SIZE, each on one
+        process of the conversion pool.
+        """
+        documents = (
+            content for _record, content
+            in self.env['report.docx.generator'].iter_record_reports(template, res_ids)
+        )
+        converter = self.env['report.pdf.converter']
+        pdfs = []
+        for batch in split_every(PDF_BATCH_SIZE, documents, list):
+            pdfs += converter.convert(batch)
+        if not pdfs:
+            raise UserError(_("No records found to generate report"))
+        return merge_pdf(pdfs)
+
     def _render_docx(self, docids, data=None):
         """Compatibility method for Odoo's report rendering"""
         return self._render_docx_template(self, docids, data)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api
+import base64
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Records rendered per cron batch
+PRERENDER_BATCH_SIZE = 100
+
+
+class ReportPrerenderedDocument(models.Model):
+    _name = 'report.prerendered.document'
+    _description = 'Pre-rendered Report Document'
+    _order = 'id'
+
+    template_id = fields.Many2one(
+        'report.template',
+        string='Template',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    res_id = fields.Many2oneReference(
+        string='Record',
+        model_field='res_model',
+        required=True,
+        index=True
+    )
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='Rendered As',
+        required=True,
+        ondelete='cascade',
+        index=True,
+        help="User whose access rights, language, timezone and company the document is rendered with"
+    )
+
+    res_model = fields.Char(
+        related='template_id.model_name',
+        string='Model'
+    )
+
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Rendered'),
+        ('error', 'Failed'),
+    ], string='Status', default='pending', required=True, index=True)
+
+    error = fields.Text(
+        string='Error',
+        readonly=True,
+        help="Error of the last rendering attempt"
+    )
+
+    fingerprint = fields.Char(
+        string='Fingerprint',
+        help="Template and record versions the document was rendered from"
+    )
+
+    content = fields.Binary(
+        string='Document',
+        attachment=True
+    )
+
+    _sql_constraints = [
+        ('template_record_unique', 'unique(template_id, res_id, user_id)',
+         'A record can only have one pre-rendered document per template and user.'),
+    ]
+
+    @api.model
+    def _enqueue(self, template, records):
+        """Queue records for background rendering with template
+
+        Documents are rendered for the user of records, the one who created
+        or changed them, and only served to that user.
+        """
+        user = records.env.user
+        existing = self.search([
+            ('template_id', '=', template.id),
+            ('res_id', 'in', records.ids),
+            ('user_id', '=', user.id),
+        ])
+        existing.filtered(lambda d: d.state != 'pending').write({'state': 'pending', 'error': False})
+
+        missing = set(records.ids) - set(existing.mapped('res_id'))
+        self.create([
+            {'template_id': template.id, 'res_id': res_id, 'user_id': user.id}
+            for res_id in sorted(missing)
+        ])
+
+        cron = self.env.ref('odoo_dynamic_report.ir_cron_report_prerender', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _process_pending(self, limit=PRERENDER_BATCH_SIZE):
+        """Render a batch of pending documents, called by the cron"""
+        pending = self.search([('state', '=', 'pending')], limit=limit)
+
+        for template in pending.template_id:
+            for user in pending.user_id:
+                documents = pending.filtered(lambda d: d.template_id == template and d.user_id == user)
+                if not documents:
+                    continue
+                try:
+                    with self.env.cr.savepoint():
+                        template._prerender(documents)
+                except Exception as e:
+                    _logger.exception(
+                        f"Could not pre-render documents of template {template.name} for {user.login}"
+                    )
+                    documents.write({'state': 'error', 'error': str(e)})
+
+        remaining = self.search_count([('state', '=', 'pending')])
+        self.env['ir.cron']._notify_progress(done=len(pending), remaining=remaining)
+
+    def _get_content(self):
+        """Return the decoded document content"""
+        self.ensure_one()
+        return base64.b64decode(self.content) if self.content else False
@@ -1,14 +1,31 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
+from ..report.template_store import template_store
+from datetime import timedelta
+from docx import Document
+from io import BytesIO
 import json
 import base64
 import logging
+import time
 
 _logger = logging.getLogger(__name__)
 
+# Template fields deciding which models have pre-rendering hooks
+PRERENDER_FIELDS = {'prerender_trigger', 'prerender_field_ids', 'model_id', 'active'}
+
+# Warm-up defaults: templates compiled per run, seconds per run, and days
+# since the last print after which a template is no longer warmed up
+WARMUP_LIMIT = 50
+WARMUP_TIMEOUT = 60
+WARMUP_DAYS = 30
+
+# Records rendered by the cost analysis
+PROFILE_SAMPLE_SIZE = 50
+
 
 class ReportTemplate(models.Model):
     _name = 'report.template'
@@ -50,6 +67,20 @@ class ReportTemplate(models.Model):
         help="Name of the uploaded template file"
     )
     
+    template_optimized = fields.Binary(
+        string='Optimized Template',
+        attachment=True,
+        readonly=True,
+        help="Normalized copy of the template file used for rendering"
+    )
+    
+    template_checksum = fields.Char(
+        string='Template Checksum',
+        compute='_compute_template_checksum',
+        store=True,
+        help="Checksum of the template file used for rendering, keying its compiled versions"
+    )
+    
     field_mappings = fields.Text(
         string='Field Mappings',
         help='JSON structure storing field mappings and configurations',
@@ -94,6 +125,69 @@ class ReportTemplate(models.Model):
         help="Paper format for this report"
     )
     
+    output_format = fields.Selection([
+        ('docx', 'DOCX'),
+        ('pdf', 'PDF'),
+    ], string='Output Format', default='docx', required=True,
+        help="Format of the file returned by the print menu. "
+             "PDF export requires LibreOffice on the server."
+    )
+    
+    output_mode = fields.Selection([
+        ('merged', 'Single Document'),
+        ('zip', 'One Document per Record (ZIP)'),
+    ], string='Output Mode', default='merged', required=True,
+        help="Whether reports generated for several records are merged into "
+             "one document or packed into a ZIP archive with one document each"
+    )
+    
+    filename_pattern = fields.Char(
+        string='Filename Pattern',
+        default='{{display_name}}',
+        help="Name of each document in ZIP archives, with placeholders, "
+             "e.g. 'Contract {{name}}'"
+    )
+    
+    prerender_trigger = fields.Selection([
+        ('none', 'Never'),
+        ('create', 'On Creation'),
+        ('write', 'On Change of Fields'),
+        ('state', 'On Change of Status'),
+    ], string='Pre-render', default='none', required=True,
+        help="Render the document of a record in the background when this event "
+             "happens, so that printing it returns the stored file at once"
+    )
+    
+    prerender_field_ids = fields.Many2many(
+        'ir.model.fields',
+        'report_template_prerender_field_rel',
+        'template_id',
+        'field_id',
+        string='Pre-render Fields',
+        domain="[('model_id', '=', model_id), ('store', '=', True)]",
+        help="Stored fields whose change triggers the pre-rendering, including "
+             "computed fields when they are recomputed"
+    )
+    
+    estimated_queries = fields.Integer(
+        string='Estimated Queries',
+        readonly=True,
+        help="Estimated SQL queries to print one record, from the last parsing"
+    )
+    
+    cost_warnings = fields.Text(
+        string='Cost Warnings',
+        readonly=True,
+        help="Placeholders and loops likely to slow down printing, from the last parsing"
+    )
+    
+    cost_ids = fields.One2many(
+        'report.template.cost',
+        'template_id',
+        string='Cost Analysis',
+        help="Cost of each placeholder and loop, from the last analysis"
+    )
+    
     # Statistics
     usage_count = fields.Integer(
         string='Usage Count',
@@ -108,37 +202,191 @@ class ReportTemplate(models.Model):
         help="Last time this template was used"
     )
 
+    @api.depends('template_data', 'template_optimized')
+    def _compute_template_checksum(self):
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('res_field', 'in', ('template_optimized', 'template_data')),
+        ])
+        checksums = {}
+        # The optimized copy is rendered when there is one
+        for attachment in attachments.sorted(lambda a: a.res_field != 'template_optimized'):
+            checksums.setdefault(attachment.res_id, attachment.checksum)
+        for record in self:
+            record.template_checksum = checksums.get(record.id, False)
+
     @api.constrains('template_data')
     def _check_template_data(self):
         """Validate that uploaded file is a valid DOCX"""
         for record in self:
             if record.template_data:
-                try:
-                    # Try to parse the template
-                    self.env['report.docx.generator']._validate_template(record.template_data)
-                except Exception as e:
-                    raise ValidationError(
-                        _("Invalid DOCX template file: %s") % str(e)
-                    )
+                record._get_template_document()
+
+    def _get_template_document(self, pop=False):
+        """Return the parsed template file
+
+        Parsed documents are kept in the cursor cache, keyed by record and
+        file checksum, so the document parsed to validate a new file is the
+        one normalized and compiled after it is stored.
+
+        Args:
+            pop: remove the document from the cache
+
+        Returns:
+            Document: python-docx document of template_data
+        """
+        self.ensure_one()
+        attachment = self._get_template_attachment()
+        key = (self.id, attachment.checksum)
+        documents = self.env.cr.cache.setdefault('report_template_documents', {})
+        doc = documents.pop(key, None) if pop else documents.get(key)
+        if doc is None:
+            try:
+                doc = Document(BytesIO(attachment.raw))
+            except Exception as e:
+                raise ValidationError(_("Invalid DOCX template file: %s") % str(e))
+            if not pop:
+                documents[key] = doc
+        return doc
+
+    def _get_template_attachment(self):
+        """Return the attachment storing template_data"""
+        self.ensure_one()
+        return self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'template_data'),
+        ], limit=1)
 
     @api.model
     def create(self, vals):
         """Create template and associated report action"""
         record = super(ReportTemplate, self).create(vals)
         record._create_report_action()
+        if vals.get('template_data'):
+            record._process_template_file()
+        if vals.get('prerender_trigger', 'none') != 'none':
+            record._update_prerender_registry()
         return record
 
     def write(self, vals):
         """Update template and report action if needed"""
+        if 'template_data' in vals:
+            # The estimate of the previous file no longer applies
+            vals = dict(vals, estimated_queries=0, cost_warnings=False)
         res = super(ReportTemplate, self).write(vals)
+        self.env['report.docx.generator']._discard_previews(self.ids)
         if 'name' in vals or 'model_id' in vals or 'active' in vals:
             self._update_report_action()
+        if 'template_data' in vals:
+            self._process_template_file()
+        if PRERENDER_FIELDS.intersection(vals):
+            self._update_prerender_registry()
         return res
 
+    def _process_template_file(self):
+        """Store the normalized copy of the template file and compile it
+
+        The document parsed when validating the file is normalized in
+        place, saved as the copy used for rendering and compiled into the
+        shared store, so a new file is parsed only once.
+        """
+        normalizer = self.env['report.template.normalizer']
+        generator = self.env['report.docx.generator']
+        # Documents parsed from the previous file are not used any more
+        generator._discard_parsed_templates(self.ids)
+        for record in self:
+            if not record._get_template_attachment():
+                record.template_optimized = False
+                continue
+            doc = record._get_template_document(pop=True)
+            try:
+                normalizer.normalize_document(doc)
+                output = BytesIO()
+                doc.save(output)
+                package = output.getvalue()
+            except Exception:
+                # The original file is still rendered as is
+                _logger.exception(f"Could not normalize template {record.name}")
+                record.template_optimized = False
+                record._compile_template()
+                continue
+            record.template_optimized = base64.b64encode(package)
+            try:
+                generator._set_compiled_template(record, package, doc)
+            except Exception:
+                # Compiled again on first print
+                _logger.exception(f"Could not compile template {record.name}")
+
+    def _compile_template(self):
+        """Compile the template into the store shared by all workers"""
+        generator = self.env['report.docx.generator']
+        for record in self.filtered('template_checksum'):
+            try:
+                generator._get_compiled_template(record)
+            except Exception:
+                # Compiled again on first print
+                _logger.exception(f"Could not compile template {record.name}")
+
+    @api.model
+    def _warmup_templates(self):
+        """Compile the most used templates missing from the shared store
+
+        Templates printed recently are compiled by decreasing usage, one at
+        a time, until the configured number of templates or time is reached.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        limit = int(params.get_param('odoo_dynamic_report.warmup_limit', WARMUP_LIMIT))
+        timeout = int(params.get_param('odoo_dynamic_report.warmup_timeout', WARMUP_TIMEOUT))
+        days = int(params.get_param('odoo_dynamic_report.warmup_days', WARMUP_DAYS))
+        
+        templates = self.sudo().search([
+            ('template_checksum', '!=', False),
+            ('last_used_date', '>=', fields.Datetime.now() - timedelta(days=days)),
+        ], order='usage_count desc, last_used_date desc', limit=limit)
+        
+        deadline = time.monotonic() + timeout
+        compiled = 0
+        for template in templates:
+            if time.monotonic() > deadline:
+                _logger.info("Template warm-up stopped after %s seconds", timeout)
+                break
+            checksum = template._get_template_checksum()
+            if checksum and template_store.contains(self.env.cr.dbname, template.id, checksum):
+                continue
+            template._compile_template()
+            compiled += 1
+            # Only keep one template file in memory at a time
+            self.env.invalidate_all()
+        
+        _logger.info("Template warm-up compiled %s of %s templates", compiled, len(templates))
+        return compiled
+
+    def _trigger_warmup(self):
+        """Schedule the template warm-up, unless a run is already pending
+
+        Called on every registry load, so a trigger is only added when the
+        cron has none left to process.
+        """
+        cron = self.env.ref('odoo_dynamic_report.ir_cron_report_template_warmup', raise_if_not_found=False)
+        if not cron or not cron.active:
+            return
+        if self.env['ir.cron.trigger'].sudo().search_count([('cron_id', '=', cron.id)], limit=1):
+            return
+        cron.sudo()._trigger()
+
     def unlink(self):
         """Delete associated report actions before deleting template"""
         self.mapped('report_action_id').unlink()
-        return super(ReportTemplate, self).unlink()
+        prerender = any(record.prerender_trigger != 'none' for record in self)
+        template_store.discard(self.env.cr.dbname, self.ids)
+        self.env['report.docx.generator']._discard_previews(self.ids)
+        self.env['report.docx.generator']._discard_parsed_templates(self.ids)
+        res = super(ReportTemplate, self).unlink()
+        if prerender:
+            self._update_prerender_registry()
+        return res
 
     def _create_report_action(self):
         """Create ir.actions.report for this template"""
@@ -189,6 +437,20 @@ class ReportTemplate(models.Model):
             }
         }
 
+    def action_bulk_print(self):
+        """Open bulk print wizard"""
+        self.ensure_one()
+        return {
+            'name': _('Bulk Print'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'report.bulk.print.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {
+                'default_template_id': self.id,
+            }
+        }
+
     def action_download_template(self):
         """Download the template file"""
         self.ensure_one()
@@ -210,37 +472,313 @@ class ReportTemplate(models.Model):
             raise UserError(_("Please upload a template file first."))
         
         # Parse template to find all placeholders
-        parser = self.env['report.docx.generator']
-        placeholders = parser._extract_placeholders(self.template_data)
+        generator = self.env['report.docx.generator']
+        doc = generator._load_template_document(self)
+        placeholders = generator._extract_document_placeholders(doc)
         
         # Create or update field mappings
         self._sync_field_mappings(placeholders)
         
+        # Estimate the printing cost from placeholder paths and loops
+        estimate = self.env['report.parser'].estimate_cost(
+            self.model_name, generator._collect_template_tree(doc)
+        )
+        self.write({
+            'estimated_queries': estimate['queries_per_record'],
+            'cost_warnings': '\n'.join(estimate['warnings']) or False,
+        })
+        
+        message = _('Found %s field placeholders in template, about %s queries per record.') % (
+            len(placeholders), estimate['queries_per_record'])
+        if estimate['warnings']:
+            message += ' ' + _('%s cost warnings, see the template form.') % len(estimate['warnings'])
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': _('Template Parsed'),
-                'message': _('Found %s field placeholders in template.') % len(placeholders),
+                'message': message,
+                'type': 'warning' if estimate['warnings'] else 'success',
+                'sticky': bool(estimate['warnings']),
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            }
+        }
+
+    def action_analyze_cost(self):
+        """Render a sample of records and store the cost of each placeholder"""
+        self.ensure_one()
+        
+        if not self.template_data:
+            raise UserError(_("Please upload a template file first."))
+        
+        records = self.env[self.model_name].search([], limit=PROFILE_SAMPLE_SIZE)
+        if not records:
+            raise UserError(_("No %s record to render.") % self.model_id.name)
+        
+        costs = self.env['report.docx.generator'].profile_report(self, records.ids)
+        self.cost_ids.unlink()
+        self.env['report.template.cost'].create([
+            dict(cost, template_id=self.id) for cost in costs
+        ])
+        
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Cost Analyzed'),
+                'message': _('Rendered %s records, see the Cost Analysis tab.') % len(records),
                 'type': 'success',
                 'sticky': False,
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
             }
         }
 
+    def _upload_template_file(self, file, filename):
+        """Store an uploaded DOCX file and return its parsed information
+
+        The file is parsed once, from the stream: the same document
+        validates the file, is normalized and compiled when stored, and
+        gives its placeholders and structure. Its content is written as is
+        to the attachment of template_data, without base64 encoding.
+
+        Args:
+            file: seekable binary file with the DOCX content
+            filename: name of the uploaded file
+
+        Returns:
+            dict: parsed template information, as report.parser.parse_template
+        """
+        self.ensure_one()
+        self.check_access('write')
+        try:
+            doc = Document(file)
+        except Exception as e:
+            raise ValidationError(_("Invalid DOCX template file: %s") % str(e))
+        
+        file.seek(0)
+        attachment = self._get_template_attachment()
+        if attachment:
+            attachment.write({'raw': file.read()})
+        else:
+            attachment = attachment.create({
+                'name': 'template_data',
+                'res_model': self._name,
+                'res_id': self.id,
+                'res_field': 'template_data',
+                'raw': file.read(),
+            })
+        self.invalidate_recordset(['template_data'])
+        self.modified(['template_data'])
+        
+        documents = self.env.cr.cache.setdefault('report_template_documents', {})
+        documents[(self.id, attachment.checksum)] = doc
+        self.write({
+            'template_filename': filename,
+            # The estimate of the previous file no longer applies
+            'estimated_queries': 0,
+            'cost_warnings': False,
+        })
+        self._process_template_file()
+        return self.env['report.parser']._parse_document(doc)
+
     def _sync_field_mappings(self, placeholders):
         """Sync field mappings with discovered placeholders"""
         self.ensure_one()
         
         existing_mappings = {m.field_path: m for m in self.field_mapping_ids}
+        generator = self.env['report.docx.generator']
         
         for placeholder in placeholders:
-            if placeholder not in existing_mappings:
+            # Aggregates are computed over lines, not mapped to a field
+            if generator._parse_aggregate(placeholder):
+                continue
+            
+            # Formatters are stored apart from the field path
+            field_path, _sep, formatter = placeholder.partition('|')
+            field_path = field_path.strip()
+            
+            if field_path not in existing_mappings:
                 # Create new mapping
-                self.env['report.field.mapping'].create({
+                vals = {
                     'template_id': self.id,
-                    'field_path': placeholder,
-                    'field_name': placeholder.split('.')[-1],
-                })
+                    'field_path': field_path,
+                    'field_name': field_path.split('.')[-1],
+                    'format_string': formatter.strip() or False,
+                }
+                if generator._parse_image_placeholder(placeholder):
+                    vals['field_type'] = 'binary'
+                existing_mappings[field_path] = self.env['report.field.mapping'].create(vals)
+
+    def _register_hook(self):
+        """Install the pre-rendering hooks and schedule the warm-up"""
+        super(ReportTemplate, self)._register_hook()
+        self._patch_prerender_methods()
+        # Compile the templates a fresh deployment misses in the background
+        self._trigger_warmup()
+
+    def _patch_prerender_methods(self):
+        """Patch create and write of the models with pre-rendered templates"""
+        def make_create():
+            @api.model_create_multi
+            def create(self, vals_list, **kwargs):
+                records = create.origin(self, vals_list, **kwargs)
+                self.env['report.template']._prerender_on_event(records, 'create')
+                return records
+            return create
+        
+        def make_write():
+            def write(self, vals, **kwargs):
+                res = write.origin(self, vals, **kwargs)
+                self.env['report.template']._prerender_on_event(self, 'write', vals)
+                return res
+            return write
+        
+        def make_compute_field_value():
+            # Stored computed fields, such as a computed state, are not
+            # written through write(), catch them when they are recomputed
+            def _compute_field_value(self, field):
+                res = _compute_field_value.origin(self, field)
+                fnames = [f.name for f in self.pool.field_computed.get(field, [field]) if f.store]
+                records = self.filtered('id')
+                if fnames and records:
+                    self.env['report.template']._prerender_on_event(records, 'write', fnames)
+                return res
+            return _compute_field_value
+        
+        templates = self.sudo().search([('prerender_trigger', '!=', 'none')])
+        for model_name in set(templates.mapped('model_name')):
+            Model = self.env.registry.get(model_name)
+            if Model is None:
+                continue
+            for name, make in (('create', make_create), ('write', make_write),
+                               ('_compute_field_value', make_compute_field_value)):
+                if getattr(Model.__dict__.get(name), '_report_prerender', False):
+                    continue
+                method = make()
+                method.origin = getattr(Model, name)
+                method._report_prerender = True
+                setattr(Model, name, method)
+
+    def _unregister_hook(self):
+        """Remove the patches installed by _patch_prerender_methods"""
+        for Model in self.env.registry.values():
+            for name in ('create', 'write', '_compute_field_value'):
+                if getattr(Model.__dict__.get(name), '_report_prerender', False):
+                    delattr(Model, name)
+        super(ReportTemplate, self)._unregister_hook()
+
+    def _update_prerender_registry(self):
+        """Re-install the pre-rendering hooks after a configuration change"""
+        self.env.registry.clear_cache()
+        if self.env.registry.ready and not self.env.context.get('import_file'):
+            self._unregister_hook()
+            self._patch_prerender_methods()
+            self.env.registry.registry_invalidated = True
+
+    @api.model
+    @tools.ormcache('model_name')
+    def _get_prerender_triggers(self, model_name):
+        """Return (template_id, trigger, field names) of the model's pre-rendered templates"""
+        templates = self.sudo().search([
+            ('model_name', '=', model_name),
+            ('prerender_trigger', '!=', 'none'),
+        ])
+        return tuple(
+            (t.id, t.prerender_trigger, frozenset(t.prerender_field_ids.mapped('name')))
+            for t in templates
+        )
+
+    @api.model
+    def _prerender_on_event(self, records, event, vals=None):
+        """Queue the documents of records for the templates triggered by event"""
+        if not records:
+            return
+        for template_id, trigger, fnames in self._get_prerender_triggers(records._name):
+            if event == 'create':
+                triggered = trigger == 'create'
+            elif trigger == 'write':
+                triggered = not fnames.isdisjoint(vals)
+            else:
+                triggered = trigger == 'state' and 'state' in vals
+            if triggered:
+                self.env['report.prerendered.document'].sudo()._enqueue(
+                    self.sudo().browse(template_id), records
+                )
+
+    def _get_template_checksum(self):
+        """Return the checksum of the template file used for rendering"""
+        self.ensure_one()
+        return self.template_checksum or ''
+
+    def _prerender_fingerprint(self, record, checksum=None):
+        """Identify the template, record version and rendering context of a document
+
+        Only cheap values are used, since it is checked on every print: the
+        template file, the last update of record, and the user, language,
+        timezone and company of its environment. Changes to lines or related
+        records alone are picked up when a trigger queues the record again.
+        """
+        self.ensure_one()
+        checksum = checksum if checksum is not None else self._get_template_checksum()
+        env = record.env
+        return (
+            f"{checksum}:{self.output_format}:{record.write_date}:"
+            f"{env.uid}:{env.lang}:{env.context.get('tz')}:{env.company.id}"
+        )
+
+    def _prerender(self, documents):
+        """Render and store the pre-rendered documents of this template
+
+        Documents are rendered as their user, with the user's access
+        rights, language, timezone and company. Records the user cannot
+        read any longer are dropped.
+        """
+        self.ensure_one()
+        user = documents.user_id
+        user.ensure_one()
+        template = self.with_user(user).with_context(
+            lang=user.lang, tz=user.tz, allowed_company_ids=user.company_id.ids,
+        )
+        records = template.env[self.model_name].browse(documents.mapped('res_id')).exists()
+        records = records._filtered_access('read')
+        documents.filtered(lambda d: d.res_id not in records.ids).unlink()
+        documents = {d.res_id: d for d in documents.exists()}
+        
+        generator = template.env['report.docx.generator']
+        rendered = list(generator.iter_record_reports(template, records.ids))
+        if self.output_format == 'pdf':
+            contents = template.env['report.pdf.converter'].convert([content for _record, content in rendered])
+            rendered = [(record, pdf) for (record, _docx), pdf in zip(rendered, contents)]
+        
+        checksum = self._get_template_checksum()
+        for record, content in rendered:
+            documents[record.id].write({
+                'content': base64.b64encode(content),
+                'fingerprint': template._prerender_fingerprint(record, checksum),
+                'state': 'done',
+                'error': False,
+            })
+
+    def _get_prerendered(self, record):
+        """Return the stored document of record if it is still up to date
+
+        Only documents rendered as the current user, in the same language,
+        timezone and company, from the current template file and the last
+        update of record, are served.
+        """
+        self.ensure_one()
+        if self.prerender_trigger == 'none':
+            return False
+        record.check_access('read')
+        document = self.env['report.prerendered.document'].sudo().search([
+            ('template_id', '=', self.id),
+            ('res_id', '=', record.id),
+            ('user_id', '=', self.env.uid),
+            ('state', '=', 'done'),
+        ], limit=1)
+        if not document or document.fingerprint != self._prerender_fingerprint(record):
+            return False
+        return document._get_content()
 
     def increment_usage(self):
         """Increment usage counter"""
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api
+
+
+class ReportTemplateCost(models.Model):
+    _name = 'report.template.cost'
+    _description = 'Report Template Cost'
+    _order = 'total_time desc, id'
+
+    template_id = fields.Many2one(
+        'report.template',
+        string='Template',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    path = fields.Char(
+        string='Path',
+        required=True,
+        help="Placeholder or loop, prefixed by the loops it is nested in"
+    )
+
+    calls = fields.Integer(
+        string='Calls',
+        help="Number of times the path was evaluated"
+    )
+
+    query_count = fields.Integer(
+        string='Queries',
+        help="SQL queries run while evaluating the path"
+    )
+
+    query_time = fields.Float(
+        string='Query Time (ms)',
+        digits=(16, 1)
+    )
+
+    python_time = fields.Float(
+        string='Python Time (ms)',
+        digits=(16, 1)
+    )
+
+    total_time = fields.Float(
+        string='Total Time (ms)',
+        compute='_compute_total_time',
+        store=True,
+        digits=(16, 1)
+    )
+
+    @api.depends('query_time', 'python_time')
+    def _compute_total_time(self):
+        for cost in self:
+            cost.total_time = cost.query_time + cost.python_time
@@ -3,3 +3,5 @@
 
 from . import report_docx_generator
 from . import report_parser
+from . import report_pdf_converter
+from . import report_template_normalizer
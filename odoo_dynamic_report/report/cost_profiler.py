@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+_active_profiler = ContextVar('report_cost_profiler', default=None)
+
+
+def get_active_profiler():
+    """Return the profiler measuring the current rendering, if any"""
+    return _active_profiler.get()
+
+
+class CostProfiler:
+    """Attribute SQL queries and time of a rendering to template paths
+
+    Costs are keyed by placeholder or loop, prefixed by the loops they are
+    nested in, e.g. 'order_line > product_id.name'. Queries and their time
+    come from the counters Odoo keeps on the current thread; the rest of
+    the elapsed time is Python time.
+    """
+
+    def __init__(self):
+        # {path: [calls, queries, query time, total time]}
+        self.costs = {}
+        self._scope = ()
+
+    @contextmanager
+    def activate(self):
+        """Profile the renderings run in the block"""
+        thread = threading.current_thread()
+        counters = hasattr(thread, 'query_count')
+        if not counters:
+            thread.query_count, thread.query_time = 0, 0
+        token = _active_profiler.set(self)
+        try:
+            yield self
+        finally:
+            _active_profiler.reset(token)
+            if not counters:
+                del thread.query_count, thread.query_time
+
+    @contextmanager
+    def scope(self, loop):
+        """Nest the costs measured in the block under loop"""
+        previous = self._scope
+        self._scope = previous + (loop,)
+        try:
+            yield
+        finally:
+            self._scope = previous
+
+    @contextmanager
+    def measure(self, key):
+        """Add the queries and time spent in the block to key"""
+        thread = threading.current_thread()
+        queries, query_time = thread.query_count, thread.query_time
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cost = self.costs.setdefault(' > '.join(self._scope + (key,)), [0, 0, 0.0, 0.0])
+            cost[0] += 1
+            cost[1] += thread.query_count - queries
+            cost[2] += thread.query_time - query_time
+            cost[3] += time.perf_counter() - start
+
+    def report(self):
+        """Return the costs by path, most expensive first
+
+        Returns:
+            list: dicts with path, calls, query_count, query_time and
+            python_time, times in milliseconds
+        """
+        rows = [
+            {
+                'path': path,
+                'calls': calls,
+                'query_count': queries,
+                'query_time': query_time * 1000,
+                'python_time': max(total - query_time, 0) * 1000,
+            }
+            for path, (calls, queries, query_time, total) in self.costs.items()
+        ]
+        return sorted(rows, key=lambda row: row['query_time'] + row['python_time'], reverse=True)
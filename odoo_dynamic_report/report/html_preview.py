@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+"""Lightweight HTML rendering of filled DOCX documents
+
+Only what matters to check a template is rendered: paragraphs with their
+headings, alignment and basic run formatting, line breaks, tables with
+merged cells, and inline images. Text is always escaped.
+"""
+
+from docx.oxml.ns import qn
+from html import escape
+from .table_walker import iter_row_cells
+import base64
+
+# Inline images larger than this are shown as a placeholder box
+PREVIEW_IMAGE_MAX_SIZE = 512 * 1024
+
+ALIGNMENTS = {
+    'center': 'center',
+    'right': 'right',
+    'end': 'right',
+    'both': 'justify',
+}
+RUN_TAGS = (
+    ('w:b', 'strong'),
+    ('w:i', 'em'),
+    ('w:u', 'u'),
+    ('w:strike', 's'),
+)
+
+
+def document_to_html(doc):
+    """Return the body of a python-docx document as an HTML fragment"""
+    return ''.join(_blocks_to_html(doc.element.body, doc.part))
+
+
+def _blocks_to_html(element, part):
+    for child in element:
+        if child.tag == qn('w:p'):
+            yield _paragraph_to_html(child, part)
+        elif child.tag == qn('w:tbl'):
+            yield _table_to_html(child, part)
+        elif child.tag == qn('w:sdt'):
+            content = child.find(qn('w:sdtContent'))
+            if content is not None:
+                yield from _blocks_to_html(content, part)
+
+
+def _is_on(properties, tag):
+    """Whether a toggle property like w:b is set in run properties"""
+    if properties is None:
+        return False
+    element = properties.find(qn(tag))
+    if element is None:
+        return False
+    return element.get(qn('w:val'), 'true') not in ('0', 'false', 'none')
+
+
+def _paragraph_to_html(p, part):
+    tag, style = 'p', ''
+    properties = p.find(qn('w:pPr'))
+    if properties is not None:
+        style_element = properties.find(qn('w:pStyle'))
+        style_name = style_element.get(qn('w:val'), '') if style_element is not None else ''
+        level = style_name[len('Heading'):] if style_name.startswith('Heading') else ''
+        if level.isdigit() and 1 <= int(level) <= 6:
+            tag = f'h{level}'
+        jc = properties.find(qn('w:jc'))
+        if jc is not None and jc.get(qn('w:val')) in ALIGNMENTS:
+            style = f' style="text-align: {ALIGNMENTS[jc.get(qn("w:val"))]}"'
+
+    content = ''.join(_runs_to_html(p, part)) or '<br/>'
+    return f'<{tag}{style}>{content}</{tag}>'
+
+
+def _runs_to_html(element, part):
+    for child in element:
+        if child.tag == qn('w:r'):
+            yield _run_to_html(child, part)
+        elif child.tag in (qn('w:hyperlink'), qn('w:smartTag'), qn('w:ins'), qn('w:fldSimple')):
+            yield from _runs_to_html(child, part)
+        elif child.tag == qn('w:sdt'):
+            content = child.find(qn('w:sdtContent'))
+            if content is not None:
+                yield from _runs_to_html(content, part)
+
+
+def _run_to_html(r, part):
+    pieces = []
+    for child in r:
+        if child.tag == qn('w:t'):
+            pieces.append(escape(child.text or ''))
+        elif child.tag == qn('w:tab'):
+            pieces.append('&emsp;')
+        elif child.tag in (qn('w:br'), qn('w:cr')):
+            pieces.append('<br/>')
+        elif child.tag == qn('w:drawing'):
+            pieces.append(_drawing_to_html(child, part))
+    html = ''.join(pieces)
+    if not html:
+        return ''
+
+    properties = r.find(qn('w:rPr'))
+    for property_tag, html_tag in RUN_TAGS:
+        if _is_on(properties, property_tag):
+            html = f'<{html_tag}>{html}</{html_tag}>'
+    return html
+
+
+def _drawing_to_html(drawing, part):
+    blip = next(drawing.iter(qn('a:blip')), None)
+    extent = next(drawing.iter(qn('wp:extent')), None)
+    style = ''
+    if extent is not None:
+        # EMU to CSS pixels
+        width, height = int(extent.get('cx', 0)) // 9525, int(extent.get('cy', 0)) // 9525
+        style = f' style="width: {width}px; height: {height}px"'
+
+    image_part = part.related_parts.get(blip.get(qn('r:embed'))) if blip is not None else None
+    if image_part is None or len(image_part.blob) > PREVIEW_IMAGE_MAX_SIZE:
+        return f'<span class="o_preview_image"{style}>[image]</span>'
+    data = base64.b64encode(image_part.blob).decode()
+    return f'<img src="data:{escape(image_part.content_type)};base64,{data}"{style}/>'
+
+
+def _cell_span(tc):
+    properties = tc.tcPr
+    span = properties.find(qn('w:gridSpan')) if properties is not None else None
+    return int(span.get(qn('w:val'), 1)) if span is not None else 1
+
+
+def _cell_merge(tc):
+    """Return 'restart', 'continue' or None for vertically merged cells"""
+    properties = tc.tcPr
+    merge = properties.find(qn('w:vMerge')) if properties is not None else None
+    if merge is None:
+        return None
+    return 'restart' if merge.get(qn('w:val')) == 'restart' else 'continue'
+
+
+def _table_to_html(tbl, part):
+    # Cells of each row with their grid column
+    rows = []
+    for tr in tbl.tr_lst:
+        cells, column = [], 0
+        for tc in iter_row_cells(tr):
+            span = _cell_span(tc)
+            cells.append((tc, column, span))
+            column += span
+        rows.append(cells)
+
+    html = ['<table class="table table-bordered table-sm">']
+    for index, cells in enumerate(rows):
+        html.append('<tr>')
+        for tc, column, span in cells:
+            merge = _cell_merge(tc)
+            if merge == 'continue':
+                continue
+            rowspan = 1
+            if merge == 'restart':
+                for below in rows[index + 1:]:
+                    if not any(c == column and _cell_merge(t) == 'continue' for t, c, _s in below):
+                        break
+                    rowspan += 1
+            attributes = ''
+            if span > 1:
+                attributes += f' colspan="{span}"'
+            if rowspan > 1:
+                attributes += f' rowspan="{rowspan}"'
+            html.append(f'<td{attributes}>{"".join(_blocks_to_html(tc, part))}</td>')
+        html.append('</tr>')
+    html.append('</table>')
+    return ''.join(html)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from collections import OrderedDict
+import threading
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ImageCache:
+    """Process-wide LRU cache of resized, re-encoded images
+
+    Entries are keyed by (checksum, width, height) so the same picture
+    printed at the same size is decoded and resized only once, and are
+    evicted least recently used first once max_bytes is exceeded.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached (data, width_px, height_px) tuple or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        """Store a (data, width_px, height_px) tuple"""
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key)[0])
+            self._entries[key] = entry
+            self._size += len(entry[0])
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _key, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+image_cache = ImageCache()
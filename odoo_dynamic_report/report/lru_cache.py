@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache:
+    """Process-wide LRU cache of values bounded by their total size
+
+    Values are evicted least recently used first once max_bytes is
+    exceeded, and are no longer returned ttl seconds after being stored
+    when a ttl is given. The size of a value is sizeof(value), len(value)
+    by default.
+    """
+
+    def __init__(self, max_bytes, ttl=None, sizeof=len):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store a value"""
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, expires)
+            self._size += self.sizeof(value)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                self._pop(next(iter(self._entries)))
+
+    def discard_if(self, predicate):
+        """Remove the values whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._pop(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _pop(self, key):
+        value, _expires = self._entries.pop(key)
+        self._size -= self.sizeof(value)
@@ -4,37 +4,143 @@
 from odoo import models, api, _
 from odoo.exceptions import UserError, ValidationError
 from docx import Document
+from docx.blkcntnr import BlockItemContainer
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.oxml.shape import CT_Inline
 from docx.shared import Inches, Pt, RGBColor
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+from odoo.tools import SQL, split_every
+from odoo.tools.image import image_process
+from PIL import Image
+from contextlib import ExitStack, nullcontext
+from copy import deepcopy
 from io import BytesIO
+from lxml import etree
+from .cost_profiler import CostProfiler, get_active_profiler
+from .html_preview import document_to_html
+from .image_cache import ImageCache, image_cache
+from .lru_cache import LRUCache
+from .table_walker import cell_text, iter_row_cells, iter_table_cells
+from .template_store import template_store
+import ast
 import base64
+import hashlib
+import itertools
 import re
+import shutil
+import tempfile
+import uuid
+import weakref
+import zipfile
 import logging
 
 _logger = logging.getLogger(__name__)
 
+PLACEHOLDER_PATTERN = re.compile(r'\{\{([^}]+)\}\}')
+LOOP_OPEN_PATTERN = re.compile(r'\{\{#([^}]+)\}\}')
+LOOP_MARKER_PATTERN = re.compile(r'\{\{([#/])([^}]+)\}\}')
+AGGREGATE_PATTERN = re.compile(r'^(sum|avg|min|max|count)\(\s*([\w.]*)\s*\)$')
+GROUP_LOOP_PATTERN = re.compile(r'^group\s+(\w+)\s+by\s+([\w.]+)$')
+CONDITION_PATTERN = re.compile(r'^\s*([\w.]+)\s*(!=|>=|<=|=|>|<)\s*(.*?)\s*$')
+IMAGE_SIZE_PATTERN = re.compile(r'^([\d.]+)\s*(cm|mm|in|pt|px)?$')
+
+EMU_PER_UNIT = {
+    'cm': 360000,
+    'mm': 36000,
+    'in': 914400,
+    'pt': 12700,
+    'px': 9525,
+}
+EMU_PER_INCH = 914400
+IMAGE_DPI = 150
+# Records rendered at a time when printing several records
+CHUNK_SIZE = 500
+# Rendered body kept in memory before spilling it to disk
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+# HTML previews kept in memory, and seconds a preview is served from it
+PREVIEW_CACHE_SIZE = 16 * 1024 * 1024
+PREVIEW_CACHE_TTL = 60
+# Parsed templates kept per process, counted in bytes of their DOCX
+# packages; a parsed document takes several times more memory
+PARSED_TEMPLATE_CACHE_SIZE = 32 * 1024 * 1024
+# Lines rendered per loop and body blocks rendered in preview mode
+PREVIEW_ROWS = 20
+PREVIEW_BLOCKS = 200
+DEFAULT_FILENAME_PATTERN = '{{display_name}}'
+FILENAME_UNSAFE_PATTERN = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+AGGREGATES_FUNCTIONS = {
+    'sum': lambda values: sum(values),
+    'avg': lambda values: sum(values) / len(values) if values else None,
+    'min': lambda values: min(values) if values else None,
+    'max': lambda values: max(values) if values else None,
+    'count': len,
+}
+
+# Media relationships already added to each document part during a render,
+# keyed by image cache key, so identical images share one media part
+_part_images = weakref.WeakKeyDictionary()
+
+# Rendered HTML previews. Keys only hold what is cheap to read, so changes
+# to the lines or related records of a record are picked up when the
+# preview expires or is refreshed
+preview_cache = LRUCache(max_bytes=PREVIEW_CACHE_SIZE, ttl=PREVIEW_CACHE_TTL)
+
+# (package size, parsed document, loop tree) of templates, keyed by
+# (dbname, template id, checksum); renders fill deep copies of the document
+parsed_templates = LRUCache(max_bytes=PARSED_TEMPLATE_CACHE_SIZE, sizeof=lambda entry: entry[0])
+
+# Loop tree of the documents loaded from a compiled template, keyed by
+# document part, so the tree is not collected again from the XML
+_document_trees = weakref.WeakKeyDictionary()
+
+
+class ReportGroup:
+    """A group of a grouped loop: its key, its lines and rendered aggregates
+
+    The id of a group is made of its parent record, its loop and its key,
+    so that groups do not share values in the value table.
+    """
+    _name = 'report.group'
+
+    def __init__(self, id, key, lines):
+        self.id = id
+        self.key = key
+        self.lines = lines
+        self.values = {}
+
+    def mapped(self, path):
+        name, _sep, rest = path.partition('.')
+        value = getattr(self, name)
+        return value.mapped(rest) if rest else value
+
 
 class ReportDocxGenerator(models.AbstractModel):
     _name = 'report.docx.generator'
     _description = 'DOCX Report Generator'
 
     @api.model
-    def generate_report(self, template, record_ids):
+    def generate_report(self, template, record_ids, output=None):
         """
         Generate DOCX report from template for given records
         
         Args:
             template: report.template record
             record_ids: list of record IDs to generate report for
+            output: optional binary file receiving the document
             
         Returns:
-            bytes: Generated DOCX file content
+            bytes: Generated DOCX file content, or None when written to output
         """
-        if not template.template_data:
+        if not template.template_checksum:
             raise UserError(_("Template file is missing"))
         
         # Load the template
-        template_bytes = base64.b64decode(template.template_data)
-        doc = Document(BytesIO(template_bytes))
+        doc = self._load_template_document(template)
         
         # Get records
         model = self.env[template.model_name]
@@ -48,152 +154,1915 @@ class ReportDocxGenerator(models.AbstractModel):
         # Process each record
         if len(records) == 1:
             # Single record - fill the template
-            self._fill_template(doc, records[0], template)
+            self._fill_template_single(doc, records[0], template)
         else:
-            # Multiple records - duplicate template for each
-            self._fill_template_multiple(doc, records, template)
+            # Multiple records - duplicate template for each, a chunk at a time
+            chunks = split_every(self._get_chunk_size(), records.ids, model.browse)
+            return self._render_chunks(doc, chunks, template, output)
         
         # Save to bytes
+        if output is not None:
+            doc.save(output)
+            return None
         output = BytesIO()
         doc.save(output)
         output.seek(0)
         
         return output.read()
 
-    def _fill_template(self, doc, record, template):
-        """Fill template with single record data"""
-        # Process paragraphs
-        for paragraph in doc.paragraphs:
-            self._process_paragraph(paragraph, record, template)
+    def _fill_template_single(self, doc, record, template):
+        """Prefetch the values of one record and fill the template with them"""
+        if self.env.context.get('report_preview_blocks'):
+            self._truncate_preview_blocks(doc, self.env.context['report_preview_blocks'])
+        tree = self._collect_template_tree(doc)
+        values = self._prefetch_values(record, tree['placeholders'], template)
+        self._prefetch_loops(record, tree['loops'], template, values)
+        self._fill_template(doc, record, template, values)
+
+    def _with_preview_limits(self, rows=PREVIEW_ROWS, blocks=PREVIEW_BLOCKS):
+        """Return the generator in preview mode
+
+        In preview mode, loops render at most rows lines each and the body
+        stops after about blocks paragraphs and tables, with a note where
+        content is left out, so previews take the same time whatever the
+        size of the record.
+        """
+        return self.with_context(report_preview_rows=rows, report_preview_blocks=blocks)
+
+    def _truncate_preview_blocks(self, doc, limit):
+        """Drop the body blocks after the first limit ones
+
+        Block loops are kept or dropped as a whole, so their markers stay
+        paired.
+        """
+        elements = list(self._iter_body_blocks(doc))
+        index = 0
+        while index < len(elements) and index < limit:
+            loop = self._get_loop(elements[index]) if elements[index].tag == qn('w:p') else None
+            index = (self._find_loop_end(elements, index, loop) if loop else index) + 1
+        if index >= len(elements):
+            return
         
-        # Process tables
-        for table in doc.tables:
-            self._process_table(table, record, template)
+        for element in elements[index:]:
+            doc.element.body.remove(element)
+        self._append_block(doc.element.body, self._new_preview_note(
+            _("Preview stops here, %s more paragraphs and tables are not shown") % (len(elements) - index)
+        ))
+        # The compiled tree covers the removed blocks
+        _document_trees.pop(doc.part, None)
+
+    def _new_preview_note(self, text):
+        """Return a paragraph element marking content left out of a preview"""
+        paragraph = OxmlElement('w:p')
+        run = OxmlElement('w:r')
+        r_pr = OxmlElement('w:rPr')
+        r_pr.append(OxmlElement('w:i'))
+        run.append(r_pr)
+        t = OxmlElement('w:t')
+        t.text = text
+        run.append(t)
+        paragraph.append(run)
+        return paragraph
+
+    def _preview_loop(self, records, loop):
+        """Return loop capped to one line more than the preview rows
+
+        The extra line tells whether lines were left out. Only loops over a
+        one2many or many2many of records are capped in the query, other
+        loops are cut when rendered.
+        """
+        rows = self.env.context.get('report_preview_rows')
+        if not rows or self._parse_group_loop(loop):
+            return loop
+        field_name, _domain, _order, limit = self._parse_loop_modifiers(loop)
+        field = records._fields.get(field_name) if isinstance(records, models.BaseModel) else None
+        if not field or field.type not in ('one2many', 'many2many'):
+            return loop
+        if limit is not None and limit <= rows:
+            return loop
+        return f'{loop}|limit:{rows + 1}'
+
+    def _cut_preview_lines(self, lines):
+        """Return the lines of a loop to render and how many are left out"""
+        rows = self.env.context.get('report_preview_rows')
+        if not rows or len(lines) <= rows:
+            return lines, 0
+        return lines[:rows], len(lines) - rows
+
+    @api.model
+    def render_preview_html(self, template, record_id, refresh=False):
+        """
+        Render template for one record as an HTML fragment
+        
+        The compiled template is filled as by generate_report, in preview
+        mode, and converted to lightweight HTML instead of being saved as a
+        DOCX file. Previews are cached for PREVIEW_CACHE_TTL seconds per
+        template file, record version, user, language and company; they
+        are dropped when the template changes, and rendered again on
+        refresh, to show changes to lines or related records at once.
+        
+        Args:
+            template: report.template record
+            record_id: ID of the sample record
+            refresh: render the preview again instead of using the cache
+            
+        Returns:
+            str: HTML fragment
+        """
+        if not template.template_checksum:
+            raise UserError(_("Template file is missing"))
+        
+        record = self.env[template.model_name].browse(record_id).exists()
+        if not record:
+            raise UserError(_("No records found to generate report"))
+        
+        key = (
+            self.env.cr.dbname, template.id, template._get_template_checksum(),
+            record.id, str(record.write_date),
+            self.env.uid, self.env.lang, self.env.context.get('tz'), self.env.company.id,
+        )
+        cached = preview_cache.get(key) if not refresh else None
+        if cached is not None:
+            return cached
+        
+        doc = self._load_template_document(template)
+        self._with_preview_limits()._fill_template_single(doc, record, template)
+        html = document_to_html(doc)
+        preview_cache.set(key, html)
+        return html
+
+    def _discard_parsed_templates(self, template_ids):
+        """Drop the parsed documents of templates from the process cache"""
+        dbname = self.env.cr.dbname
+        template_ids = set(template_ids)
+        parsed_templates.discard_if(lambda key: key[0] == dbname and key[1] in template_ids)
+
+    def _discard_previews(self, template_ids):
+        """Drop the cached previews of templates"""
+        dbname = self.env.cr.dbname
+        template_ids = set(template_ids)
+        preview_cache.discard_if(lambda key: key[0] == dbname and key[1] in template_ids)
+
+    @api.model
+    def profile_report(self, template, record_ids):
+        """
+        Render template for records and measure the cost of its parts
+        
+        The ORM cache is cleared first so every field is read as in a
+        regular print. Queries, query time and Python time are attributed
+        to each placeholder and loop, and to the whole report.
+        
+        Args:
+            template: report.template record
+            record_ids: list of record IDs to generate report for
+            
+        Returns:
+            list: cost dicts, most expensive first, see CostProfiler.report
+        """
+        self.env.invalidate_all()
+        profiler = CostProfiler()
+        with profiler.activate(), profiler.measure(_("(whole report)")):
+            self.generate_report(template, record_ids)
+        return profiler.report()
+
+    def _measure(self, key):
+        """Return a context manager attributing its cost to key when profiling"""
+        profiler = get_active_profiler()
+        return profiler.measure(key) if profiler is not None else nullcontext()
+
+    def _profile_scope(self, loop):
+        """Return a context manager nesting the costs measured in it under loop"""
+        profiler = get_active_profiler()
+        return profiler.scope(loop) if profiler is not None else nullcontext()
+
+    def _load_template_document(self, template):
+        """Return a copy of the parsed template document to fill
+
+        The document parsed from the compiled template is kept per process,
+        keyed by the checksum stored on the template, and every render gets
+        a deep copy of it instead of reading and parsing the package again.
+        """
+        checksum = template._get_template_checksum()
+        key = (self.env.cr.dbname, template.id, checksum)
+        entry = parsed_templates.get(key) if checksum else None
+        if entry is None:
+            package, tree = self._get_compiled_template(template)
+            entry = (len(package), Document(BytesIO(package)), tree)
+            if checksum:
+                parsed_templates.set(key, entry)
+        _size, parsed, tree = entry
+        doc = deepcopy(parsed)
+        _document_trees[doc.part] = tree
+        return doc
+
+    def _get_compiled_template(self, template):
+        """Return the compiled (package, tree) of template
+
+        Compiled templates are read from the shared store, keyed by the
+        checksum of the template file, and compiled and stored on a miss.
+        """
+        checksum = template._get_template_checksum()
+        dbname = self.env.cr.dbname
+        entry = template_store.get(dbname, template.id, checksum) if checksum else None
+        if entry is None:
+            entry = self._build_compiled_template(template)
+            if checksum:
+                template_store.set(dbname, template.id, checksum, entry)
+        return entry
+
+    def _set_compiled_template(self, template, package, doc):
+        """Store the compiled template from its parsed normalized document"""
+        entry = (package, self._collect_template_tree(doc))
+        checksum = template._get_template_checksum()
+        if checksum:
+            template_store.set(self.env.cr.dbname, template.id, checksum, entry)
+            parsed_templates.set((self.env.cr.dbname, template.id, checksum), (len(package), doc, entry[1]))
+        return entry
+
+    def _build_compiled_template(self, template):
+        """Parse template into its normalized package and loop tree"""
+        package = base64.b64decode(template.template_optimized or template.template_data)
+        return package, self._collect_template_tree(Document(BytesIO(package)))
+
+    @api.model
+    def generate_report_domain(self, template, domain, order=None, limit=None, output=None):
+        """
+        Generate DOCX report from template for the records matching a domain
+        
+        Matching ids are read from a server-side cursor in chunks, and each
+        chunk is prefetched and rendered before the next one is fetched.
+        
+        Args:
+            template: report.template record
+            domain: search domain on the template model
+            order: optional order specification
+            limit: optional maximum number of records
+            output: optional binary file receiving the document
+            
+        Returns:
+            bytes: Generated DOCX file content, or None when written to output
+        """
+        if not template.template_checksum:
+            raise UserError(_("Template file is missing"))
+        
+        doc = self._load_template_document(template)
+        
+        model = self.env[template.model_name]
+        chunks = (
+            model.browse(ids)
+            for ids in self._iter_domain_ids(model, domain, order, limit, self._get_chunk_size())
+        )
+        first = next(chunks, None)
+        if first is None:
+            raise UserError(_("No records found to generate report"))
+        
+        return self._render_chunks(doc, itertools.chain([first], chunks), template, output)
+
+    def _get_chunk_size(self):
+        """Return the number of records rendered at a time"""
+        chunk_size = self.env['ir.config_parameter'].sudo().get_param(
+            'odoo_dynamic_report.chunk_size', CHUNK_SIZE
+        )
+        return max(int(chunk_size), 1)
+
+    def _render_chunks(self, doc, chunks, template, output=None):
+        """Render chunks of records into output, or return the DOCX file content
+
+        The body of each finished chunk is spilled to a spooled temporary
+        file and the ORM cache is cleared, so memory is bounded by the
+        chunk size rather than by the number of records. The document is
+        written to output, or to a temporary file read back at the end
+        when no output is given.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            self._fill_template_multiple(doc, chunks, template, spool)
+            if output is not None:
+                self._save_spooled_document(doc, spool, output)
+                return None
+            with tempfile.TemporaryFile() as target:
+                self._save_spooled_document(doc, spool, target)
+                target.seek(0)
+                return target.read()
+
+    def _spill_body(self, doc, spool):
+        """Move the rendered body blocks of doc to spool"""
+        body = doc.element.body
+        for element in list(self._iter_body_blocks(doc)):
+            spool.write(etree.tostring(element, encoding='utf-8'))
+            body.remove(element)
+
+    def _save_spooled_document(self, doc, spool, output):
+        """Save doc to output with the spilled body blocks written back in place
+
+        The document is saved with a marker paragraph, then word/document.xml
+        is rewritten into output with the spool streamed in place of the
+        marker. output is a binary file, and need not be seekable.
+        """
+        token = f'report-body-{uuid.uuid4().hex}'
+        marker = OxmlElement('w:p')
+        run = OxmlElement('w:r')
+        text = OxmlElement('w:t')
+        text.text = token
+        run.append(text)
+        marker.append(run)
+        self._append_block(doc.element.body, marker)
+        
+        saved = BytesIO()
+        doc.save(saved)
+        
+        with zipfile.ZipFile(saved) as source, zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+            for item in source.infolist():
+                data = source.read(item.filename)
+                if item.filename != doc.part.partname.lstrip('/'):
+                    target.writestr(item, data)
+                    continue
+                
+                position = data.index(token.encode())
+                start = data.rindex(b'<w:p>', 0, position)
+                end = data.index(b'</w:p>', position) + len(b'</w:p>')
+                with target.open(item, 'w', force_zip64=True) as stream:
+                    stream.write(data[:start])
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, stream)
+                    stream.write(data[end:])
+
+    @api.model
+    def generate_report_zip(self, template, record_ids, output=None):
+        """
+        Generate a ZIP archive holding one DOCX document per record
+        
+        The template is parsed once and restored between records, and each
+        document is compressed into the archive as soon as it is filled.
+        
+        Args:
+            template: report.template record
+            record_ids: list of record IDs to generate documents for
+            output: optional binary file receiving the archive
+            
+        Returns:
+            bytes: ZIP file content, or None when written to output
+        """
+        if not template.template_checksum:
+            raise UserError(_("Template file is missing"))
+        
+        doc = self._load_template_document(template)
+        
+        model = self.env[template.model_name]
+        records = model.browse(record_ids)
+        
+        if not records:
+            raise UserError(_("No records found to generate report"))
+        
+        target = output if output is not None else BytesIO()
+        with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+            chunks = split_every(self._get_chunk_size(), records.ids, model.browse)
+            self._write_record_documents(archive, template, [(template, doc, '')], chunks)
+        
+        if output is None:
+            return target.getvalue()
+
+    @api.model
+    def iter_record_reports(self, template, record_ids):
+        """
+        Yield the DOCX document of each record, rendered separately
+        
+        The template is parsed once and records are prefetched in chunks,
+        as for ZIP archives.
+        
+        Args:
+            template: report.template record
+            record_ids: list of record IDs to generate documents for
+            
+        Yields:
+            tuple: (record, DOCX file content)
+        """
+        if not template.template_checksum:
+            raise UserError(_("Template file is missing"))
+        
+        doc = self._load_template_document(template)
+        model = self.env[template.model_name]
+        chunks = split_every(self._get_chunk_size(), model.browse(record_ids).exists().ids, model.browse)
+        
+        for _filename, record, filled in self._iter_record_documents(template, [(template, doc, '')], chunks):
+            output = BytesIO()
+            filled.save(output)
+            yield record, output.getvalue()
+
+    @api.model
+    def generate_report_pack(self, templates, record_ids, output_mode='merged', output=None):
+        """
+        Generate the reports of several templates for the same records
+        
+        The placeholders and loops of all templates are prefetched together,
+        once per chunk of records, and every template is rendered from the
+        same value table.
+        
+        Args:
+            templates: report.template records, all for the same model
+            record_ids: list of record IDs to generate reports for
+            output_mode: 'merged' for one document per template, 'zip' for
+                         one document per template and record
+            output: optional binary file receiving the archive
+            
+        Returns:
+            bytes: ZIP file content, or None when written to output
+        """
+        if not templates:
+            raise UserError(_("No templates selected"))
+        if len(set(templates.mapped('model_name'))) > 1:
+            raise UserError(_("All templates of a pack must be for the same model"))
+        missing = templates.filtered(lambda t: not t.template_checksum)
+        if missing:
+            raise UserError(_("Template file is missing: %s") % ', '.join(missing.mapped('name')))
+        
+        model = self.env[templates[0].model_name]
+        records = model.browse(record_ids)
+        
+        if not records:
+            raise UserError(_("No records found to generate report"))
+        
+        # Templates with the same name get their own folder or file
+        documents = []
+        names = set()
+        for template in templates:
+            name = self._get_unique_name(FILENAME_UNSAFE_PATTERN.sub('_', template.name), names)
+            documents.append((template, self._load_template_document(template), name))
+        
+        target = output if output is not None else BytesIO()
+        with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+            chunks = split_every(self._get_chunk_size(), records.ids, model.browse)
+            if output_mode == 'zip':
+                self._write_record_documents(archive, templates[0], documents, chunks)
+            else:
+                self._write_merged_documents(archive, templates[0], documents, chunks)
+        
+        if output is None:
+            return target.getvalue()
+
+    def _write_record_documents(self, archive, template, documents, chunks):
+        """Write one DOCX per document and record into archive
+
+        Args:
+            template: template whose options drive the prefetch
+            documents: list of (template, Document, folder) tuples
+            chunks: iterable of recordsets
+        """
+        for filename, _record, doc in self._iter_record_documents(template, documents, chunks):
+            with archive.open(filename, 'w', force_zip64=True) as stream:
+                doc.save(stream)
+
+    def _iter_record_documents(self, template, documents, chunks):
+        """Fill each document for each record in turn
+
+        Each document is parsed once and restored between records. The
+        filled document is only valid until the next item is requested.
+
+        Args:
+            template: template whose options drive the prefetch
+            documents: list of (template, Document, folder) tuples
+            chunks: iterable of recordsets
+
+        Yields:
+            tuple: (archive filename, record, filled Document)
+        """
+        trees, compiled = [], []
+        for doc_template, doc, folder in documents:
+            tree = self._collect_template_tree(doc)
+            pattern = doc_template.filename_pattern or DEFAULT_FILENAME_PATTERN
+            tree['placeholders'] |= {p.strip() for p in PLACEHOLDER_PATTERN.findall(pattern)}
+            trees.append(tree)
+            compiled.append((doc_template, doc, folder, pattern, self._snapshot_document(doc), set()))
+        tree = self._merge_template_trees(trees)
+        
+        for records, values, _last in self._iter_prefetched_chunks(chunks, tree, template):
+            for record in records:
+                for doc_template, doc, folder, pattern, snapshot, filenames in compiled:
+                    self._restore_document(snapshot)
+                    self._fill_template(doc, record, doc_template, values)
+                    filename = self._get_record_filename(pattern, record, doc_template, values, filenames)
+                    if folder:
+                        filename = f'{folder}/{filename}'
+                    yield filename, record, doc
+
+    def _write_merged_documents(self, archive, template, documents, chunks):
+        """Write one merged DOCX per document into archive
+
+        Every chunk is rendered into all documents before the next one is
+        prefetched; rendered bodies are spilled to a temporary file each.
+
+        Args:
+            template: template whose options drive the prefetch
+            documents: list of (template, Document, name) tuples
+            chunks: iterable of recordsets
+        """
+        trees = [self._collect_template_tree(doc) for _template, doc, _name in documents]
+        tree = self._merge_template_trees(trees)
+        
+        with ExitStack() as stack:
+            compiled = [
+                (doc_template, doc, name, *self._detach_template(doc),
+                 stack.enter_context(tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)))
+                for doc_template, doc, name in documents
+            ]
+            for records, values, last in self._iter_prefetched_chunks(chunks, tree, template):
+                for doc_template, doc, _name, blocks, sources, spool in compiled:
+                    self._fill_chunk(doc, blocks, sources, records, doc_template, values, last)
+                    self._spill_body(doc, spool)
+            
+            for _template, doc, name, _blocks, _sources, spool in compiled:
+                with archive.open(f'{name}.docx', 'w', force_zip64=True) as stream:
+                    self._save_spooled_document(doc, spool, stream)
+
+    def _snapshot_document(self, doc):
+        """Return the pristine content of doc, restored by _restore_document"""
+        roots = [(doc.part, doc.element.body)]
+        roots += [(part, part.element) for part in self._header_footer_parts(doc)]
+        return [
+            (part, root, [deepcopy(child) for child in root], set(part.rels))
+            for part, root in roots
+        ]
+
+    def _restore_document(self, snapshot):
+        """Restore the content and relationships of a snapshot document"""
+        for part, root, children, rIds in snapshot:
+            for child in list(root):
+                root.remove(child)
+            for child in children:
+                root.append(deepcopy(child))
+            
+            # Drop the images added for the previous record
+            for rId in set(part.rels) - rIds:
+                part.rels.pop(rId)
+                part.rels.related_parts.pop(rId, None)
+            _part_images.pop(part, None)
+
+    def _get_record_filename(self, pattern, record, template, values, filenames):
+        """Return the unique archive name of the document of record
+
+        Args:
+            pattern: filename with placeholders
+            filenames: names already used in the archive, updated
+        """
+        name = PLACEHOLDER_PATTERN.sub(
+            lambda match: self._resolve_placeholder(record, match.group(1).strip(), template, values),
+            pattern,
+        )
+        name = FILENAME_UNSAFE_PATTERN.sub('_', name).strip() or str(record.id)
+        if name.lower().endswith('.docx'):
+            name = name[:-5]
+        return self._get_unique_name(name, filenames) + '.docx'
+
+    def _get_unique_name(self, name, names):
+        """Return name, numbered if already in names, and add it to names"""
+        unique, index = name, 1
+        while unique in names:
+            index += 1
+            unique = f'{name} ({index})'
+        names.add(unique)
+        return unique
+
+    def _iter_domain_ids(self, model, domain, order=None, limit=None, chunk_size=CHUNK_SIZE):
+        """Yield lists of ids matching domain, read from a server-side cursor
+
+        Pending changes to the fields of the query are flushed before the
+        cursor is declared, as the cursor reads the database as of then.
+        """
+        query = model._search(domain, order=order, limit=limit)
+        cursor = SQL.identifier(f'report_ids_{uuid.uuid4().hex}')
+        declare = SQL('DECLARE %s NO SCROLL CURSOR FOR %s', cursor, query.select())
+        self.env.flush_query(declare)
+        self.env.cr.execute(declare)
+        try:
+            while True:
+                self.env.cr.execute(SQL('FETCH FORWARD %s FROM %s', chunk_size, cursor))
+                ids = [row[0] for row in self.env.cr.fetchall()]
+                if not ids:
+                    break
+                yield ids
+        finally:
+            self.env.cr.execute(SQL('CLOSE %s', cursor))
+
+    def _collect_placeholders(self, doc):
+        """Collect the placeholders resolved against the main record
+
+        Placeholders inside loops are skipped since they apply to the
+        related records, while headers and footers are included.
+        """
+        return self._collect_template_tree(doc)['placeholders']
+
+    def _collect_template_tree(self, doc):
+        """Return the loop tree of the body, headers and footers"""
+        compiled = _document_trees.get(doc.part)
+        if compiled is not None:
+            return deepcopy(compiled)
+        tree = self._collect_loops(list(self._iter_body_blocks(doc)))
+        for part in self._header_footer_parts(doc):
+            self._collect_loops(self._block_children(part.element), tree)
+        return tree
+
+    def _collect_loops(self, elements, node=None):
+        """Build the loop tree of a sequence of sibling elements
+
+        Loops are delimited the same way as when rendering: from the
+        paragraph or row holding {{#field}} to the one holding
+        {{/field}}, or that single element when the loop is not closed.
+
+        Returns:
+            dict: {'placeholders': set, 'loops': {field: node}} where each
+            nested node has the same structure
+        """
+        if node is None:
+            node = {'placeholders': set(), 'loops': {}}
+        
+        index = 0
+        while index < len(elements):
+            element = elements[index]
+            if element.tag == qn('w:tbl'):
+                self._collect_loops(element.findall(qn('w:tr')), node)
+                index += 1
+                continue
+            
+            loop = self._get_loop(element)
+            if loop:
+                end = self._find_loop_end(elements, index, loop)
+                child = node['loops'].setdefault(loop, {'placeholders': set(), 'loops': {}})
+                # Collected from a copy without the markers of the loop, as rendered
+                region = self._strip_loop_markers([deepcopy(e) for e in elements[index:end + 1]], loop, None)
+                self._collect_loops(region, child)
+                index = end + 1
+                continue
+            
+            if element.tag == qn('w:tr'):
+                for tc in iter_row_cells(element):
+                    self._collect_loops(self._block_children(tc), node)
+            else:
+                node['placeholders'].update(
+                    p for p in self._element_placeholders(element)
+                    if not p.startswith(('#', '/'))
+                )
+            index += 1
+        
+        return node
+
+    def _prefetch_values(self, records, placeholders, template, values=None):
+        """Build the value table of the batch
+
+        Records are browsed together, so the ORM fetches each field of the
+        path once for the whole batch instead of once per record, and
+        aggregates are computed with one query per relation.
+
+        Returns:
+            dict: {placeholder: {(model, record_id): rendered value}}
+        """
+        if values is None:
+            values = {}
+        self._prefetch_paths(records, placeholders)
+        
+        aggregates = [p for p in placeholders if self._parse_aggregate(p)]
+        # Aggregates over the same relation share their queries
+        with self._measure(', '.join(sorted(aggregates))) if aggregates else nullcontext():
+            computed = self._compute_aggregates(records, aggregates)
+        for placeholder, by_record in computed.items():
+            formatter = self._parse_aggregate(placeholder)[2]
+            values.setdefault(placeholder, {}).update({
+                key: self._format_value(value, formatter)
+                for key, value in by_record.items()
+            })
+        
+        for placeholder in placeholders:
+            if placeholder in aggregates:
+                continue
+            with self._measure(placeholder):
+                if self._parse_image_placeholder(placeholder):
+                    values.setdefault(placeholder, {}).update(
+                        self._prefetch_image_checksums(records, placeholder)
+                    )
+                    continue
+                values.setdefault(placeholder, {}).update({
+                    self._value_key(record): str(self._get_field_value(record, placeholder, template))
+                    for record in records
+                })
+        return values
+
+    def _value_key(self, record):
+        """Return the key of a record in the value table"""
+        return (record._name, record.id)
+
+    def _prefetch_paths(self, records, placeholders):
+        """Load the fields used by placeholders for all records at once"""
+        for placeholder in placeholders:
+            if self._parse_image_placeholder(placeholder) or self._parse_aggregate(placeholder):
+                continue
+            field_path = placeholder.split('|', 1)[0].strip()
+            try:
+                with self._measure(placeholder):
+                    records.mapped(field_path)
+            except (KeyError, AttributeError, ValueError):
+                # Invalid paths are reported when rendering
+                continue
+
+    def _prefetch_loops(self, records, loops, template, values):
+        """Load each loop level for all parent records at once
+
+        Every level is read with a single mapped() over the records of the
+        level above, so the number of queries depends on the nesting depth
+        of the template and not on the number of lines. The values of each
+        level are added to the value table.
+        """
+        for loop, node in loops.items():
+            if self._parse_group_loop(loop):
+                with self._measure('#' + loop):
+                    groups = self._compute_groups(records, loop, node['placeholders'])
+                values.setdefault('#' + loop, {}).update(groups)
+                all_groups = [g for gs in groups.values() for g in gs]
+                lines = self._group_lines(all_groups)
+                if not lines:
+                    continue
+                for child_loop, child in self._group_line_loops(node):
+                    related = lines
+                    if '|' in child_loop:
+                        with self._measure('#' + child_loop):
+                            related_by_group = self._search_group_lines(all_groups, child_loop)
+                        values.setdefault('#' + child_loop, {}).update(related_by_group)
+                        related = lines.browse().union(*related_by_group.values())
+                    if not related:
+                        continue
+                    with self._profile_scope(loop), self._profile_scope(child_loop):
+                        self._prefetch_values(related, child['placeholders'], template, values)
+                        self._prefetch_loops(related, child['loops'], template, values)
+                continue
+            
+            scope = loop
+            loop = self._preview_loop(records, loop)
+            with self._measure('#' + scope):
+                if '|' in loop:
+                    related_by_parent = self._search_loop_records(records, loop)
+                    values.setdefault('#' + loop, {}).update(related_by_parent)
+                    related = None
+                    for lines in related_by_parent.values():
+                        related = lines if related is None else related | lines
+                else:
+                    related = self._get_loop_records(records, loop)
+            if not related:
+                continue
+            with self._profile_scope(scope):
+                self._prefetch_values(related, node['placeholders'], template, values)
+                self._prefetch_loops(related, node['loops'], template, values)
+
+    def _parse_aggregate(self, placeholder):
+        """Parse an aggregate placeholder like 'sum(order_line.price_subtotal)'
+
+        Returns:
+            tuple: (function, path, formatter) or None
+        """
+        expression, _sep, formatter = placeholder.partition('|')
+        match = AGGREGATE_PATTERN.match(expression.strip())
+        if not match:
+            return None
+        return match.group(1), match.group(2), formatter.strip() or None
+
+    def _parse_group_loop(self, loop):
+        """Parse a grouped loop like 'group order_line by product_id.categ_id'
+
+        Returns:
+            tuple: (relation, key path) or None
+        """
+        match = GROUP_LOOP_PATTERN.match(loop)
+        return (match.group(1), match.group(2)) if match else None
+
+    def _group_line_loops(self, node):
+        """Return the (loop, node) items of the loops over the lines of a group node
+
+        Lines are iterated by {{#lines}}, or by a loop with modifiers like
+        {{#lines|order:name|limit:5}}.
+        """
+        return [
+            (loop, child) for loop, child in node['loops'].items()
+            if loop.split('|', 1)[0].strip() == 'lines'
+        ]
+
+    def _compute_aggregates(self, records, placeholders):
+        """Compute aggregate placeholders for all records
+
+        Aggregates over stored fields of a one2many are computed in SQL
+        with one _read_group per relation for the whole batch; other
+        aggregates are computed from the prefetched lines.
+
+        Returns:
+            dict: {placeholder: {(model, record_id): value}}
+        """
+        by_relation = {}
+        for placeholder in placeholders:
+            function, path, _formatter = self._parse_aggregate(placeholder)
+            relation, _sep, measure = path.partition('.')
+            by_relation.setdefault(relation, []).append((placeholder, function, measure))
+        
+        result = {}
+        for relation, aggregates in by_relation.items():
+            field = records._fields.get(relation)
+            if not field or field.type not in ('one2many', 'many2many'):
+                continue
+            
+            lines = self.env[field.comodel_name]
+            sql_aggregates = [
+                aggregate for aggregate in aggregates
+                if self._can_aggregate_in_sql(field, aggregate[1], aggregate[2])
+            ]
+            if sql_aggregates:
+                rows = lines._read_group(
+                    [(field.inverse_name, 'in', records.ids)],
+                    [field.inverse_name],
+                    self._aggregate_specs(sql_aggregates),
+                )
+                totals = {parent.id: self._read_aggregates(sql_aggregates, aggs) for parent, *aggs in rows}
+                empty = self._read_aggregates(sql_aggregates, None)
+                for placeholder, _function, _measure in sql_aggregates:
+                    result[placeholder] = {
+                        self._value_key(record): totals.get(record.id, empty)[placeholder]
+                        for record in records
+                    }
+            
+            for placeholder, function, measure in aggregates:
+                if placeholder in result:
+                    continue
+                result[placeholder] = {
+                    self._value_key(record): self._aggregate_lines(record[relation], function, measure)
+                    for record in records
+                }
+        
+        return result
+
+    def _can_aggregate_in_sql(self, field, function, measure):
+        """Check whether an aggregate over the lines of field can use SQL"""
+        if field.type != 'one2many' or not field.inverse_name or field.domain:
+            return False
+        lines = self.env[field.comodel_name]
+        inverse = lines._fields.get(field.inverse_name)
+        if not inverse or not inverse.store:
+            return False
+        if not measure:
+            return function == 'count'
+        measure_field = lines._fields.get(measure)
+        if not measure_field or not measure_field.store:
+            return False
+        if function in ('sum', 'avg'):
+            return measure_field.type in ('integer', 'float', 'monetary')
+        return function in ('min', 'max', 'count')
+
+    def _aggregate_specs(self, aggregates):
+        """Return the _read_group aggregate specs needed for aggregates
+
+        Averages are computed from the sum and the count so that groups
+        can be merged afterwards.
+        """
+        specs = ['__count']
+        for _placeholder, function, measure in aggregates:
+            if function == 'avg':
+                specs += [f'{measure}:sum', f'{measure}:count']
+            elif measure:
+                specs.append(f'{measure}:{function}')
+        return list(dict.fromkeys(specs))
+
+    def _read_aggregates(self, aggregates, row):
+        """Map a _read_group row to {placeholder: value}
+
+        Args:
+            row: aggregate values in _aggregate_specs order, or None for
+                 a parent without lines
+        """
+        specs = self._aggregate_specs(aggregates)
+        raw = dict(zip(specs, row)) if row is not None else {'__count': 0}
+        result = {}
+        for placeholder, function, measure in aggregates:
+            if function == 'avg':
+                count = raw.get(f'{measure}:count') or 0
+                result[placeholder] = raw[f'{measure}:sum'] / count if count else None
+            elif not measure:
+                result[placeholder] = raw['__count']
+            else:
+                value = raw.get(f'{measure}:{function}')
+                result[placeholder] = 0 if value is None and function in ('sum', 'count') else value
+        return result
+
+    def _merge_aggregates(self, aggregates, raw, row):
+        """Accumulate a _read_group row into raw aggregate values"""
+        for spec, value in zip(self._aggregate_specs(aggregates), row):
+            if spec not in raw or raw[spec] is None:
+                raw[spec] = value
+            elif value is not None:
+                function = spec.rsplit(':', 1)[-1]
+                raw[spec] = {'min': min, 'max': max}.get(function, lambda a, b: a + b)(raw[spec], value)
+        return raw
+
+    def _aggregate_lines(self, lines, function, measure):
+        """Compute an aggregate in Python over prefetched lines"""
+        if not measure:
+            return len(lines)
+        values = lines.mapped(measure)
+        if isinstance(values, models.BaseModel):
+            return len(values) if function == 'count' else None
+        values = [value for value in values if value is not False and value is not None]
+        return AGGREGATES_FUNCTIONS[function](values)
+
+    def _compute_groups(self, records, loop, placeholders=()):
+        """Compute the groups of a grouped loop for all records
+
+        Lines are grouped in SQL on the parent and the first field of the
+        key path, then merged on the full key path. Aggregate placeholders
+        of the loop are computed in the same query when possible.
+
+        Returns:
+            dict: {(model, record_id): [ReportGroup]}
+        """
+        relation, key_path = self._parse_group_loop(loop)
+        field = records._fields.get(relation)
+        result = {self._value_key(record): [] for record in records}
+        if not field or field.type not in ('one2many', 'many2many'):
+            return result
+        
+        lines_model = self.env[field.comodel_name]
+        aggregates = []
+        for placeholder in placeholders:
+            aggregate = self._parse_aggregate(placeholder)
+            if aggregate:
+                aggregates.append((placeholder, aggregate[0], aggregate[1]))
+        
+        key_field, _sep, key_rest = key_path.partition('.')
+        group_field = lines_model._fields.get(key_field)
+        # Date keys would need a granularity, group them in Python instead
+        if self._can_aggregate_in_sql(field, 'count', '') and group_field and group_field.store \
+                and group_field.type not in ('date', 'datetime') \
+                and all(self._can_aggregate_in_sql(field, a[1], a[2]) for a in aggregates):
+            rows = lines_model._read_group(
+                [(field.inverse_name, 'in', records.ids)],
+                [field.inverse_name, key_field],
+                self._aggregate_specs(aggregates) + ['id:array_agg'],
+            )
+            merged = {}
+            for parent, key, *aggs in rows:
+                if key_rest and isinstance(key, models.BaseModel):
+                    key = self._group_key(key, key_rest)
+                group_key = (parent.id, key)
+                if group_key not in merged:
+                    merged[group_key] = ({}, [])
+                self._merge_aggregates(aggregates, merged[group_key][0], aggs[:-1])
+                merged[group_key][1].extend(aggs[-1])
+            
+            specs = self._aggregate_specs(aggregates)
+            for (parent_id, key), (raw, line_ids) in merged.items():
+                parent_key = (records._name, parent_id)
+                group = ReportGroup((parent_key, loop, key), key, lines_model.browse(line_ids))
+                totals = self._read_aggregates(aggregates, [raw.get(spec) for spec in specs])
+                group.values.update({
+                    placeholder: self._format_value(totals[placeholder], self._parse_aggregate(placeholder)[2])
+                    for placeholder, _function, _measure in aggregates
+                })
+                result[parent_key].append(group)
+            return self._sort_groups(result)
+        
+        for record in records:
+            groups = {}
+            for line in record[relation]:
+                key = self._group_key(line, key_path)
+                if key not in groups:
+                    groups[key] = ReportGroup((self._value_key(record), loop, key), key, lines_model)
+                groups[key].lines |= line
+            for group in groups.values():
+                group.values.update({
+                    placeholder: self._format_value(
+                        self._aggregate_lines(group.lines, function, measure),
+                        self._parse_aggregate(placeholder)[2],
+                    )
+                    for placeholder, function, measure in aggregates
+                })
+            result[self._value_key(record)] = list(groups.values())
+        return self._sort_groups(result)
+
+    def _sort_groups(self, groups_by_parent):
+        """Sort the groups of each parent by key
+
+        Record keys follow the order of their model and other keys their
+        value, empty keys last, whether groups were read in SQL or Python.
+        """
+        keys = [group.key for groups in groups_by_parent.values() for group in groups]
+        records = [key for key in keys if isinstance(key, models.BaseModel)]
+        rank = {}
+        if records:
+            union = records[0].union(*records)
+            ordered = union.sudo().with_context(active_test=False).search([('id', 'in', union.ids)])
+            rank = {record_id: index for index, record_id in enumerate(ordered.ids)}
+        
+        def sort_key(group):
+            key = group.key
+            if isinstance(key, models.BaseModel):
+                return (not key, [rank.get(record_id, len(rank)) for record_id in key.ids])
+            if key is False or key is None:
+                return (True, 0)
+            return (False, key)
+        
+        for groups in groups_by_parent.values():
+            groups.sort(key=sort_key)
+        return groups_by_parent
+
+    def _group_key(self, record, path):
+        """Return the hashable group key of record for path"""
+        value = record.mapped(path)
+        if isinstance(value, models.BaseModel):
+            return value
+        return value[0] if value else False
+
+    def _group_lines(self, groups):
+        """Return the union of the lines of groups"""
+        lines = None
+        for group in groups:
+            lines = group.lines if lines is None else lines | group.lines
+        return lines
+
+    def _parse_loop_modifiers(self, loop):
+        """Parse a loop like 'order_line|order:sequence,id|where:display_type=False|limit:50'
+
+        Conditions of where are separated by commas and compared with
+        =, !=, <, <=, > or >=; values are Python literals or plain strings.
+
+        Returns:
+            tuple: (field, domain, order, limit)
+        """
+        field, *modifiers = [part.strip() for part in loop.split('|')]
+        domain, order, limit = [], None, None
+        for modifier in modifiers:
+            name, _sep, argument = modifier.partition(':')
+            name, argument = name.strip(), argument.strip()
+            if name == 'order' and argument:
+                order = argument
+            elif name == 'limit' and argument.isdigit():
+                limit = int(argument)
+            elif name == 'where' and argument:
+                for condition in argument.split(','):
+                    match = CONDITION_PATTERN.match(condition)
+                    if not match:
+                        raise UserError(_("Invalid loop condition: %s") % condition)
+                    path, operator, value = match.groups()
+                    try:
+                        value = ast.literal_eval(value)
+                    except (ValueError, SyntaxError):
+                        pass
+                    domain.append((path, operator, value))
+            else:
+                raise UserError(_("Invalid loop modifier: %s") % modifier)
+        return field, domain, order, limit
+
+    def _search_loop_records(self, records, loop):
+        """Return the records of a loop with modifiers for all parents
+
+        Filtering, sorting and limiting run in one query for the batch:
+        the limit applies per parent through a ROW_NUMBER() window, so
+        only the printed lines are loaded.
+
+        Returns:
+            dict: {(model, record_id): recordset}
+        """
+        if isinstance(records, ReportGroup):
+            return self._search_group_lines([records], loop)
+        
+        field_name, domain, order, limit = self._parse_loop_modifiers(loop)
+        field = records._fields.get(field_name)
+        if not field or field.type not in ('one2many', 'many2many'):
+            return {}
+        
+        lines = self.env[field.comodel_name]
+        inverse = lines._fields.get(field.inverse_name) if field.type == 'one2many' else None
+        if not inverse or not inverse.store or (field.domain and not isinstance(field.domain, list)):
+            # Relations without a stored inverse are filtered and sorted in
+            # one query over their prefetched lines, the limit is applied
+            # per parent afterwards
+            related = lines.search([('id', 'in', records[field_name].ids)] + domain, order=order)
+            result = {}
+            for record in records:
+                own = set(record[field_name].ids)
+                result[self._value_key(record)] = lines.browse(
+                    [line_id for line_id in related.ids if line_id in own][:limit]
+                )
+            return result
+        
+        domain = [(field.inverse_name, 'in', records.ids)] + list(field.domain or []) + domain
+        query = lines._search(domain)
+        parent_sql = lines._field_to_sql(lines._table, field.inverse_name, query)
+        order_sql = lines._order_to_sql(order or lines._order, query)
+        ranked = query.select(
+            SQL('%s AS id', SQL.identifier(lines._table, 'id')),
+            SQL('%s AS parent_id', parent_sql),
+            SQL('ROW_NUMBER() OVER (PARTITION BY %s ORDER BY %s) AS rank', parent_sql, order_sql),
+        )
+        # execute_query flushes the pending changes to the fields of the query
+        if limit is None:
+            rows = self.env.execute_query(
+                SQL('SELECT id, parent_id FROM (%s) AS ranked ORDER BY parent_id, rank', ranked)
+            )
+        else:
+            rows = self.env.execute_query(SQL(
+                'SELECT id, parent_id FROM (%s) AS ranked WHERE rank <= %s ORDER BY parent_id, rank',
+                ranked, limit,
+            ))
+        
+        line_ids = {}
+        for line_id, parent_id in rows:
+            line_ids.setdefault(parent_id, []).append(line_id)
+        return {
+            self._value_key(record): lines.browse(line_ids.get(record.id, []))
+            for record in records
+        }
+
+    def _search_group_lines(self, groups, loop):
+        """Return the lines of groups iterated by a loop with modifiers
+
+        The lines of all groups are filtered and sorted in one query, the
+        limit is applied per group afterwards.
+
+        Returns:
+            dict: {('report.group', group_id): recordset}
+        """
+        _field_name, domain, order, limit = self._parse_loop_modifiers(loop)
+        lines = self._group_lines(groups)
+        if lines is None:
+            return {}
+        related = lines.search([('id', 'in', lines.ids)] + domain, order=order)
+        result = {}
+        for group in groups:
+            own = set(group.lines.ids)
+            result[self._value_key(group)] = lines.browse(
+                [line_id for line_id in related.ids if line_id in own][:limit]
+            )
+        return result
+
+    def _get_invariant_placeholders(self, values):
+        """Return placeholders rendering to the same value for every record"""
+        return {
+            placeholder for placeholder, by_record in values.items()
+            if len(set(by_record.values())) <= 1
+        }
+
+    def _fill_template(self, doc, record, template, values=None):
+        """Fill template with single record data"""
+        # Process paragraphs and tables
+        self._process_elements(list(self._iter_body_blocks(doc)), doc._body, record, template, values)
         
         # Process headers and footers
-        for section in doc.sections:
-            self._process_section(section, record, template)
+        for part in self._header_footer_parts(doc):
+            self._process_story(part, record, template, values)
+
+    def _fill_template_multiple(self, doc, chunks, template, spool=None):
+        """Fill template with multiple records (page per record)
+
+        Records come in chunks that are prefetched and rendered one after
+        the other, so the whole batch never has to be loaded at once. The
+        template body is copied once per record.
+        
+        Args:
+            chunks: iterable of recordsets
+            spool: optional file receiving the body of each finished chunk
+        """
+        tree = self._collect_template_tree(doc)
+        blocks, sources = self._detach_template(doc)
+        for records, values, last in self._iter_prefetched_chunks(chunks, tree, template):
+            self._fill_chunk(doc, blocks, sources, records, template, values, last)
+            if spool is not None:
+                self._spill_body(doc, spool)
+
+    def _detach_template(self, doc):
+        """Remove the template blocks from the body to copy them per record
+
+        Returns:
+            tuple: (pristine body blocks, {rId: pristine header/footer element})
+        """
+        blocks = list(self._iter_body_blocks(doc))
+        for element in blocks:
+            doc.element.body.remove(element)
+        sources = {rId: deepcopy(part.element) for rId, part in self._header_footer_rels(doc)}
+        return blocks, sources
 
-    def _fill_template_multiple(self, doc, records, template):
-        """Fill template with multiple records (page per record)"""
-        from docx.oxml import OxmlElement
+    def _iter_prefetched_chunks(self, chunks, tree, template):
+        """Yield (records, values, last) for each chunk, with its value table
+
+        The next chunk is looked ahead to know which one is the last, and
+        the ORM cache is cleared once a chunk has been rendered.
+        """
+        chunks = iter(chunks)
+        records = next(chunks, None)
+        while records is not None:
+            following = next(chunks, None)
+            values = self._prefetch_values(records, tree['placeholders'], template)
+            self._prefetch_loops(records, tree['loops'], template, values)
+            yield records, values, following is None
+            if following is not None:
+                # Records of finished chunks are not read again
+                self.env.invalidate_all()
+            records = following
+
+    def _merge_template_trees(self, trees):
+        """Return the union of loop trees, as built by _collect_loops"""
+        merged = {'placeholders': set(), 'loops': {}}
+        for tree in trees:
+            merged['placeholders'] |= tree['placeholders']
+            for loop, node in tree['loops'].items():
+                if loop in merged['loops']:
+                    node = self._merge_template_trees([merged['loops'][loop], node])
+                merged['loops'][loop] = node
+        return merged
+
+    def _fill_chunk(self, doc, blocks, sources, records, template, values, last):
+        """Append a copy of the template blocks for each record of a chunk
+
+        Blocks, headers and footers whose placeholders are invariant across
+        the chunk are only rendered once: blocks are cloned from the first
+        filled copy and header/footer parts are shared by every record of
+        the chunk.
+
+        Args:
+            blocks: pristine template body blocks
+            sources: {rId: pristine header/footer element}
+            last: whether the chunk ends the document
+        """
+        body = doc.element.body
+        main_keys = {self._value_key(record) for record in records}
+        invariant = self._get_invariant_placeholders({
+            placeholder: {key: value for key, value in by_record.items() if key in main_keys}
+            for placeholder, by_record in values.items()
+            if not placeholder.startswith('#')
+        })
+        loop_blocks = self._loop_region_indexes(blocks)
+        block_is_invariant = [
+            index not in loop_blocks
+            and not self._element_has_loop(element)
+            and self._element_placeholders(element) <= invariant
+            for index, element in enumerate(blocks)
+        ]
+        
+        # Header/footer parts only need a copy per record when they hold
+        # record-specific values; invariant ones are filled once and shared.
+        # The original parts belong to the final section of the document,
+        # so earlier chunks get copies.
+        variant_parts = {}
+        shared_parts = {}
+        for rId, source in sources.items():
+            if not self._element_placeholders(source) <= invariant:
+                variant_parts[rId] = source
+                continue
+            if last:
+                part, shared_rId = doc.part.related_parts[rId], rId
+            else:
+                part, shared_rId = self._copy_header_footer_part(doc, rId, source)
+            self._process_story(part, records[0], template, values)
+            shared_parts[rId] = shared_rId
+        
+        rendered_blocks = {}
+        last_index = len(records) - 1
+        for index, record in enumerate(records):
+            new_elements = []
+            new_invariant_blocks = {}
+            for block_index, element in enumerate(blocks):
+                if block_index in rendered_blocks:
+                    self._append_block(body, deepcopy(rendered_blocks[block_index]))
+                    continue
+                
+                new_element = deepcopy(element)
+                self._append_block(body, new_element)
+                new_elements.append(new_element)
+                if block_is_invariant[block_index]:
+                    new_invariant_blocks[block_index] = new_element
+            
+            self._process_elements(new_elements, doc._body, record, template, values)
+            rendered_blocks.update(new_invariant_blocks)
+            
+            if last and index == last_index:
+                break
+            
+            if variant_parts or (shared_parts and index == last_index):
+                # Close the record in its own section so it gets its own
+                # header and footer parts, and close each chunk so its
+                # shared parts stop at its last record
+                separator = self._new_section_break(doc)
+                self._relink_header_footer_parts(
+                    doc, separator, variant_parts, shared_parts, record, template, values
+                )
+            else:
+                separator = self._new_page_break()
+            self._append_block(body, separator)
+        
+        # The original parts belong to the last record's section
+        if last:
+            for rId in variant_parts:
+                part = doc.part.related_parts[rId]
+                self._process_story(part, records[last_index], template, values)
+
+    def _iter_body_blocks(self, doc):
+        """Iterate the body content elements, skipping the final sectPr"""
+        for element in doc.element.body.iterchildren():
+            if element.tag != qn('w:sectPr'):
+                yield element
+
+    def _append_block(self, body, element):
+        """Append a block element to the body, before the final sectPr"""
+        sect_pr = body.find(qn('w:sectPr'))
+        if sect_pr is not None:
+            sect_pr.addprevious(element)
+        else:
+            body.append(element)
+
+    def _block_children(self, element):
+        """Return the paragraphs and tables directly under an element"""
+        return [child for child in element if child.tag in (qn('w:p'), qn('w:tbl'))]
+
+    def _loop_region_indexes(self, elements):
+        """Return the indexes of the elements belonging to block loops"""
+        indexes = set()
+        index = 0
+        while index < len(elements):
+            loop = self._get_loop(elements[index]) if elements[index].tag == qn('w:p') else None
+            end = self._find_loop_end(elements, index, loop) if loop else index
+            if loop:
+                indexes.update(range(index, end + 1))
+            index = end + 1
+        return indexes
+
+    def _process_elements(self, elements, parent, record, template, values=None):
+        """Fill a sequence of sibling paragraphs and tables, expanding block loops"""
+        index = 0
+        while index < len(elements):
+            element = elements[index]
+            loop = self._get_loop(element) if element.tag == qn('w:p') else None
+            if loop:
+                end = self._find_loop_end(elements, index, loop)
+                self._process_block_loop(elements[index:end + 1], parent, record, loop, template, values)
+                index = end + 1
+            else:
+                self._fill_block(element, parent, record, template, values)
+                index += 1
+
+    def _process_block_loop(self, elements, parent, record, loop, template, values=None):
+        """Repeat the paragraphs and tables of a block loop for each related record"""
+        region = self._strip_loop_markers(elements, loop, parent)
+        if not region:
+            return
+        
+        lines, omitted = self._cut_preview_lines(self._get_loop_records(record, loop, values))
+        with self._profile_scope(loop):
+            for related_record in lines:
+                copies = [deepcopy(element) for element in region]
+                for element in copies:
+                    region[0].addprevious(element)
+                self._process_elements(copies, parent, related_record, template, values)
         
-        # Process first record
-        self._fill_template(doc, records[0], template)
+        if omitted:
+            region[0].addprevious(self._new_preview_note(_("%s more lines not shown in preview") % omitted))
         
-        # For each additional record, add page break and duplicate content
-        for record in records[1:]:
-            # Add page break
-            doc.add_page_break()
+        for element in region:
+            element.getparent().remove(element)
+
+    def _fill_block(self, element, parent, record, template, values=None):
+        """Fill a body-level paragraph or table element"""
+        if element.tag == qn('w:p'):
+            self._process_paragraph(Paragraph(element, parent), record, template, values)
+        elif element.tag == qn('w:tbl'):
+            self._process_table(Table(element, parent), record, template, values)
+
+    def _new_page_break(self):
+        """Return a paragraph element holding a page break"""
+        paragraph = OxmlElement('w:p')
+        run = OxmlElement('w:r')
+        br = OxmlElement('w:br')
+        br.set(qn('w:type'), 'page')
+        run.append(br)
+        paragraph.append(run)
+        return paragraph
+
+    def _new_section_break(self, doc):
+        """Return a paragraph element closing a section laid out like the body"""
+        paragraph = OxmlElement('w:p')
+        p_pr = OxmlElement('w:pPr')
+        p_pr.append(deepcopy(doc.element.body.sectPr))
+        paragraph.append(p_pr)
+        return paragraph
+
+    def _relink_header_footer_parts(self, doc, separator, variant_parts, shared_parts, record, template, values):
+        """Point the separator's section to the header/footer parts of record
+
+        Shared parts are referenced as they are, variant parts get a fresh
+        copy filled for record.
+        """
+        for reference in separator.iter(qn('w:headerReference'), qn('w:footerReference')):
+            rId = reference.get(qn('r:id'))
+            if rId in shared_parts:
+                reference.set(qn('r:id'), shared_parts[rId])
+                continue
+            if rId not in variant_parts:
+                continue
             
-            # Process new record
-            self._fill_template(doc, record, template)
+            new_part, new_rId = self._copy_header_footer_part(doc, rId, variant_parts[rId])
+            reference.set(qn('r:id'), new_rId)
+            self._process_story(new_part, record, template, values)
+
+    def _copy_header_footer_part(self, doc, rId, source):
+        """Add a header or footer part holding a copy of source
+
+        Returns:
+            tuple: (new part, new rId)
+        """
+        if doc.part.rels[rId].reltype == RT.HEADER:
+            new_part, new_rId = doc.part.add_header_part()
+        else:
+            new_part, new_rId = doc.part.add_footer_part()
+        
+        # Carry over the relationships (images, hyperlinks) of the source
+        source_part = doc.part.related_parts[rId]
+        for rel in source_part.rels.values():
+            target = rel.target_ref if rel.is_external else rel.target_part
+            new_part.rels.add_relationship(rel.reltype, target, rel.rId, rel.is_external)
+        
+        new_element = new_part.element
+        for child in list(new_element):
+            new_element.remove(child)
+        for child in source:
+            new_element.append(deepcopy(child))
+        return new_part, new_rId
+
+    def _header_footer_rels(self, doc):
+        """Return (rId, part) pairs of the document headers and footers"""
+        return [
+            (rel.rId, rel.target_part)
+            for rel in doc.part.rels.values()
+            if not rel.is_external and rel.reltype in (RT.HEADER, RT.FOOTER)
+        ]
+
+    def _header_footer_parts(self, doc):
+        """Return the header and footer parts of the document"""
+        return [part for rId, part in self._header_footer_rels(doc)]
+
+    def _process_story(self, part, record, template, values=None):
+        """Process paragraphs and tables of a header or footer part"""
+        container = BlockItemContainer(part.element, part)
+        self._process_elements(self._block_children(part.element), container, record, template, values)
+
+    def _element_placeholders(self, element):
+        """Return the placeholders found in the paragraphs of an element"""
+        placeholders = set()
+        for paragraph in element.iter(qn('w:p')):
+            text = ''.join(t.text or '' for t in paragraph.iter(qn('w:t')))
+            placeholders.update(m.strip() for m in PLACEHOLDER_PATTERN.findall(text))
+        return placeholders
+
+    def _paragraph_texts(self, element):
+        """Iterate the text of each paragraph of an element"""
+        for paragraph in element.iter(qn('w:p')):
+            yield ''.join(t.text or '' for t in paragraph.iter(qn('w:t')))
+
+    def _element_text(self, element):
+        """Return the text of an element, one line per paragraph"""
+        return '\n'.join(self._paragraph_texts(element))
+
+    def _own_paragraphs(self, element):
+        """Return the paragraphs whose loop markers belong to element
+
+        A paragraph holds its own markers, a table row those of the
+        paragraphs directly in its cells; markers in nested tables belong
+        to the rows of these tables.
+        """
+        if element.tag == qn('w:p'):
+            return [element]
+        if element.tag == qn('w:tr'):
+            return [
+                child for tc in iter_row_cells(element)
+                for child in tc.iterchildren(qn('w:p'))
+            ]
+        return []
+
+    def _iter_loop_markers(self, elements):
+        """Yield (index, paragraph element, match) for the loop markers of elements"""
+        for index, element in enumerate(elements):
+            for p in self._own_paragraphs(element):
+                for match in LOOP_MARKER_PATTERN.finditer(Paragraph(p, None).text):
+                    yield index, p, match
+
+    def _get_loop(self, element):
+        """Return the loop opened in a paragraph or table row, if any"""
+        for _index, _p, match in self._iter_loop_markers([element]):
+            if match.group(1) == '#':
+                return match.group(2).strip()
+        return None
+
+    def _find_loop_markers(self, elements, loop):
+        """Return the markers opening and closing loop in elements
 
-    def _process_paragraph(self, paragraph, record, template):
+        The loop is opened by its first marker in the first element. Loops
+        of the same name opened inside it are skipped, so the closing
+        marker is the one at the level of the loop.
+
+        Returns:
+            tuple: (index, paragraph element, match) of the opening marker,
+            and of the closing marker or None when the loop is not closed
+        """
+        close_name = self._loop_close_name(loop)
+        opening, depth = None, 0
+        for index, p, match in self._iter_loop_markers(elements):
+            name = match.group(2).strip()
+            if match.group(1) == '#':
+                if opening is None and index == 0 and name == loop:
+                    opening, depth = (index, p, match), 1
+                elif opening is not None and self._loop_close_name(name) == close_name:
+                    depth += 1
+            elif opening is not None and name == close_name:
+                depth -= 1
+                if not depth:
+                    return opening, (index, p, match)
+        return opening, None
+
+    def _find_loop_end(self, elements, start, loop):
+        """Return the index of the element closing loop
+
+        The loop may be closed in its opening element. An unclosed loop
+        only spans its opening element.
+        """
+        _opening, closing = self._find_loop_markers(elements[start:], loop)
+        return start + closing[0] if closing else start
+
+    def _loop_close_name(self, loop):
+        """Return the name closing a loop
+
+        Grouped loops are closed by {{/group}}, loops with modifiers by
+        their field only, e.g. {{/order_line}}.
+        """
+        if self._parse_group_loop(loop):
+            return 'group'
+        return loop.split('|', 1)[0].strip()
+
+    def _strip_loop_markers(self, elements, loop, parent):
+        """Remove the markers of loop, dropping elements holding only markers
+
+        Only the markers opening and closing the loop itself are removed:
+        markers of nested loops of the same name are kept for the records
+        of the loop.
+
+        Returns:
+            list: the remaining elements
+        """
+        spans = {}
+        marked = set()
+        for marker in self._find_loop_markers(elements, loop):
+            if marker is not None:
+                index, p, match = marker
+                spans.setdefault(p, []).append(match.span())
+                marked.add(index)
+        for p, paragraph_spans in spans.items():
+            paragraph = Paragraph(p, parent)
+            text = paragraph.text
+            for start, end in sorted(paragraph_spans, reverse=True):
+                text = text[:start] + text[end:]
+            self._set_paragraph_text(paragraph, text)
+        
+        region = []
+        for index, element in enumerate(elements):
+            if index in marked and not self._element_text(element).strip() \
+                    and not any(True for _d in element.iter(qn('w:drawing'))):
+                if element.getparent() is not None:
+                    element.getparent().remove(element)
+            else:
+                region.append(element)
+        return region
+
+    def _get_loop_records(self, records, loop, values=None):
+        """Return the related records, or groups, iterated by a loop"""
+        if self._parse_group_loop(loop):
+            key = self._value_key(records)
+            groups = values.get('#' + loop, {}).get(key) if values else None
+            if groups is None:
+                groups = self._compute_groups(records, loop)[key]
+            return groups
+        
+        loop = self._preview_loop(records, loop)
+        if '|' in loop:
+            key = self._value_key(records)
+            related = values.get('#' + loop, {}).get(key) if values else None
+            if related is None:
+                related = self._search_loop_records(records, loop).get(key, [])
+            return related
+        
+        try:
+            related = records.mapped(loop)
+        except (KeyError, AttributeError, ValueError):
+            return []
+        return related if isinstance(related, models.BaseModel) else []
+
+    def _element_has_loop(self, element):
+        """Check whether an element contains loop markers"""
+        return any(
+            p.startswith(('#', '/')) for p in self._element_placeholders(element)
+        )
+
+    def _process_paragraph(self, paragraph, record, template, values=None):
         """Process a single paragraph and replace placeholders"""
         if not paragraph.text:
             return
         
         # Find all placeholders {{field_name}}
         text = paragraph.text
-        placeholders = re.findall(r'\{\{([^}]+)\}\}', text)
+        placeholders = PLACEHOLDER_PATTERN.findall(text)
+        images = {}
         
         for placeholder in placeholders:
+            # Images are inserted as pictures once the text is replaced
+            image = self._parse_image_placeholder(placeholder.strip())
+            if image:
+                images[f'{{{{{placeholder}}}}}'] = image
+                continue
+            
             # Get field value
-            value = self._get_field_value(record, placeholder.strip(), template)
+            value = self._resolve_placeholder(record, placeholder.strip(), template, values)
             
             # Replace placeholder
             text = text.replace(f'{{{{{placeholder}}}}}', str(value))
         
+        if images and paragraph.runs:
+            self._replace_image_placeholders(paragraph, text, images, record, values)
+            return
+        
         # Update paragraph text if changed
         if text != paragraph.text:
-            # Preserve formatting by replacing runs
-            if paragraph.runs:
-                paragraph.runs[0].text = text
-                for run in paragraph.runs[1:]:
-                    run.text = ''
-            else:
-                paragraph.text = text
+            self._set_paragraph_text(paragraph, text)
 
-    def _process_table(self, table, record, template):
+    def _set_paragraph_text(self, paragraph, text):
+        """Replace the paragraph text, keeping the formatting of the first run"""
+        # Preserve formatting by replacing runs
+        if paragraph.runs:
+            paragraph.runs[0].text = text
+            for run in paragraph.runs[1:]:
+                run.text = ''
+        else:
+            paragraph.text = text
+
+    def _parse_image_placeholder(self, placeholder):
+        """Parse an image placeholder like 'image_1920|image:4cm'
+
+        The size is a width, or width and height separated by 'x', in
+        cm, mm, in, pt or px (default cm).
+
+        Returns:
+            tuple: (field_path, width, height) with sizes in EMU or None,
+            or None when the placeholder is not an image
+        """
+        if '|' not in placeholder:
+            return None
+        
+        field_path, formatter = placeholder.split('|', 1)
+        formatter = formatter.strip()
+        if formatter != 'image' and not formatter.startswith('image:'):
+            return None
+        
+        sizes = []
+        size_spec = formatter[len('image:'):].lower() if ':' in formatter else ''
+        for size in re.split(r'x(?=\s*[\d.])', size_spec) if size_spec else []:
+            match = IMAGE_SIZE_PATTERN.match(size.strip())
+            if not match:
+                return None
+            sizes.append(int(float(match.group(1)) * EMU_PER_UNIT[match.group(2) or 'cm']))
+        
+        if len(sizes) > 2:
+            return None
+        sizes += [None] * (2 - len(sizes))
+        return (field_path.strip(), sizes[0], sizes[1])
+
+    def _get_field_owner(self, record, field_path):
+        """Return (record holding the last field of field_path, field name)"""
+        parts = field_path.split('.')
+        owner = record
+        for part in parts[:-1]:
+            if isinstance(owner, ReportGroup):
+                owner = getattr(owner, part, None)
+                continue
+            if not owner or part not in owner._fields or not owner._fields[part].relational:
+                return None, parts[-1]
+            owner = owner[part][:1]
+        return (owner or None), parts[-1]
+
+    def _prefetch_image_checksums(self, records, placeholder):
+        """Return {(model, record_id): image checksum} for an image placeholder"""
+        field_path = self._parse_image_placeholder(placeholder)[0]
+        owners = {self._value_key(record): self._get_field_owner(record, field_path) for record in records}
+        
+        targets = {}
+        for owner, fname in owners.values():
+            if owner:
+                targets.setdefault(owner._name, set()).add(owner.id)
+        
+        checksums = {}
+        for model_name, ids in targets.items():
+            fname = field_path.split('.')[-1]
+            by_id = self._get_image_checksums(self.env[model_name].browse(list(ids)), fname)
+            checksums.update({(model_name, rid): checksum for rid, checksum in by_id.items()})
+        
+        return {
+            key: checksums.get((owner._name, owner.id), '') if owner else ''
+            for key, (owner, fname) in owners.items()
+        }
+
+    def _get_image_checksums(self, records, fname):
+        """Return {record_id: checksum} of the images stored in field fname
+
+        Stored attachment fields are identified by their attachment
+        checksum, read for all records in one query, so the image data
+        itself is only loaded when it is not already cached.
+        """
+        field = records._fields.get(fname)
+        if not records or not field or field.type != 'binary':
+            return {}
+        
+        if field.attachment and field.store:
+            attachments = self.env['ir.attachment'].sudo().search_read([
+                ('res_model', '=', records._name),
+                ('res_field', '=', fname),
+                ('res_id', 'in', records.ids),
+            ], ['res_id', 'checksum'])
+            return {attachment['res_id']: attachment['checksum'] for attachment in attachments}
+        
+        return {
+            record.id: hashlib.sha1(record[fname]).hexdigest()
+            for record in records if record[fname]
+        }
+
+    def _replace_image_placeholders(self, paragraph, text, images, record, values=None):
+        """Write text into the paragraph, turning image placeholders into pictures"""
+        first_run = paragraph.runs[0]
+        for run in paragraph.runs[1:]:
+            run.text = ''
+        
+        pattern = '(%s)' % '|'.join(re.escape(token) for token in images)
+        tokens = re.split(pattern, text)
+        first_run.text = tokens[0]
+        
+        for token in tokens[1:]:
+            if token in images:
+                inline = self._get_image_inline(paragraph.part, record, token[2:-2].strip(), images[token], values)
+                if inline is not None:
+                    self._clone_run(paragraph, first_run)._r.add_drawing(inline)
+            elif token:
+                self._clone_run(paragraph, first_run).text = token
+
+    def _clone_run(self, paragraph, run):
+        """Append an empty run with the formatting of run to the paragraph"""
+        new_r = deepcopy(run._r)
+        for child in list(new_r):
+            if child.tag != qn('w:rPr'):
+                new_r.remove(child)
+        paragraph._p.append(new_r)
+        return Run(new_r, paragraph)
+
+    def _get_image_inline(self, part, record, placeholder, image, values=None):
+        """Return a picture inline element for an image placeholder"""
+        field_path, width, height = image
+        owner, fname = self._get_field_owner(record, field_path)
+        
+        by_record = values.get(placeholder) if values else None
+        if by_record is not None and self._value_key(record) in by_record:
+            checksum = by_record[self._value_key(record)]
+        elif owner:
+            checksum = self._get_image_checksums(owner, fname).get(owner.id)
+        else:
+            checksum = None
+        
+        if not checksum:
+            return None
+        
+        key = (checksum, width, height)
+        cached = image_cache.get(key)
+        if cached is None:
+            try:
+                cached = self._resize_image(base64.b64decode(owner[fname]), width, height)
+            except Exception as e:
+                _logger.warning(f"Error rendering image for {field_path}: {e}")
+                return None
+            image_cache.set(key, cached)
+        data, width_px, height_px = cached
+        
+        # Each image is added to a part once and referenced afterwards
+        registry = _part_images.setdefault(part, {'images': {}, 'next_id': part.next_id})
+        if key not in registry['images']:
+            rId, docx_image = part.get_or_add_image(BytesIO(data))
+            registry['images'][key] = (rId, docx_image.filename)
+        rId, filename = registry['images'][key]
+        
+        cx, cy = self._scale_image(width_px, height_px, width, height)
+        shape_id = registry['next_id']
+        registry['next_id'] += 1
+        return CT_Inline.new_pic_inline(shape_id, rId, filename, cx, cy)
+
+    def _resize_image(self, data, width, height):
+        """Resize and re-encode an image for the requested size in EMU
+
+        Returns:
+            tuple: (image data, width in px, height in px)
+        """
+        size = (
+            int(width * IMAGE_DPI / EMU_PER_INCH) if width else 0,
+            int(height * IMAGE_DPI / EMU_PER_INCH) if height else 0,
+        )
+        if size != (0, 0):
+            data = image_process(data, size=size)
+        width_px, height_px = Image.open(BytesIO(data)).size
+        return data, width_px, height_px
+
+    def _scale_image(self, width_px, height_px, width, height):
+        """Return the (cx, cy) EMU extent keeping the image aspect ratio"""
+        if width and height:
+            return width, height
+        if width:
+            return width, int(width * height_px / width_px)
+        if height:
+            return int(height * width_px / height_px), height
+        return width_px * EMU_PER_UNIT['px'], height_px * EMU_PER_UNIT['px']
+
+    def _process_table(self, table, record, template, values=None):
         """Process table and handle loops for one2many fields"""
-        for row in table.rows:
-            # Check if this is a loop row {{#field_name}}
-            row_text = ' '.join([cell.text for cell in row.cells])
+        self._process_rows(table, list(table._tbl.tr_lst), record, template, values)
+
+    def _process_rows(self, table, rows, record, template, values=None):
+        """Process table rows, expanding row loops"""
+        index = 0
+        while index < len(rows):
+            # Check if this row opens a loop {{#field_name}}
+            loop = self._get_loop(rows[index])
+            if loop:
+                end = self._find_loop_end(rows, index, loop)
+                self._process_table_loop(table, rows[index:end + 1], record, loop, template, values)
+                index = end + 1
+                continue
             
-            loop_match = re.search(r'\{\{#(\w+)\}\}', row_text)
-            if loop_match:
-                field_name = loop_match.group(1)
-                self._process_table_loop(table, row, record, field_name, template)
-            else:
-                # Normal row - just replace placeholders
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        self._process_paragraph(paragraph, record, template)
-
-    def _process_table_loop(self, table, template_row, record, field_name, template):
-        """Process one2many field in table (duplicate rows)"""
-        if not hasattr(record, field_name):
+            # Normal row - just replace placeholders
+            for tc in iter_row_cells(rows[index]):
+                self._process_elements(self._block_children(tc), _Cell(tc, table), record, template, values)
+            index += 1
+
+    def _process_table_loop(self, table, rows, record, loop, template, values=None):
+        """Process one2many field in table (duplicate rows)
+
+        The rows from the one opening the loop to the one closing it are
+        repeated for each related record; nested loops in these rows are
+        expanded with the related record.
+        """
+        region = self._strip_loop_markers(rows, loop, table)
+        if not region:
             return
         
-        related_records = getattr(record, field_name)
-        if not related_records:
-            return
+        lines, omitted = self._cut_preview_lines(self._get_loop_records(record, loop, values))
+        with self._profile_scope(loop):
+            for related_record in lines:
+                copies = [deepcopy(row) for row in region]
+                for row in copies:
+                    region[0].addprevious(row)
+                self._process_rows(table, copies, related_record, template, values)
         
-        # Get row index
-        row_index = table.rows.index(template_row)
+        if omitted:
+            region[0].addprevious(self._new_preview_note_row(
+                region[0], _("%s more lines not shown in preview") % omitted
+            ))
         
-        # Process each related record
-        for idx, related_record in enumerate(related_records):
-            if idx > 0:
-                # Duplicate row
-                new_row = self._duplicate_table_row(table, row_index + idx)
-            else:
-                new_row = template_row
-            
-            # Fill row with related record data
-            for cell in new_row.cells:
-                for paragraph in cell.paragraphs:
-                    # Remove loop markers
-                    text = paragraph.text.replace(f'{{{{#{field_name}}}}}', '')
-                    text = text.replace(f'{{{{/{field_name}}}}}', '')
-                    paragraph.text = text
-                    
-                    # Process placeholders with related record
-                    self._process_paragraph(paragraph, related_record, template)
-
-    def _duplicate_table_row(self, table, row_index):
-        """Duplicate a table row"""
-        from copy import deepcopy
-        
-        row = table.rows[row_index]
-        new_row = table.add_row()
-        
-        # Copy cell content
-        for idx, cell in enumerate(row.cells):
-            new_cell = new_row.cells[idx]
-            new_cell.text = cell.text
+        for row in region:
+            row.getparent().remove(row)
+
+    def _new_preview_note_row(self, row, text):
+        """Return an empty copy of row holding a preview note in its first cell"""
+        note_row = deepcopy(row)
+        for index, tc in enumerate(iter_row_cells(note_row)):
+            for child in self._block_children(tc):
+                tc.remove(child)
+            tc.append(self._new_preview_note(text) if index == 0 else OxmlElement('w:p'))
+        return note_row
+
+    def _resolve_placeholder(self, record, placeholder, template, values=None):
+        """Return the placeholder value, from the value table when prefetched"""
+        if isinstance(record, ReportGroup) and placeholder in record.values:
+            return record.values[placeholder]
+        
+        by_record = values.get(placeholder) if values else None
+        key = self._value_key(record)
+        if by_record is not None and key in by_record:
+            return by_record[key]
+        
+        # Values missing from the value table are read record by record
+        with self._measure(placeholder):
+            aggregate = self._parse_aggregate(placeholder)
+            if aggregate:
+                function, path, formatter = aggregate
+                try:
+                    if isinstance(record, ReportGroup):
+                        # Inside a grouped loop aggregates apply to the group lines
+                        lines, measure = record.lines, path
+                    else:
+                        relation, _sep, measure = path.partition('.')
+                        lines = record[relation]
+                    return self._format_value(self._aggregate_lines(lines, function, measure), formatter)
+                except Exception as e:
+                    _logger.warning(f"Error computing aggregate {placeholder}: {e}")
+                    return f"[Error: {placeholder}]"
             
-            # Copy formatting
-            for paragraph in cell.paragraphs:
-                new_paragraph = new_cell.paragraphs[0] if new_cell.paragraphs else new_cell.add_paragraph()
-                for run in paragraph.runs:
-                    new_run = new_paragraph.add_run(run.text)
-                    new_run.bold = run.bold
-                    new_run.italic = run.italic
-                    new_run.underline = run.underline
-        
-        return new_row
-
-    def _process_section(self, section, record, template):
-        """Process headers and footers"""
-        if section.header:
-            for paragraph in section.header.paragraphs:
-                self._process_paragraph(paragraph, record, template)
-        
-        if section.footer:
-            for paragraph in section.footer.paragraphs:
-                self._process_paragraph(paragraph, record, template)
+            return self._get_field_value(record, placeholder, template)
 
     def _get_field_value(self, record, field_path, template):
         """Get field value from record using field path"""
@@ -281,8 +2150,10 @@ class ReportDocxGenerator(models.AbstractModel):
     def _extract_placeholders(self, template_data):
         """Extract all placeholders from template"""
         template_bytes = base64.b64decode(template_data)
-        doc = Document(BytesIO(template_bytes))
-        
+        return self._extract_document_placeholders(Document(BytesIO(template_bytes)))
+
+    def _extract_document_placeholders(self, doc):
+        """Extract all placeholders from a parsed template document"""
         placeholders = set()
         
         # Extract from paragraphs
@@ -292,11 +2163,9 @@ class ReportDocxGenerator(models.AbstractModel):
         
         # Extract from tables
         for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        matches = re.findall(r'\{\{([^}]+)\}\}', paragraph.text)
-                        placeholders.update([m.strip() for m in matches])
+            for tc in iter_table_cells(table._tbl):
+                matches = re.findall(r'\{\{([^}]+)\}\}', cell_text(tc))
+                placeholders.update([m.strip() for m in matches])
         
         # Remove loop markers
         placeholders = {p for p in placeholders if not p.startswith('#') and not p.startswith('/')}
@@ -2,12 +2,24 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo import models, api, _
-from odoo.exceptions import ValidationError
-import re
+from odoo.exceptions import UserError, ValidationError
+from docx import Document
+from io import BytesIO
+from .report_docx_generator import LOOP_OPEN_PATTERN
+from .table_walker import cell_text, iter_row_cells
+import base64
+import hashlib
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Cost estimate defaults: relational hops of a placeholder path, nested
+# one2many/many2many levels, and estimated queries per printed record
+# above which a template is flagged
+LINT_MAX_HOPS = 3
+LINT_MAX_FANOUT = 2
+LINT_MAX_QUERIES = 30
+
 
 class ReportParser(models.AbstractModel):
     _name = 'report.parser'
@@ -24,8 +36,13 @@ class ReportParser(models.AbstractModel):
         Returns:
             dict: Parsed template information
         """
-        placeholders = self._extract_placeholders(template_content)
-        structure = self._analyze_structure(template_content)
+        template_bytes = base64.b64decode(template_content)
+        return self._parse_document(Document(BytesIO(template_bytes)))
+
+    def _parse_document(self, doc):
+        """Extract field references and structure from a parsed template document"""
+        placeholders = self.env['report.docx.generator']._extract_document_placeholders(doc)
+        structure = self._analyze_document(doc)
         
         return {
             'placeholders': placeholders,
@@ -40,13 +57,11 @@ class ReportParser(models.AbstractModel):
 
     def _analyze_structure(self, template_content):
         """Analyze template structure (tables, sections, etc.)"""
-        from docx import Document
-        from io import BytesIO
-        import base64
-        
         template_bytes = base64.b64decode(template_content)
-        doc = Document(BytesIO(template_bytes))
-        
+        return self._analyze_document(Document(BytesIO(template_bytes)))
+
+    def _analyze_document(self, doc):
+        """Analyze the structure of a parsed template document"""
         structure = {
             'paragraph_count': len(doc.paragraphs),
             'table_count': len(doc.tables),
@@ -64,9 +79,9 @@ class ReportParser(models.AbstractModel):
             }
             
             # Check for loops in table
-            for row in table.rows:
-                row_text = ' '.join([cell.text for cell in row.cells])
-                if re.search(r'\{\{#\w+\}\}', row_text):
+            for tr in table._tbl.tr_lst:
+                row_text = ' '.join([cell_text(tc) for tc in iter_row_cells(tr)])
+                if LOOP_OPEN_PATTERN.search(row_text):
                     table_info['has_loop'] = True
                     break
             
@@ -74,6 +89,228 @@ class ReportParser(models.AbstractModel):
         
         return structure
 
+    @api.model
+    def estimate_cost(self, model_name, tree):
+        """
+        Estimate the rendering cost of a template from its loop tree
+        
+        Every placeholder path and loop is walked on the models: relational
+        hops, nested one2many/many2many levels, non-stored computed fields
+        and loop sort keys are checked. Queries are counted as when printing
+        a single record: one for the record, one per distinct relation read,
+        related field or loop, and one per non-stored computed field reading
+        other records. Printing several records shares these queries.
+        
+        Args:
+            model_name: Technical name of the template model
+            tree: loop tree, as report.docx.generator._collect_template_tree
+            
+        Returns:
+            dict: queries_per_record, max_hops, max_fanout and warnings
+        """
+        if model_name not in self.env:
+            raise ValidationError(_("Model '%s' does not exist") % model_name)
+        params = self.env['ir.config_parameter'].sudo()
+        thresholds = {
+            'hops': int(params.get_param('odoo_dynamic_report.lint_max_hops', LINT_MAX_HOPS)),
+            'fanout': int(params.get_param('odoo_dynamic_report.lint_max_fanout', LINT_MAX_FANOUT)),
+            'queries': int(params.get_param('odoo_dynamic_report.lint_max_queries', LINT_MAX_QUERIES)),
+        }
+        estimate = {
+            'reads': {()},
+            'queries': 1,
+            'max_hops': 0,
+            'max_fanout': 0,
+            'warnings': [],
+        }
+        self._estimate_node(self.env[model_name], tree, (), 0, estimate, thresholds)
+        
+        queries = estimate['queries'] + len(estimate['reads']) - 1
+        if queries > thresholds['queries']:
+            estimate['warnings'].append(
+                _("About %s queries per printed record, more than the %s allowed.")
+                % (queries, thresholds['queries'])
+            )
+        return {
+            'queries_per_record': queries,
+            'max_hops': estimate['max_hops'],
+            'max_fanout': estimate['max_fanout'],
+            'warnings': estimate['warnings'],
+        }
+
+    def _estimate_node(self, model, node, scope, fanout, estimate, thresholds):
+        """Add the cost of the placeholders and loops of a loop tree node"""
+        generator = self.env['report.docx.generator']
+        for placeholder in sorted(node['placeholders']):
+            aggregate = generator._parse_aggregate(placeholder)
+            if aggregate:
+                self._estimate_aggregate(model, aggregate, scope, fanout, estimate, thresholds,
+                                         placeholder)
+                continue
+            path = placeholder.split('|', 1)[0].strip()
+            self._estimate_path(model, path, scope, fanout, estimate, thresholds, placeholder)
+        
+        for loop, child in node['loops'].items():
+            group = generator._parse_group_loop(loop)
+            try:
+                field_name, _domain, order, _limit = (
+                    (group[0], [], None, None) if group else generator._parse_loop_modifiers(loop)
+                )
+            except UserError as e:
+                estimate['warnings'].append(_("Loop %s: %s") % (loop, e.args[0]))
+                continue
+            
+            field = model._fields.get(field_name)
+            if not field or field.type not in ('one2many', 'many2many'):
+                estimate['warnings'].append(
+                    _("Loop %s: '%s' is not a one2many or many2many field of %s")
+                    % (loop, field_name, model._name)
+                )
+                continue
+            comodel = self.env[field.comodel_name]
+            # One query for the lines of the loop
+            estimate['queries'] += 1
+            self._estimate_fanout(loop, fanout + 1, estimate, thresholds)
+            if order:
+                self._estimate_order(comodel, loop, order, estimate)
+            
+            loop_scope = scope + (loop,)
+            if group:
+                self._estimate_path(comodel, group[1], loop_scope, fanout + 1, estimate,
+                                    thresholds, loop)
+                for lines_loop, lines in generator._group_line_loops(child):
+                    if '|' in lines_loop:
+                        try:
+                            order = generator._parse_loop_modifiers(lines_loop)[2]
+                        except UserError as e:
+                            estimate['warnings'].append(_("Loop %s: %s") % (lines_loop, e.args[0]))
+                            continue
+                        # One query filtering and sorting the lines of all groups
+                        estimate['queries'] += 1
+                        if order:
+                            self._estimate_order(comodel, lines_loop, order, estimate)
+                    self._estimate_node(comodel, lines, loop_scope + (lines_loop,), fanout + 1,
+                                        estimate, thresholds)
+            else:
+                self._estimate_node(comodel, child, loop_scope, fanout + 1, estimate, thresholds)
+
+    def _estimate_aggregate(self, model, aggregate, scope, fanout, estimate, thresholds,
+                            placeholder):
+        """Add the cost of an aggregate placeholder like sum(line_ids.amount)
+
+        Aggregates are computed for all printed records at once, so they add
+        no per-record fanout: the aggregates of a relation share one grouped
+        query, or one query reading its lines when they cannot be computed in
+        SQL.
+        """
+        function, path, _formatter = aggregate
+        relation, _sep, measure = path.partition('.')
+        field = model._fields.get(relation)
+        if not field or field.type not in ('one2many', 'many2many'):
+            estimate['warnings'].append(
+                _("%s: '%s' is not a one2many or many2many field of %s")
+                % (placeholder, relation, model._name)
+            )
+            return
+        if self.env['report.docx.generator']._can_aggregate_in_sql(field, function, measure):
+            estimate['reads'].add(scope + (relation, 'group()'))
+            return
+        estimate['reads'].add(scope + (relation,))
+        if measure:
+            self._estimate_path(self.env[field.comodel_name], measure, scope + (relation,), fanout,
+                                estimate, thresholds, placeholder)
+
+    def _estimate_path(self, model, path, scope, fanout, estimate, thresholds, placeholder):
+        """Add the cost of reading a field path from model"""
+        hops = 0
+        names = [name for name in path.split('.') if name]
+        for index, name in enumerate(names):
+            field = model._fields.get(name)
+            if field is None:
+                estimate['warnings'].append(
+                    _("%s: field '%s' does not exist on %s") % (placeholder, name, model._name)
+                )
+                return
+            if field.related:
+                # Read through its relation, like a relational path
+                estimate['reads'].add(scope + tuple(names[:index + 1]))
+            elif not field.store and field.compute and self._compute_reads_relations(model, field):
+                # Computed for each record, with its own queries
+                estimate['reads'].add(scope + tuple(names[:index + 1]) + ('()',))
+                estimate['warnings'].append(
+                    _("%s: %s.%s is a non-stored computed field, computed for every printed record")
+                    % (placeholder, model._name, name)
+                )
+            if not field.relational:
+                continue
+            # Related records are read once per relation, also to display them
+            estimate['reads'].add(scope + tuple(names[:index + 1]))
+            if index < len(names) - 1:
+                hops += 1
+                if field.type in ('one2many', 'many2many'):
+                    fanout += 1
+                model = self.env[field.comodel_name]
+        
+        estimate['max_hops'] = max(estimate['max_hops'], hops)
+        if hops > thresholds['hops']:
+            estimate['warnings'].append(
+                _("%s: %s relational hops, more than the %s allowed")
+                % (placeholder, hops, thresholds['hops'])
+            )
+        self._estimate_fanout(placeholder, fanout, estimate, thresholds)
+
+    def _compute_reads_relations(self, model, field, seen=None):
+        """Check whether a non-stored computed field reads other records
+
+        Computes depending on fields of other records, or declaring no
+        dependencies, are assumed to query for every printed record. Those
+        depending only on fields of the record itself are not.
+        """
+        seen = seen if seen is not None else set()
+        seen.add(field)
+        depends = model.pool.field_depends[field]
+        if not depends:
+            return True
+        for dependency in depends:
+            if '.' in dependency:
+                return True
+            dependency_field = model._fields.get(dependency)
+            if dependency_field is None or dependency_field in seen:
+                continue
+            if not dependency_field.store and dependency_field.compute and not dependency_field.related \
+                    and self._compute_reads_relations(model, dependency_field, seen):
+                return True
+        return False
+
+    def _estimate_fanout(self, name, fanout, estimate, thresholds):
+        """Record the nesting level of a path or loop"""
+        if fanout > estimate['max_fanout']:
+            estimate['max_fanout'] = fanout
+        if fanout > thresholds['fanout']:
+            warning = _("%s: %s nested one2many/many2many levels, more than the %s allowed") % (
+                name, fanout, thresholds['fanout'])
+            if warning not in estimate['warnings']:
+                estimate['warnings'].append(warning)
+
+    def _estimate_order(self, model, loop, order, estimate):
+        """Warn about loop sort keys the database cannot sort from an index"""
+        for part in order.split(','):
+            name = part.strip().split(' ')[0]
+            field = model._fields.get(name)
+            if field is None:
+                estimate['warnings'].append(
+                    _("Loop %s: sort field '%s' does not exist on %s") % (loop, name, model._name)
+                )
+            elif not field.store:
+                estimate['warnings'].append(
+                    _("Loop %s: sort field %s.%s is not stored") % (loop, model._name, name)
+                )
+            elif name != 'id' and not field.index and field.type != 'many2one':
+                # Many2one keys sort on the order of their model instead
+                estimate['warnings'].append(
+                    _("Loop %s: sort field %s.%s is not indexed") % (loop, model._name, name)
+                )
+
     @api.model
     def validate_field_path(self, model_name, field_path):
         """
@@ -159,6 +396,25 @@ class ReportParser(models.AbstractModel):
         except KeyError:
             raise ValidationError(_("Model '%s' does not exist") % model_name)
 
+    @api.model
+    def get_fields_version(self, model_name, include_related=True, max_depth=2):
+        """
+        Return the version tag of the field list of a model
+        
+        The list only changes when the registry is reloaded, e.g. after a
+        module update, and field labels depend on the language.
+        
+        Returns:
+            str: version tag, compared by clients to revalidate their cache
+        """
+        if model_name not in self.env:
+            raise ValidationError(_("Model '%s' does not exist") % model_name)
+        signature = (
+            f"{self.env.registry.registry_sequence}:{self.env.lang}:"
+            f"{model_name}:{bool(include_related)}:{max_depth}"
+        )
+        return hashlib.sha1(signature.encode()).hexdigest()
+
     def _collect_fields(self, model, fields_list, path, remaining_depth):
         """Recursively collect fields from model"""
         for field_name, field in model._fields.items():
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, api, _
+from odoo.exceptions import UserError
+from pathlib import Path
+import atexit
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_TIMEOUT = 120
+STARTUP_TIMEOUT = 30
+
+
+class OfficeError(Exception):
+    """Raised when an office process fails to start or convert"""
+
+
+class OfficeTimeout(OfficeError):
+    """Raised when an office process does not convert in time"""
+
+
+class OfficeProcess:
+    """A headless LibreOffice process with its own user profile
+
+    When the ``uno`` bridge is available the process is kept running and
+    documents are converted over a UNO socket. Otherwise nothing is kept
+    running: each conversion call starts a new ``soffice --convert-to``
+    process and pays the full startup cost, only the user profile of the
+    slot is reused.
+    """
+
+    def __init__(self, binary):
+        self.binary = binary
+        self.profile_dir = tempfile.mkdtemp(prefix='odoo_dynamic_report_lo_')
+        self.port = None
+        self.process = None
+        self.desktop = None
+
+    def _base_command(self):
+        return [
+            self.binary,
+            '--headless',
+            '--invisible',
+            '--nologo',
+            '--nodefault',
+            '--norestore',
+            '--nolockcheck',
+            f'-env:UserInstallation={Path(self.profile_dir).as_uri()}',
+        ]
+
+    def start(self):
+        """Start the process and wait until it accepts conversions"""
+        if uno is None:
+            # Initialize the profile once so later conversions start warm
+            self._run(self._base_command() + ['--terminate_after_init'], STARTUP_TIMEOUT)
+            return
+
+        self.port = _free_port()
+        command = self._base_command() + [
+            f'--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext',
+        ]
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        self.desktop = self._connect(STARTUP_TIMEOUT)
+
+    def _connect(self, timeout):
+        """Connect to the UNO socket of the process"""
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context
+        )
+        url = f'uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext'
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.process.poll() is not None:
+                raise OfficeError(f"LibreOffice exited with code {self.process.returncode}")
+            try:
+                context = resolver.resolve(url)
+                return context.ServiceManager.createInstanceWithContext(
+                    'com.sun.star.frame.Desktop', context
+                )
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise OfficeError("Timed out waiting for LibreOffice to start")
+                time.sleep(0.25)
+
+    def is_alive(self):
+        if uno is None:
+            return True
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """Terminate the process"""
+        self.desktop = None
+        if self.process is not None and self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            self.process.wait()
+        self.process = None
+
+    def kill(self):
+        """Kill the process from another thread
+
+        The process attributes are left to the thread using it, which
+        stops the process once its pending call fails.
+        """
+        process = self.process
+        if process is not None and process.poll() is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def close(self):
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def convert(self, paths, output_dir, timeout):
+        """Convert DOCX files to PDF files in output_dir"""
+        if uno is None:
+            self._run(
+                self._base_command() + ['--convert-to', 'pdf', '--outdir', output_dir] + paths,
+                timeout,
+            )
+            return
+
+        # A UNO call cannot be interrupted, so the watchdog kills the
+        # process which makes the pending call fail
+        watchdog = threading.Timer(timeout, self.kill)
+        watchdog.start()
+        try:
+            for path in paths:
+                output = os.path.join(output_dir, Path(path).stem + '.pdf')
+                document = self.desktop.loadComponentFromURL(
+                    Path(path).as_uri(), '_blank', 0, _properties(Hidden=True)
+                )
+                try:
+                    document.storeToURL(
+                        Path(output).as_uri(), _properties(FilterName='writer_pdf_Export')
+                    )
+                finally:
+                    document.close(True)
+        except Exception as e:
+            if not watchdog.is_alive():
+                raise OfficeTimeout(f"Conversion timed out after {timeout:.0f}s")
+            raise OfficeError(str(e))
+        finally:
+            watchdog.cancel()
+
+    def _run(self, command, timeout):
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            _stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+            raise OfficeTimeout(f"Conversion timed out after {timeout:.0f}s")
+        if process.returncode:
+            raise OfficeError(stderr.decode(errors='replace').strip() or
+                              f"LibreOffice exited with code {process.returncode}")
+
+
+class OfficePool:
+    """Bounded pool of office processes shared by the worker threads
+
+    Processes are only kept running when the ``uno`` bridge is available;
+    otherwise nothing is kept warm, every batch starts a new ``soffice
+    --convert-to`` process and the pool only bounds the concurrent
+    conversions. This is logged when the pool is created.
+    """
+
+    def __init__(self, binary, size):
+        self.binary = binary
+        self.size = size
+        self._idle = queue.Queue()
+        self._processes = []
+        self._closed = False
+        if uno is None:
+            _logger.warning(
+                f"Python UNO bridge not available: no LibreOffice process is kept warm, "
+                f"each PDF conversion batch starts a new {binary} --convert-to process"
+            )
+        for _index in range(size):
+            process = OfficeProcess(binary)
+            try:
+                process.start()
+            except OfficeError as e:
+                # Started again on first use
+                _logger.warning("Could not pre-start LibreOffice: %s", e)
+                process.stop()
+            self._processes.append(process)
+            self._idle.put(process)
+
+    def convert(self, documents, timeout):
+        """Convert a batch of DOCX documents with a single pool slot
+
+        Args:
+            documents: list of DOCX file contents
+            timeout: seconds allowed for the whole batch, waiting for a
+                     free process included
+
+        Returns:
+            list: PDF file contents, in the same order
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            process = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise OfficeTimeout(f"All LibreOffice processes stayed busy for {timeout}s")
+
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise OfficeTimeout(f"Conversion timed out after {timeout:.0f}s")
+            try:
+                return self._convert_with(process, documents, remaining)
+            except OfficeTimeout as e:
+                # Not retried: the batch would most likely time out again.
+                # The stopped process is started again on its next use.
+                _logger.warning(f"LibreOffice conversion timed out, stopping process: {e}")
+                process.stop()
+                raise
+            except OfficeError as e:
+                # The process may have crashed mid-batch: restart and retry
+                # once within the time left
+                _logger.warning(f"LibreOffice conversion failed, restarting process: {e}")
+                process.restart()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise OfficeTimeout(f"Conversion timed out after {timeout:.0f}s")
+                return self._convert_with(process, documents, remaining)
+        finally:
+            self._release(process)
+
+    def _release(self, process):
+        """Return process to the pool, or close it once the pool is closed"""
+        if self._closed:
+            process.close()
+        else:
+            self._idle.put(process)
+
+    def _convert_with(self, process, documents, timeout):
+        if not process.is_alive():
+            process.restart()
+
+        with tempfile.TemporaryDirectory(prefix='odoo_dynamic_report_pdf_') as work_dir:
+            input_dir = os.path.join(work_dir, 'in')
+            output_dir = os.path.join(work_dir, 'out')
+            os.mkdir(input_dir)
+            os.mkdir(output_dir)
+
+            paths = []
+            for index, content in enumerate(documents):
+                path = os.path.join(input_dir, f'document_{index}.docx')
+                with open(path, 'wb') as f:
+                    f.write(content)
+                paths.append(path)
+
+            process.convert(paths, output_dir, timeout)
+
+            results = []
+            for path in paths:
+                output = os.path.join(output_dir, Path(path).stem + '.pdf')
+                if not os.path.exists(output):
+                    raise OfficeError(f"No PDF produced for {Path(path).name}")
+                with open(output, 'rb') as f:
+                    results.append(f.read())
+            return results
+
+    def close(self):
+        """Close the idle processes, and the busy ones when released"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(binary, size):
+    """Return the process-wide pool for binary, creating it on first use
+
+    A pool of another size is closed and replaced.
+    """
+    with _pools_lock:
+        pool = _pools.get(binary)
+        if pool is not None and pool.size != size:
+            pool.close()
+            pool = None
+        if pool is None:
+            pool = _pools[binary] = OfficePool(binary, size)
+        return pool
+
+
+@atexit.register
+def _close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _properties(**values):
+    result = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        result.append(prop)
+    return tuple(result)
+
+
+class ReportPdfConverter(models.AbstractModel):
+    _name = 'report.pdf.converter'
+    _description = 'DOCX to PDF Converter'
+
+    @api.model
+    def convert(self, documents):
+        """
+        Convert DOCX documents to PDF
+
+        Args:
+            documents: list of DOCX file contents
+
+        Returns:
+            list: PDF file contents, in the same order
+        """
+        if not documents:
+            return []
+
+        params = self.env['ir.config_parameter'].sudo()
+        timeout = int(params.get_param('odoo_dynamic_report.pdf_timeout', DEFAULT_TIMEOUT))
+        pool = get_pool(
+            self._get_office_binary(),
+            int(params.get_param('odoo_dynamic_report.pdf_pool_size', DEFAULT_POOL_SIZE)),
+        )
+
+        try:
+            return pool.convert(documents, timeout)
+        except OfficeError as e:
+            _logger.exception("Error converting DOCX to PDF")
+            raise UserError(_("PDF conversion failed: %s") % str(e))
+
+    def _get_office_binary(self):
+        """Return the LibreOffice executable to use"""
+        binary = self.env['ir.config_parameter'].sudo().get_param('odoo_dynamic_report.soffice_binary')
+        binary = binary or shutil.which('soffice') or shutil.which('libreoffice')
+        if not binary or not shutil.which(binary):
+            raise UserError(_("LibreOffice is required to export reports as PDF."))
+        return binary
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, api
+from docx.oxml.ns import qn, nsmap
+from lxml import etree
+import re
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Parts holding text the renderer walks
+STORY_PART_PATTERN = re.compile(r'^word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$')
+RSID_PREFIX = '{%s}rsid' % nsmap['w']
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+
+class ReportTemplateNormalizer(models.AbstractModel):
+    _name = 'report.template.normalizer'
+    _description = 'DOCX Template Normalizer'
+
+    @api.model
+    def normalize_document(self, doc):
+        """
+        Optimize a parsed python-docx document in place
+        
+        Proofing marks, rendering hints and revision ids are removed, and
+        adjacent runs with the same formatting are merged so placeholders
+        end up in a single run. The XML trees of the parsed document are
+        changed, so the file is not read again.
+        
+        Args:
+            doc: python-docx Document
+        """
+        for part in doc.part.package.iter_parts():
+            name = str(part.partname).lstrip('/')
+            if STORY_PART_PATTERN.match(name):
+                if hasattr(part, '_element'):
+                    self._normalize_element(part._element)
+                else:
+                    part._blob = self._normalize_part(part.blob)
+            elif name == 'word/settings.xml':
+                if hasattr(part, '_element'):
+                    self._strip_rsids(part._element)
+                else:
+                    part._blob = self._normalize_settings(part.blob)
+
+    def _normalize_part(self, data):
+        """Normalize the XML of a document, header or footer part"""
+        root = etree.fromstring(data)
+        self._normalize_element(root)
+        return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def _normalize_element(self, root):
+        """Normalize the root element of a document, header or footer part"""
+        self._strip_noise(root)
+        
+        # Runs may sit in paragraphs, hyperlinks, insertions, fields...
+        parents = dict.fromkeys(run.getparent() for run in root.iter(qn('w:r')))
+        for parent in parents:
+            self._merge_runs(parent)
+
+    def _normalize_settings(self, data):
+        """Drop the revision id table of the settings part"""
+        root = etree.fromstring(data)
+        self._strip_rsids(root)
+        return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def _strip_rsids(self, root):
+        """Remove the revision id table of a settings element"""
+        for rsids in root.findall(qn('w:rsids')):
+            root.remove(rsids)
+
+    def _strip_noise(self, root):
+        """Remove proofing marks, rendering hints and revision ids"""
+        noise = list(root.iter(qn('w:proofErr'), qn('w:lastRenderedPageBreak')))
+        
+        # Word's "last edit position" bookmark
+        go_back = set()
+        for start in root.iter(qn('w:bookmarkStart')):
+            if start.get(qn('w:name')) == '_GoBack':
+                go_back.add(start.get(qn('w:id')))
+                noise.append(start)
+        noise += [end for end in root.iter(qn('w:bookmarkEnd')) if end.get(qn('w:id')) in go_back]
+        
+        for element in noise:
+            element.getparent().remove(element)
+        
+        for element in root.iter():
+            for name in [name for name in element.attrib if name.startswith(RSID_PREFIX)]:
+                del element.attrib[name]
+
+    def _merge_runs(self, parent):
+        """Merge adjacent text runs of parent having the same formatting"""
+        previous, previous_format = None, None
+        for child in list(parent):
+            run_format = self._run_format(child)
+            if run_format is None:
+                previous = None
+                continue
+            
+            if previous is not None and run_format == previous_format:
+                texts = previous.findall(qn('w:t'))
+                text = texts[-1]
+                text.text = (text.text or '') + ''.join(t.text or '' for t in child.findall(qn('w:t')))
+                text.set(XML_SPACE, 'preserve')
+                parent.remove(child)
+                continue
+            
+            previous, previous_format = child, run_format
+
+    def _run_format(self, element):
+        """Return the serialized formatting of a text-only run, else None"""
+        if element.tag != qn('w:r'):
+            return None
+        
+        r_pr = None
+        has_text = False
+        for child in element:
+            if child.tag == qn('w:rPr'):
+                r_pr = child
+            elif child.tag == qn('w:t'):
+                has_text = True
+            else:
+                return None
+        
+        if not has_text:
+            return None
+        return etree.tostring(r_pr) if r_pr is not None else b''
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+"""Table cell iteration on the XML, without python-docx's cell grid
+
+python-docx's ``row.cells`` lays out the grid of the whole table on every
+call, which is quadratic on tables with merged cells. These helpers walk
+the ``w:tc`` elements directly: a cell spanning several grid columns
+(``gridSpan``) is yielded once, and a cell continuing a vertical merge
+(``vMerge``) is yielded with its own, usually empty, content instead of
+the content of the cell it continues.
+"""
+
+from docx.oxml.ns import qn
+
+
+def iter_row_cells(tr):
+    """Yield the w:tc elements of a table row, in document order"""
+    for child in tr:
+        if child.tag == qn('w:tc'):
+            yield child
+        elif child.tag == qn('w:sdt'):
+            # Content controls may wrap cells
+            content = child.find(qn('w:sdtContent'))
+            if content is not None:
+                yield from iter_row_cells(content)
+        elif child.tag == qn('w:customXml'):
+            yield from iter_row_cells(child)
+
+
+def iter_table_cells(tbl):
+    """Yield the w:tc elements of a table, row by row"""
+    for tr in tbl.iterchildren(qn('w:tr')):
+        yield from iter_row_cells(tr)
+
+
+def cell_text(tc):
+    """Return the text of a cell, paragraphs separated by newlines"""
+    return '\n'.join(
+        ''.join(t.text or '' for t in p.iter(qn('w:t')))
+        for p in tc.iterchildren(qn('w:p'))
+    )
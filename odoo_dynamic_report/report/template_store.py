@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of compiled templates changes
+STORE_VERSION = 2
+
+
+class TemplateStore:
+    """On-disk store of compiled templates shared by all workers
+
+    A compiled template holds the normalized DOCX package and its loop
+    tree. Entries live in the filestore of the database, keyed by template
+    id and content checksum, so a template is compiled once per content
+    whatever the worker printing it, and survives restarts.
+
+    Entries are data only: the package is stored as a .docx file and the
+    loop tree as JSON, so reading an entry never runs code. The tree file
+    is written last and marks a complete entry; both are written
+    atomically.
+    """
+
+    def _get_directory(self, dbname, template_id=None):
+        path = os.path.join(config.filestore(dbname), 'odoo_dynamic_report', f'v{STORE_VERSION}')
+        return os.path.join(path, str(template_id)) if template_id is not None else path
+
+    def _get_path(self, dbname, template_id, checksum, extension):
+        return os.path.join(self._get_directory(dbname, template_id), f'{checksum}.{extension}')
+
+    def contains(self, dbname, template_id, checksum):
+        """Return whether a compiled version of the template content is stored"""
+        return os.path.exists(self._get_path(dbname, template_id, checksum, 'json'))
+
+    def get(self, dbname, template_id, checksum):
+        """Return the compiled (package, tree) tuple or None"""
+        try:
+            with open(self._get_path(dbname, template_id, checksum, 'json'), 'rb') as f:
+                tree = self._load_tree(json.load(f))
+            with open(self._get_path(dbname, template_id, checksum, 'docx'), 'rb') as f:
+                package = f.read()
+        except FileNotFoundError:
+            return None
+        except Exception:
+            _logger.warning(f"Could not read compiled template {template_id}", exc_info=True)
+            return None
+        return package, tree
+
+    def set(self, dbname, template_id, checksum, entry):
+        """Store a compiled (package, tree) tuple, replacing older versions"""
+        package, tree = entry
+        directory = self._get_directory(dbname, template_id)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._write(directory, self._get_path(dbname, template_id, checksum, 'docx'), package)
+            data = json.dumps(self._dump_tree(tree)).encode()
+            self._write(directory, self._get_path(dbname, template_id, checksum, 'json'), data)
+        except OSError:
+            _logger.warning(f"Could not store compiled template {template_id}", exc_info=True)
+            return
+
+        for name in os.listdir(directory):
+            stem, extension = os.path.splitext(name)
+            if stem != checksum and extension in ('.docx', '.json'):
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def discard(self, dbname, template_ids):
+        """Remove the compiled versions of templates"""
+        for template_id in template_ids:
+            shutil.rmtree(self._get_directory(dbname, template_id), ignore_errors=True)
+
+    def _write(self, directory, path, data):
+        """Write data to path atomically"""
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as f:
+            try:
+                f.write(data)
+            except Exception:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+
+    def _dump_tree(self, node):
+        """Return a loop tree with JSON types"""
+        return {
+            'placeholders': sorted(node['placeholders']),
+            'loops': {loop: self._dump_tree(child) for loop, child in node['loops'].items()},
+        }
+
+    def _load_tree(self, node):
+        """Return a loop tree read from JSON"""
+        return {
+            'placeholders': set(node['placeholders']),
+            'loops': {loop: self._load_tree(child) for loop, child in node['loops'].items()},
+        }
+
+
+template_store = TemplateStore()
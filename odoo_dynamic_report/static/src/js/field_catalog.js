@@ -0,0 +1,80 @@
+/** @odoo-module **/
+
+import { browser } from "@web/core/browser/browser";
+import { session } from "@web/session";
+
+/**
+ * Field Catalog Cache
+ * Fields of a model, shared between the designer components
+ *
+ * Catalogs are stored in the browser with the version returned by the
+ * server. They are revalidated once per page load: the stored version is
+ * sent and the server only returns the fields when it changed. Components
+ * asking for the same catalog at the same time share one request.
+ */
+
+const STORAGE_PREFIX = "odoo_dynamic_report.fields";
+
+// Catalogs already fetched or revalidated since the page was loaded
+const catalogs = new Map();
+// Requests in progress, by storage key
+const pending = new Map();
+
+function getStorageKey(modelName, maxDepth) {
+    return `${STORAGE_PREFIX}.${session.db || ""}.${modelName}.${maxDepth}`;
+}
+
+function readStored(key) {
+    try {
+        const stored = browser.localStorage.getItem(key);
+        return stored ? JSON.parse(stored) : null;
+    } catch {
+        return null;
+    }
+}
+
+function writeStored(key, catalog) {
+    try {
+        browser.localStorage.setItem(key, JSON.stringify(catalog));
+    } catch {
+        // Storage full or disabled, the catalog is kept for this page only
+    }
+}
+
+async function fetchCatalog(rpc, key, modelName, maxDepth) {
+    const stored = readStored(key);
+    const result = await rpc("/report_template/get_model_fields", {
+        model_name: modelName,
+        include_related: true,
+        max_depth: maxDepth,
+        version: stored ? stored.version : null,
+    });
+    if (!result.success) {
+        throw new Error(result.error || "Failed to load fields");
+    }
+    if (result.not_modified) {
+        return stored.fields;
+    }
+    writeStored(key, { version: result.version, fields: result.fields });
+    return result.fields;
+}
+
+/**
+ * Return the fields of a model, from the browser cache when up to date
+ */
+export async function loadFieldCatalog(rpc, modelName, maxDepth = 2) {
+    const key = getStorageKey(modelName, maxDepth);
+    if (catalogs.has(key)) {
+        return catalogs.get(key);
+    }
+    if (!pending.has(key)) {
+        const request = fetchCatalog(rpc, key, modelName, maxDepth)
+            .then((fields) => {
+                catalogs.set(key, fields);
+                return fields;
+            })
+            .finally(() => pending.delete(key));
+        pending.set(key, request);
+    }
+    return pending.get(key);
+}
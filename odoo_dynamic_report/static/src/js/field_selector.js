@@ -1,12 +1,23 @@
 /** @odoo-module **/
 
-import { Component, useState, onWillStart } from "@odoo/owl";
+import { Component, useState, useRef, onWillStart, onMounted } from "@odoo/owl";
 import { registry } from "@web/core/registry";
 import { useService } from "@web/core/utils/hooks";
+import { loadFieldCatalog } from "./field_catalog";
+
+// Height of a field row in pixels, must match .o_field_node in the CSS
+const ROW_HEIGHT = 36;
+// Rows rendered above and below the visible ones
+const OVERSCAN_ROWS = 10;
 
 /**
  * Field Selector Component
  * Tree view of model fields with drag-and-drop support
+ *
+ * Fields are kept in a flat array in tree order, where each node knows the
+ * index following its last descendant. Only the rows scrolled into view are
+ * rendered, so models with thousands of field paths stay responsive. When
+ * grouped by type, top-level fields are listed under a header row per type.
  */
 export class FieldSelector extends Component {
     setup() {
@@ -14,15 +25,25 @@ export class FieldSelector extends Component {
         this.rpc = useService("rpc");
         this.notification = useService("notification");
         
+        this.treeRef = useRef("tree");
+        
+        // Flat node array and row indexes, kept out of the reactive state.
+        // Rows are node indexes, or -1 - position for the header of a group.
+        this.nodes = [];
+        this.roots = [];
+        this.groups = [];
+        this.expanded = new Uint8Array(0);
+        this.visibleRows = [];
+        
         this.state = useState({
             modelName: this.props.modelName || null,
-            fields: [],
-            filteredFields: [],
             searchText: "",
-            expandedFields: new Set(),
             selectedField: null,
             isLoading: false,
             groupBy: "type", // 'type' or 'none'
+            scrollTop: 0,
+            viewportHeight: 400,
+            version: 0,
         });
 
         onWillStart(async () => {
@@ -30,6 +51,12 @@ export class FieldSelector extends Component {
                 await this.loadFields();
             }
         });
+
+        onMounted(() => {
+            if (this.treeRef.el) {
+                this.state.viewportHeight = this.treeRef.el.clientHeight || this.state.viewportHeight;
+            }
+        });
     }
 
     /**
@@ -38,18 +65,16 @@ export class FieldSelector extends Component {
     async loadFields() {
         this.state.isLoading = true;
         try {
-            const result = await this.rpc("/report_template/get_model_fields", {
-                model_name: this.state.modelName,
-                include_related: true,
-                max_depth: 2,
-            });
-
-            if (result.success) {
-                this.state.fields = this.organizeFields(result.fields);
-                this.state.filteredFields = this.state.fields;
-            } else {
-                throw new Error(result.error || "Failed to load fields");
-            }
+            const fields = await loadFieldCatalog(
+                this.rpc,
+                this.state.modelName,
+                this.props.maxDepth || 2
+            );
+            this.nodes = this.organizeFields(fields);
+            this.roots = this.nodes.flatMap((node, index) => (node.parent === -1 ? [index] : []));
+            this.groups = this.groupRoots(this.nodes, this.roots);
+            this.expanded = new Uint8Array(this.nodes.length);
+            this.refreshVisibleRows();
         } catch (error) {
             this.notification.add(
                 "Error loading fields: " + error.message,
@@ -61,38 +86,206 @@ export class FieldSelector extends Component {
     }
 
     /**
-     * Organize fields into a tree structure
+     * Organize fields into a flat array in tree order
+     *
+     * Sorting by path puts each field right after its parent and before the
+     * parent's next sibling, since "." sorts before any character of a field
+     * name. Nodes reference the field instead of copying it.
+     *
+     * Returns:
+     *     Array of {field, depth, parent, end} where parent is the index of
+     *     the parent node or -1, and end the index after the last descendant
      */
     organizeFields(fields) {
-        const fieldMap = new Map();
-        const rootFields = [];
+        const sorted = [...fields].sort((a, b) => (a.path < b.path ? -1 : a.path > b.path ? 1 : 0));
+        const nodes = [];
+        const indexes = new Map();
+        
+        for (const field of sorted) {
+            const dot = field.path.lastIndexOf(".");
+            const parentPath = dot === -1 ? null : field.path.slice(0, dot);
+            const parent = parentPath === null ? -1 : indexes.get(parentPath);
+            // Fields whose parent is not listed are not reachable in the tree
+            if (parent === undefined) {
+                continue;
+            }
+            indexes.set(field.path, nodes.length);
+            nodes.push({
+                field,
+                depth: parent === -1 ? 0 : nodes[parent].depth + 1,
+                parent,
+                end: nodes.length + 1,
+            });
+        }
+        
+        // Extend the range of each ancestor to its last descendant
+        for (let index = nodes.length - 1; index >= 0; index--) {
+            const parent = nodes[index].parent;
+            if (parent !== -1 && nodes[index].end > nodes[parent].end) {
+                nodes[parent].end = nodes[index].end;
+            }
+        }
+        
+        return nodes;
+    }
 
-        // First pass: create field nodes
-        fields.forEach(field => {
-            const parts = field.path.split('.');
-            const depth = parts.length - 1;
-            
-            const fieldNode = {
-                ...field,
-                depth: depth,
-                children: [],
-                isExpanded: false,
-                parent: depth > 0 ? parts.slice(0, -1).join('.') : null,
-            };
+    /**
+     * Group the top-level nodes by field type
+     *
+     * Returns:
+     *     Array of {type, roots} sorted by type, roots being node indexes
+     */
+    groupRoots(nodes, roots) {
+        const groups = new Map();
+        for (const index of roots) {
+            const type = nodes[index].field.type;
+            if (!groups.has(type)) {
+                groups.set(type, { type, roots: [] });
+            }
+            groups.get(type).roots.push(index);
+        }
+        return [...groups.values()].sort((a, b) => (a.type < b.type ? -1 : a.type > b.type ? 1 : 0));
+    }
 
-            fieldMap.set(field.path, fieldNode);
-        });
+    /**
+     * Whether the node at index has children
+     */
+    hasChildren(index) {
+        return this.nodes[index].end > index + 1;
+    }
 
-        // Second pass: build tree structure
-        fieldMap.forEach((node) => {
-            if (node.parent && fieldMap.has(node.parent)) {
-                fieldMap.get(node.parent).children.push(node);
-            } else if (node.depth === 0) {
-                rootFields.push(node);
+    /**
+     * Recompute the indexes of the rows shown in the tree
+     *
+     * Collapsed subtrees are skipped at once using the end index of their
+     * root. While searching, matching fields are shown with their
+     * ancestors, whatever the expansion state. When grouped by type, the
+     * subtrees of each group follow its header, and groups without any
+     * shown field are left out.
+     */
+    refreshVisibleRows() {
+        const nodes = this.nodes;
+        const shown = this.state.searchText ? this.matchSearch(this.state.searchText) : null;
+        const rows = [];
+        
+        const addSubtree = (root) => {
+            let index = root;
+            while (index < nodes[root].end) {
+                if (shown) {
+                    if (shown[index]) {
+                        rows.push(index);
+                    }
+                    index++;
+                } else {
+                    rows.push(index);
+                    index = this.expanded[index] ? index + 1 : nodes[index].end;
+                }
             }
-        });
+        };
+        
+        if (this.state.groupBy === "type") {
+            this.groups.forEach((group, position) => {
+                const header = rows.length;
+                rows.push(-1 - position);
+                for (const root of group.roots) {
+                    addSubtree(root);
+                }
+                if (rows.length === header + 1) {
+                    rows.pop();
+                }
+            });
+        } else {
+            for (const root of this.roots) {
+                addSubtree(root);
+            }
+        }
+        
+        this.visibleRows = rows;
+        this.state.version++;
+    }
+
+    /**
+     * Mark the fields matching search and their ancestors
+     *
+     * Returns:
+     *     Uint8Array with 1 at the index of each node to show
+     */
+    matchSearch(search) {
+        const nodes = this.nodes;
+        const shown = new Uint8Array(nodes.length);
+        for (let index = nodes.length - 1; index >= 0; index--) {
+            const field = nodes[index].field;
+            if (shown[index] || (
+                field.name.toLowerCase().includes(search) ||
+                field.string.toLowerCase().includes(search) ||
+                field.path.toLowerCase().includes(search)
+            )) {
+                shown[index] = 1;
+                if (nodes[index].parent !== -1) {
+                    shown[nodes[index].parent] = 1;
+                }
+            }
+        }
+        return shown;
+    }
+
+    /**
+     * Total height of the tree, so the scrollbar matches all visible rows
+     */
+    get treeHeight() {
+        return this.visibleRows.length * ROW_HEIGHT;
+    }
+
+    /**
+     * Rows within the scrolled window, with their position
+     */
+    get windowRows() {
+        // Subscribe to changes of the visible rows
+        this.state.version;
+        const first = Math.max(0, Math.floor(this.state.scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+        const last = Math.min(
+            this.visibleRows.length,
+            Math.ceil((this.state.scrollTop + this.state.viewportHeight) / ROW_HEIGHT) + OVERSCAN_ROWS
+        );
+        
+        const rows = [];
+        for (let position = first; position < last; position++) {
+            const index = this.visibleRows[position];
+            if (index < 0) {
+                const group = this.groups[-1 - index];
+                rows.push({
+                    index,
+                    group,
+                    top: position * ROW_HEIGHT,
+                });
+                continue;
+            }
+            const node = this.nodes[index];
+            rows.push({
+                index,
+                field: node.field,
+                depth: node.depth,
+                hasChildren: this.hasChildren(index),
+                isExpanded: Boolean(this.expanded[index]) || Boolean(this.state.searchText),
+                top: position * ROW_HEIGHT,
+            });
+        }
+        return rows;
+    }
 
-        return rootFields;
+    /**
+     * Track the scroll position, at most once per frame
+     */
+    onTreeScroll(ev) {
+        const el = ev.target;
+        if (this._scrollFrame) {
+            return;
+        }
+        this._scrollFrame = requestAnimationFrame(() => {
+            this._scrollFrame = null;
+            this.state.scrollTop = el.scrollTop;
+            this.state.viewportHeight = el.clientHeight || this.state.viewportHeight;
+        });
     }
 
     /**
@@ -153,38 +346,19 @@ export class FieldSelector extends Component {
      * Filter fields
      */
     filterFields() {
-        if (!this.state.searchText) {
-            this.state.filteredFields = this.state.fields;
-            return;
+        this.state.scrollTop = 0;
+        if (this.treeRef.el) {
+            this.treeRef.el.scrollTop = 0;
         }
-
-        const matchesSearch = (field) => {
-            return (
-                field.name.toLowerCase().includes(this.state.searchText) ||
-                field.string.toLowerCase().includes(this.state.searchText) ||
-                field.path.toLowerCase().includes(this.state.searchText)
-            );
-        };
-
-        const filterRecursive = (fields) => {
-            return fields.filter(field => {
-                const matches = matchesSearch(field);
-                if (field.children && field.children.length > 0) {
-                    field.children = filterRecursive(field.children);
-                    return matches || field.children.length > 0;
-                }
-                return matches;
-            });
-        };
-
-        this.state.filteredFields = filterRecursive([...this.state.fields]);
+        this.refreshVisibleRows();
     }
 
     /**
-     * Toggle field expansion
+     * Toggle expansion of the field at index
      */
-    toggleFieldExpansion(field) {
-        field.isExpanded = !field.isExpanded;
+    toggleFieldExpansion(index) {
+        this.expanded[index] = this.expanded[index] ? 0 : 1;
+        this.refreshVisibleRows();
     }
 
     /**
@@ -253,38 +427,18 @@ export class FieldSelector extends Component {
     }
 
     /**
-     * Group fields by type
+     * Switch between fields grouped by type and the plain tree
      */
     toggleGrouping() {
         this.state.groupBy = this.state.groupBy === "type" ? "none" : "type";
-    }
-
-    /**
-     * Render field tree
-     */
-    renderFieldTree(fields, depth = 0) {
-        return fields.map(field => this.renderFieldNode(field, depth));
-    }
-
-    /**
-     * Render single field node
-     */
-    renderFieldNode(field, depth) {
-        const hasChildren = field.children && field.children.length > 0;
-        const indent = depth * 20;
-
-        return {
-            field,
-            hasChildren,
-            indent,
-            isExpanded: field.isExpanded,
-        };
+        this.filterFields();
     }
 }
 
 FieldSelector.template = "odoo_dynamic_report.FieldSelector";
 FieldSelector.props = {
     modelName: { type: String, optional: true },
+    maxDepth: { type: Number, optional: true },
     onFieldSelected: { type: Function, optional: true },
     onFieldInsert: { type: Function, optional: true },
 };
@@ -1,8 +1,9 @@
 /** @odoo-module **/
 
-import { Component, useState, onWillStart, onMounted } from "@odoo/owl";
+import { Component, markup, useState, onWillStart, onMounted } from "@odoo/owl";
 import { registry } from "@web/core/registry";
 import { useService } from "@web/core/utils/hooks";
+import { loadFieldCatalog } from "./field_catalog";
 
 /**
  * Template Designer Component
@@ -23,6 +24,9 @@ export class TemplateDesigner extends Component {
             placeholders: [],
             isLoading: false,
             isDirty: false,
+            previewHtml: null,
+            previewRecordId: null,
+            isPreviewLoading: false,
         });
 
         onWillStart(async () => {
@@ -72,17 +76,11 @@ export class TemplateDesigner extends Component {
         }
 
         try {
-            const result = await this.rpc("/report_template/get_model_fields", {
-                model_name: this.state.template.model_name,
-                include_related: true,
-                max_depth: 2,
-            });
-
-            if (result.success) {
-                this.state.modelFields = result.fields;
-            } else {
-                throw new Error(result.error || "Failed to load fields");
-            }
+            this.state.modelFields = await loadFieldCatalog(
+                this.rpc,
+                this.state.template.model_name,
+                2
+            );
         } catch (error) {
             this.notification.add(
                 "Error loading model fields: " + error.message,
@@ -175,23 +173,16 @@ export class TemplateDesigner extends Component {
 
         this.state.isLoading = true;
         try {
-            const reader = new FileReader();
-            reader.onload = async (e) => {
-                const base64Data = e.target.result.split(',')[1];
-                
-                await this.orm.write("report.template", [this.state.templateId], {
-                    template_data: base64Data,
-                    template_filename: file.name,
-                });
-
-                await this.parseTemplate();
-                
-                this.notification.add(
-                    "Template uploaded successfully",
-                    { type: "success" }
-                );
-            };
-            reader.readAsDataURL(file);
+            const result = await this.uploadTemplateFile(file);
+            if (!result.success) {
+                throw new Error(result.error);
+            }
+            this.state.placeholders = result.placeholders || [];
+            
+            this.notification.add(
+                "Template uploaded successfully",
+                { type: "success" }
+            );
         } catch (error) {
             this.notification.add(
                 "Error uploading template: " + error.message,
@@ -202,21 +193,74 @@ export class TemplateDesigner extends Component {
         }
     }
 
+    /**
+     * Send the raw file as multipart form data, the server stores and
+     * parses it in the same request
+     */
+    async uploadTemplateFile(file) {
+        const formData = new FormData();
+        formData.append("template_id", this.state.templateId);
+        formData.append("ufile", file);
+        formData.append("csrf_token", odoo.csrf_token);
+        
+        const response = await fetch("/report_template/upload", {
+            method: "POST",
+            body: formData,
+        });
+        return response.json();
+    }
+
     /**
      * Preview template with sample data
+     * @param {boolean} refresh render again instead of using the cached preview
      */
-    async onPreview() {
+    async onPreview(refresh = false) {
         if (!this.state.templateId) {
             this.notification.add("Please save the template first", { type: "warning" });
             return;
         }
 
+        this.state.isPreviewLoading = true;
+        try {
+            const result = await this.rpc("/report_template/preview_html", {
+                template_id: this.state.templateId,
+                record_id: this.state.previewRecordId,
+                refresh,
+            });
+            if (!result.success) {
+                throw new Error(result.error);
+            }
+            // The HTML is built server-side from escaped document text
+            this.state.previewHtml = markup(result.html);
+            this.state.previewRecordId = result.record_id;
+        } catch (error) {
+            this.notification.add(
+                "Error generating preview: " + error.message,
+                { type: "danger" }
+            );
+        } finally {
+            this.state.isPreviewLoading = false;
+        }
+    }
+
+    /**
+     * Download the preview as a DOCX file
+     */
+    onDownloadPreview() {
         window.open(
-            `/report_template/preview?template_id=${this.state.templateId}`,
+            `/report_template/preview?template_id=${this.state.templateId}` +
+            (this.state.previewRecordId ? `&record_id=${this.state.previewRecordId}` : ""),
             '_blank'
         );
     }
 
+    /**
+     * Close the inline preview
+     */
+    onClosePreview() {
+        this.state.previewHtml = null;
+    }
+
     /**
      * Download template file
      */
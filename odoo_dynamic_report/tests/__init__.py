@@ -6,3 +6,8 @@ from . import test_report_parser
 from . import test_report_docx_generator
 from . import test_controllers
 from . import test_integration
+from . import test_report_pdf_converter
+from . import test_report_template_normalizer
+from . import test_report_query_count
+from . import test_report_memory
+from . import test_report_load
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.addons.odoo_dynamic_report.report.template_store import template_store
+
+
+def cleanup_template_store(case):
+    """Remove the compiled templates, parsed templates and previews stored during a test
+
+    Templates are compiled to the filestore on create, outside the test
+    transaction, so entries of the templates created by the test are
+    discarded once it ends. Call it from setUp after super().setUp(), so
+    the cleanup runs before the test transaction is rolled back.
+    """
+    Template = case.env['report.template'].with_context(active_test=False)
+    last_id = Template.search([], order='id desc', limit=1).id or 0
+
+    def cleanup():
+        template_ids = Template.search([('id', '>', last_id)]).ids
+        template_store.discard(case.env.cr.dbname, template_ids)
+        case.env['report.docx.generator']._discard_previews(template_ids)
+        case.env['report.docx.generator']._discard_parsed_templates(template_ids)
+
+    case.addCleanup(cleanup)
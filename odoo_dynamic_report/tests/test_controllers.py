@@ -2,7 +2,10 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo.tests import common, tagged
+from .common import cleanup_template_store
 from odoo import http
+from docx import Document
+from io import BytesIO
 import json
 
 
@@ -12,6 +15,7 @@ class TestReportControllers(common.HttpCase):
 
     def setUp(self):
         super(TestReportControllers, self).setUp()
+        cleanup_template_store(self)
         
         # Authenticate
         self.authenticate('admin', 'admin')
@@ -53,6 +57,29 @@ class TestReportControllers(common.HttpCase):
         self.assertIsInstance(result['result'], list)
         self.assertTrue(len(result['result']) > 0)
 
+    def test_get_model_fields_version(self):
+        """Test revalidating cached model fields with their version"""
+        url = '/report_template/get_model_fields'
+        data = {'params': {'model_name': 'res.partner', 'max_depth': 1}}
+        
+        response = self.url_open(url, data=json.dumps(data), headers={'Content-Type': 'application/json'})
+        result = response.json()['result']
+        self.assertTrue(result['fields'])
+        self.assertTrue(result['version'])
+        
+        # An up to date client does not download the fields again
+        data['params']['version'] = result['version']
+        response = self.url_open(url, data=json.dumps(data), headers={'Content-Type': 'application/json'})
+        revalidated = response.json()['result']
+        self.assertTrue(revalidated['not_modified'])
+        self.assertNotIn('fields', revalidated)
+        
+        # Field labels depend on the language
+        self.assertNotEqual(
+            self.env['report.parser'].with_context(lang='fr_FR').get_fields_version('res.partner', True, 1),
+            self.env['report.parser'].with_context(lang='en_US').get_fields_version('res.partner', True, 1),
+        )
+
     def test_validate_field_endpoint(self):
         """Test /report_template/validate_field endpoint"""
         url = '/report_template/validate_field'
@@ -105,6 +132,43 @@ class TestReportControllers(common.HttpCase):
         result = response.json()
         self.assertIn('result', result)
 
+    def test_upload_template_endpoint(self):
+        """Test /report_template/upload endpoint with a multipart file"""
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        output = BytesIO()
+        doc.save(output)
+        
+        response = self.url_open(
+            '/report_template/upload',
+            data={
+                'template_id': self.template.id,
+                'csrf_token': http.Request.csrf_token(self),
+            },
+            files={'ufile': ('upload.docx', output.getvalue())},
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertTrue(result['success'])
+        self.assertEqual(result['placeholders'], ['name'])
+        self.template.invalidate_recordset()
+        self.assertEqual(self.template.template_filename, 'upload.docx')
+        self.assertTrue(self.template.template_optimized)
+        
+        # Invalid files are rejected without being stored
+        response = self.url_open(
+            '/report_template/upload',
+            data={
+                'template_id': self.template.id,
+                'csrf_token': http.Request.csrf_token(self),
+            },
+            files={'ufile': ('broken.docx', b'not a docx')},
+        )
+        self.assertFalse(response.json()['success'])
+        self.template.invalidate_recordset()
+        self.assertEqual(self.template.template_filename, 'upload.docx')
+
     def test_download_template_endpoint(self):
         """Test /report_template/download endpoint"""
         url = f'/report_template/download/{self.template.id}'
@@ -2,6 +2,7 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo.tests import common, tagged
+from .common import cleanup_template_store
 from odoo.exceptions import UserError, ValidationError
 import base64
 
@@ -12,6 +13,7 @@ class TestReportIntegration(common.TransactionCase):
 
     def setUp(self):
         super(TestReportIntegration, self).setUp()
+        cleanup_template_store(self)
         
         # Create test data
         self.partner_model = self.env['ir.model'].search([
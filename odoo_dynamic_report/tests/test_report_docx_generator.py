@@ -2,8 +2,17 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo.tests import common, tagged
+from .common import cleanup_template_store
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
 from datetime import datetime, date
+from docx import Document
+from io import BytesIO
+from unittest.mock import patch
+from odoo.addons.odoo_dynamic_report.report import report_docx_generator
+from odoo.addons.odoo_dynamic_report.report.template_store import template_store
+import base64
+import zipfile
 import tempfile
 import os
 
@@ -14,6 +23,7 @@ class TestReportDocxGenerator(common.TransactionCase):
 
     def setUp(self):
         super(TestReportDocxGenerator, self).setUp()
+        cleanup_template_store(self)
         self.generator = self.env['report.docx.generator']
         
         # Create test partner
@@ -26,6 +36,32 @@ class TestReportDocxGenerator(common.TransactionCase):
             'zip': '12345',
         })
 
+    def _create_template(self, doc):
+        """Helper to create a partner template from a python-docx document"""
+        output = BytesIO()
+        doc.save(output)
+        partner_model = self.env['ir.model'].search([
+            ('model', '=', 'res.partner')
+        ], limit=1)
+        return self.env['report.template'].create({
+            'name': 'Generator Test Template',
+            'model_id': partner_model.id,
+            'template_data': base64.b64encode(output.getvalue()),
+            'template_filename': 'generator_test.docx',
+        })
+
+    def _touch(self, records):
+        """Move the last update of records forward, as a later transaction would
+
+        Records written in the test transaction all get its timestamp.
+        """
+        records.flush_recordset()
+        self.env.cr.execute(SQL(
+            "UPDATE %s SET write_date = write_date + interval '1 second' WHERE id IN %s",
+            SQL.identifier(records._table), tuple(records.ids),
+        ))
+        records.invalidate_recordset(['write_date'])
+
     def test_simple_field_replacement(self):
         """Test replacement of simple field placeholders"""
         template_content = "Name: {{name}}, Email: {{email}}"
@@ -266,3 +302,706 @@ class TestReportDocxGenerator(common.TransactionCase):
         self.assertNotIn('<strong>', result)
         self.assertIn('Test', result)
         self.assertIn('content', result)
+
+    def test_invariant_placeholder_detection(self):
+        """Test detection of placeholders shared by every record"""
+        values = {
+            'company_id.name': {1: 'My Company', 2: 'My Company'},
+            'name': {1: 'Partner 1', 2: 'Partner 2'},
+        }
+        
+        invariant = self.generator._get_invariant_placeholders(values)
+        
+        self.assertEqual(invariant, {'company_id.name'})
+
+    def test_invariant_header_rendered_once(self):
+        """Test that invariant headers are shared across records"""
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        doc.sections[0].header.paragraphs[0].text = 'Header: {{company_id.name}}'
+        template = self._create_template(doc)
+        
+        partner2 = self.partner.copy({'name': 'Second Partner'})
+        
+        result = self.generator.generate_report(template, [self.partner.id, partner2.id])
+        generated = Document(BytesIO(result))
+        
+        # A single section keeps one shared header part
+        self.assertEqual(len(generated.sections), 1)
+        self.assertIn(self.partner.company_id.name or '', generated.sections[0].header.paragraphs[0].text)
+        body_text = '\n'.join(p.text for p in generated.paragraphs)
+        self.assertIn('Test Partner', body_text)
+        self.assertIn('Second Partner', body_text)
+
+    def test_variant_header_per_record(self):
+        """Test that record-specific headers get a section per record"""
+        doc = Document()
+        doc.add_paragraph('Body')
+        doc.sections[0].header.paragraphs[0].text = 'Header: {{name}}'
+        template = self._create_template(doc)
+        
+        partner2 = self.partner.copy({'name': 'Second Partner'})
+        
+        result = self.generator.generate_report(template, [self.partner.id, partner2.id])
+        generated = Document(BytesIO(result))
+        
+        headers = [section.header.paragraphs[0].text for section in generated.sections]
+        self.assertEqual(headers, ['Header: Test Partner', 'Header: Second Partner'])
+
+    def test_image_placeholder_parsing(self):
+        """Test parsing of image placeholder sizes"""
+        parse = self.generator._parse_image_placeholder
+        
+        self.assertEqual(parse('image_1920|image:4cm'), ('image_1920', 1440000, None))
+        self.assertEqual(parse('image_1920|image:100pxx50px'), ('image_1920', 952500, 476250))
+        self.assertEqual(parse('image_1920|image'), ('image_1920', None, None))
+        self.assertIsNone(parse('name|upper'))
+        self.assertIsNone(parse('image_1920'))
+
+    def test_image_placeholder_shared_media(self):
+        """Test that the same image is embedded once for all records"""
+        from PIL import Image
+        
+        image = BytesIO()
+        Image.new('RGB', (400, 300), 'blue').save(image, 'PNG')
+        self.partner.image_1920 = base64.b64encode(image.getvalue())
+        partner2 = self.partner.copy({'name': 'Second Partner'})
+        partner2.image_1920 = self.partner.image_1920
+        
+        doc = Document()
+        doc.add_paragraph('{{name}} {{image_1920|image:4cm}}')
+        template = self._create_template(doc)
+        
+        result = self.generator.generate_report(template, [self.partner.id, partner2.id])
+        generated = Document(BytesIO(result))
+        
+        self.assertEqual(len(generated.inline_shapes), 2)
+        self.assertAlmostEqual(generated.inline_shapes[0].width.cm, 4.0, places=2)
+        image_parts = [
+            rel for rel in generated.part.rels.values()
+            if rel.reltype.endswith('/image')
+        ]
+        self.assertEqual(len(image_parts), 1)
+
+    def test_nested_loops(self):
+        """Test block loops containing table loops over a nested relation"""
+        company = self.env['res.partner'].create({
+            'name': 'Parent Company',
+            'is_company': True,
+            'child_ids': [
+                (0, 0, {'name': 'Contact A', 'child_ids': [
+                    (0, 0, {'name': 'Address A1'}),
+                    (0, 0, {'name': 'Address A2'}),
+                ]}),
+                (0, 0, {'name': 'Contact B'}),
+            ],
+        })
+        
+        doc = Document()
+        doc.add_paragraph('Company: {{name}}')
+        doc.add_paragraph('{{#child_ids}}')
+        doc.add_paragraph('Contact: {{name}}')
+        table = doc.add_table(rows=1, cols=1)
+        table.cell(0, 0).text = '{{#child_ids}}Address: {{name}}{{/child_ids}}'
+        doc.add_paragraph('{{/child_ids}}')
+        template = self._create_template(doc)
+        
+        tree = self.generator._collect_template_tree(doc)
+        self.assertEqual(tree['placeholders'], {'name'})
+        self.assertIn('child_ids', tree['loops']['child_ids']['loops'])
+        
+        result = self.generator.generate_report(template, [company.id])
+        generated = Document(BytesIO(result))
+        
+        paragraphs = [p.text for p in generated.paragraphs]
+        self.assertEqual(paragraphs, ['Company: Parent Company', 'Contact: Contact A', 'Contact: Contact B'])
+        
+        addresses = [
+            [cell.text for row in table.rows for cell in row.cells]
+            for table in generated.tables
+        ]
+        self.assertEqual(addresses, [['Address: Address A1', 'Address: Address A2'], []])
+
+    def test_nested_loops_same_level(self):
+        """Test loops of the same name nested in paragraphs and in a nested table"""
+        company = self.env['res.partner'].create({
+            'name': 'Parent Company',
+            'is_company': True,
+            'child_ids': [
+                (0, 0, {'name': 'Contact A', 'child_ids': [(0, 0, {'name': 'Address A1'})]}),
+                (0, 0, {'name': 'Contact B'}),
+            ],
+        })
+        
+        doc = Document()
+        for text in ('{{#child_ids}}', 'Contact: {{name}}', '{{#child_ids}}', 'Address: {{name}}',
+                     '{{/child_ids}}', '{{/child_ids}}'):
+            doc.add_paragraph(text)
+        # A row holding a nested table loop is not a row loop itself
+        cell = doc.add_table(rows=1, cols=1).cell(0, 0)
+        cell.text = 'Company: {{name}}'
+        cell.add_table(rows=1, cols=1).cell(0, 0).text = '{{#child_ids}}{{name}}{{/child_ids}}'
+        template = self._create_template(doc)
+        
+        tree = self.generator._collect_template_tree(doc)
+        self.assertIn('child_ids', tree['loops']['child_ids']['loops'])
+        
+        generated = Document(BytesIO(self.generator.generate_report(template, [company.id])))
+        self.assertEqual(
+            [p.text for p in generated.paragraphs if p.text],
+            ['Contact: Contact A', 'Address: Address A1', 'Contact: Contact B'],
+        )
+        outer = generated.tables[0]
+        self.assertEqual(len(outer.rows), 1)
+        self.assertEqual(outer.cell(0, 0).paragraphs[0].text, 'Company: Parent Company')
+        self.assertEqual(
+            [c.text for row in outer.cell(0, 0).tables[0].rows for c in row.cells],
+            ['Contact A', 'Contact B'],
+        )
+
+    def test_aggregate_placeholders(self):
+        """Test aggregates over a one2many computed for the whole batch"""
+        company = self.env['res.partner'].create({
+            'name': 'Aggregate Company',
+            'is_company': True,
+            'child_ids': [
+                (0, 0, {'name': 'Contact A', 'color': 2}),
+                (0, 0, {'name': 'Contact B', 'color': 5}),
+            ],
+        })
+        empty = self.env['res.partner'].create({'name': 'Empty Company', 'is_company': True})
+        
+        doc = Document()
+        doc.add_paragraph('{{name}}: {{count(child_ids)}} / {{sum(child_ids.color)}} / {{max(child_ids.color)}}')
+        template = self._create_template(doc)
+        
+        self.assertEqual(
+            self.generator._parse_aggregate('sum(child_ids.color)|number:.2f'),
+            ('sum', 'child_ids.color', 'number:.2f'),
+        )
+        self.assertIsNone(self.generator._parse_aggregate('child_ids.color'))
+        
+        result = self.generator.generate_report(template, [company.id, empty.id])
+        paragraphs = [p.text for p in Document(BytesIO(result)).paragraphs if p.text]
+        self.assertEqual(paragraphs, ['Aggregate Company: 2 / 7 / 5', 'Empty Company: 0 / 0 / '])
+
+    def test_grouped_loop(self):
+        """Test grouped loops with per-group aggregates"""
+        company = self.env['res.partner'].create({
+            'name': 'Grouped Company',
+            'is_company': True,
+            'child_ids': [
+                (0, 0, {'name': 'Alice', 'function': 'Sales', 'color': 1}),
+                (0, 0, {'name': 'Bob', 'function': 'Support', 'color': 2}),
+                (0, 0, {'name': 'Carol', 'function': 'Sales', 'color': 3}),
+            ],
+        })
+        
+        doc = Document()
+        doc.add_paragraph('{{#group child_ids by function}}')
+        doc.add_paragraph('{{key}}: {{count()}} / {{sum(color)}}')
+        doc.add_paragraph('{{#lines}}- {{name}}{{/lines}}')
+        doc.add_paragraph('{{/group}}')
+        template = self._create_template(doc)
+        
+        result = self.generator.generate_report(template, [company.id])
+        paragraphs = [p.text for p in Document(BytesIO(result)).paragraphs]
+        self.assertEqual(paragraphs, ['Sales: 2 / 4', '- Alice', '- Carol', 'Support: 1 / 2', '- Bob'])
+
+    def test_grouped_loop_modifiers(self):
+        """Test loops with modifiers over the lines of groups"""
+        companies = self.env['res.partner'].create([{
+            'name': 'Grouped Company',
+            'is_company': True,
+            'child_ids': [
+                (0, 0, {'name': 'Alice', 'function': 'Sales'}),
+                (0, 0, {'name': 'Bob', 'function': 'Support'}),
+                (0, 0, {'name': 'Carol', 'function': 'Sales'}),
+                (0, 0, {'name': 'Dave', 'function': 'Sales'}),
+            ],
+        }, {
+            'name': 'Other Company',
+            'is_company': True,
+            'child_ids': [(0, 0, {'name': 'Eve', 'function': 'Sales'})],
+        }])
+        
+        doc = Document()
+        doc.add_paragraph('{{#group child_ids by function}}')
+        doc.add_paragraph('{{key}}')
+        doc.add_paragraph('{{#lines|order:name desc|limit:2}}- {{name}}{{/lines}}')
+        doc.add_paragraph('{{/group}}')
+        template = self._create_template(doc)
+        
+        result = self.generator.generate_report(template, companies.ids)
+        paragraphs = [p.text for p in Document(BytesIO(result)).paragraphs if p.text]
+        self.assertEqual(paragraphs, ['Sales', '- Dave', '- Carol', 'Support', '- Bob', 'Sales', '- Eve'])
+
+    def test_grouped_loop_order(self):
+        """Test groups sorted by key whether they are read in SQL or Python"""
+        france, belgium, albania = self.env.ref('base.fr'), self.env.ref('base.be'), self.env.ref('base.al')
+        company = self.env['res.partner'].create({
+            'name': 'Grouped Company',
+            'is_company': True,
+            'child_ids': [
+                (0, 0, {'name': 'Alice', 'country_id': france.id}),
+                (0, 0, {'name': 'Bob', 'country_id': belgium.id}),
+                (0, 0, {'name': 'Carol', 'country_id': albania.id}),
+                (0, 0, {'name': 'Dave', 'country_id': france.id}),
+            ],
+        })
+        loop = 'group child_ids by country_id'
+        key = ('res.partner', company.id)
+        
+        sql_groups = self.generator._compute_groups(company, loop)[key]
+        with patch.object(type(self.generator), '_can_aggregate_in_sql', return_value=False):
+            python_groups = self.generator._compute_groups(company, loop)[key]
+        
+        for groups in (sql_groups, python_groups):
+            self.assertEqual([group.key for group in groups], [albania, belgium, france])
+            self.assertEqual(len({self.generator._value_key(group) for group in groups}), 3)
+        self.assertEqual([g.id for g in sql_groups], [g.id for g in python_groups])
+
+    def test_loop_modifiers(self):
+        """Test loops sorted, filtered and limited in the database"""
+        company = self.env['res.partner'].create({
+            'name': 'Modifier Company',
+            'is_company': True,
+            'child_ids': [
+                (0, 0, {'name': 'Alice', 'function': 'Sales'}),
+                (0, 0, {'name': 'Bob', 'function': 'Support'}),
+                (0, 0, {'name': 'Carol', 'function': 'Sales'}),
+                (0, 0, {'name': 'Dave', 'function': 'Sales'}),
+            ],
+        })
+        loop = "child_ids|order:name desc|where:function='Sales'|limit:2"
+        
+        self.assertEqual(
+            self.generator._parse_loop_modifiers(loop),
+            ('child_ids', [('function', '=', 'Sales')], 'name desc', 2),
+        )
+        self.assertEqual(self.generator._loop_close_name(loop), 'child_ids')
+        
+        doc = Document()
+        table = doc.add_table(rows=1, cols=1)
+        table.cell(0, 0).text = '{{#%s}}{{name}}{{/child_ids}}' % loop
+        template = self._create_template(doc)
+        
+        result = self.generator.generate_report(template, [company.id])
+        generated = Document(BytesIO(result))
+        self.assertEqual(
+            [cell.text for row in generated.tables[0].rows for cell in row.cells],
+            ['Dave', 'Carol'],
+        )
+        
+        # Pending changes are flushed before the lines are searched
+        company.child_ids.filtered(lambda child: child.name == 'Dave').function = 'Support'
+        related = self.generator._search_loop_records(company, loop)[('res.partner', company.id)]
+        self.assertEqual(related.mapped('name'), ['Carol', 'Alice'])
+
+    def test_iter_domain_ids(self):
+        """Test reading matching ids from a server-side cursor in chunks"""
+        partners = self.env['res.partner'].create([
+            {'name': f'Domain Partner {index}', 'function': 'Domain Test'}
+            for index in range(5)
+        ])
+        
+        chunks = list(self.generator._iter_domain_ids(
+            self.env['res.partner'], [('function', '=', 'Domain Test')], order='id', chunk_size=2
+        ))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual([rid for chunk in chunks for rid in chunk], partners.ids)
+        
+        # Pending changes are flushed before the cursor is declared
+        partners[0].function = 'Changed'
+        chunks = list(self.generator._iter_domain_ids(
+            self.env['res.partner'], [('function', '=', 'Domain Test')], order='id', chunk_size=2
+        ))
+        self.assertEqual([rid for chunk in chunks for rid in chunk], partners[1:].ids)
+
+    def test_generate_report_domain(self):
+        """Test generating a report for the records matching a domain"""
+        self.env['res.partner'].create([
+            {'name': 'Domain B', 'function': 'Domain Report'},
+            {'name': 'Domain A', 'function': 'Domain Report'},
+            {'name': 'Domain C', 'function': 'Domain Report'},
+        ])
+        
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        template = self._create_template(doc)
+        
+        result = self.generator.generate_report_domain(
+            template, [('function', '=', 'Domain Report')], order='name', limit=2
+        )
+        paragraphs = [p.text for p in Document(BytesIO(result)).paragraphs if p.text]
+        self.assertEqual(paragraphs, ['Name: Domain A', 'Name: Domain B'])
+        
+        with self.assertRaises(UserError):
+            self.generator.generate_report_domain(template, [('function', '=', 'No Such Function')])
+
+    def test_chunked_rendering(self):
+        """Test rendering records in chunks spilled to a temporary file"""
+        self.env['ir.config_parameter'].sudo().set_param('odoo_dynamic_report.chunk_size', 2)
+        partners = self.env['res.partner'].create([
+            {'name': f'Chunk Partner {index}'} for index in range(5)
+        ])
+        
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        table = doc.add_table(rows=1, cols=1)
+        table.cell(0, 0).text = '{{name}}'
+        doc.sections[0].footer.paragraphs[0].text = 'Footer {{name}}'
+        template = self._create_template(doc)
+        
+        result = self.generator.generate_report(template, partners.ids)
+        generated = Document(BytesIO(result))
+        
+        names = [f'Chunk Partner {index}' for index in range(5)]
+        self.assertEqual([p.text for p in generated.paragraphs if p.text], [f'Name: {name}' for name in names])
+        self.assertEqual([t.cell(0, 0).text for t in generated.tables], names)
+        self.assertEqual(
+            [s.footer.paragraphs[0].text for s in generated.sections],
+            [f'Footer {name}' for name in names],
+        )
+        
+        # The document is written to a given file instead of returned
+        with tempfile.TemporaryFile() as output:
+            self.assertIsNone(self.generator.generate_report(template, partners.ids, output))
+            output.seek(0)
+            streamed = Document(output)
+            self.assertEqual([p.text for p in streamed.paragraphs if p.text], [f'Name: {name}' for name in names])
+
+    def test_generate_report_zip(self):
+        """Test generating one document per record packed in a ZIP archive"""
+        partners = self.env['res.partner'].create([
+            {'name': 'Zip Partner'},
+            {'name': 'Zip/Partner'},
+            {'name': 'Zip Partner'},
+        ])
+        
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        template = self._create_template(doc)
+        template.filename_pattern = 'Letter {{name}}'
+        
+        result = self.generator.generate_report_zip(template, partners.ids)
+        with zipfile.ZipFile(BytesIO(result)) as archive:
+            self.assertEqual(
+                archive.namelist(),
+                ['Letter Zip Partner.docx', 'Letter Zip_Partner.docx', 'Letter Zip Partner (2).docx'],
+            )
+            texts = [
+                [p.text for p in Document(BytesIO(archive.read(name))).paragraphs]
+                for name in archive.namelist()
+            ]
+        self.assertEqual(texts, [['Name: Zip Partner'], ['Name: Zip/Partner'], ['Name: Zip Partner']])
+
+    def test_compiled_template_store(self):
+        """Test loading templates from the shared compiled store"""
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        template = self._create_template(doc)
+        checksum = template._get_template_checksum()
+        
+        # Compiled on upload
+        package, tree = template_store.get(self.env.cr.dbname, template.id, checksum)
+        self.assertEqual(tree['placeholders'], {'name'})
+        self.assertTrue(zipfile.is_zipfile(BytesIO(package)))
+        
+        # A worker loading the template does not collect the tree again
+        loaded = self.generator._load_template_document(template)
+        with patch.object(type(self.generator), '_collect_loops', side_effect=AssertionError):
+            self.assertEqual(self.generator._collect_template_tree(loaded)['placeholders'], {'name'})
+        
+        result = self.generator.generate_report(template, [self.partner.id])
+        self.assertEqual(Document(BytesIO(result)).paragraphs[0].text, 'Name: Test Partner')
+        
+        template.unlink()
+        self.assertIsNone(template_store.get(self.env.cr.dbname, template.id, checksum))
+
+    def test_parsed_template_cache(self):
+        """Test that renders fill copies of the template parsed once per process"""
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        template = self._create_template(doc)
+        self.assertTrue(template.template_checksum)
+        
+        # Neither read from the store nor parsed again
+        with patch.object(report_docx_generator, 'Document', wraps=Document) as parse, \
+                patch.object(template_store, 'get', side_effect=AssertionError):
+            first = self.generator._load_template_document(template)
+            second = self.generator._load_template_document(template)
+        parse.assert_not_called()
+        
+        first.paragraphs[0].text = 'Changed'
+        self.assertEqual(second.paragraphs[0].text, 'Name: {{name}}')
+        result = self.generator.generate_report(template, [self.partner.id])
+        self.assertEqual(Document(BytesIO(result)).paragraphs[0].text, 'Name: Test Partner')
+        
+        # A new file changes the checksum
+        checksum = template.template_checksum
+        doc = Document()
+        doc.add_paragraph('Email: {{email}}')
+        output = BytesIO()
+        doc.save(output)
+        template.write({'template_data': base64.b64encode(output.getvalue())})
+        self.assertNotEqual(template.template_checksum, checksum)
+        loaded = self.generator._load_template_document(template)
+        self.assertEqual(loaded.paragraphs[0].text, 'Email: {{email}}')
+
+    def test_warmup_templates(self):
+        """Test warming up recently used templates missing from the store"""
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        used, unused = self._create_template(doc), self._create_template(doc)
+        used.increment_usage()
+        dbname = self.env.cr.dbname
+        template_store.discard(dbname, (used | unused).ids)
+        
+        self.assertEqual(self.env['report.template']._warmup_templates(), 1)
+        self.assertTrue(template_store.contains(dbname, used.id, used._get_template_checksum()))
+        self.assertFalse(template_store.contains(dbname, unused.id, unused._get_template_checksum()))
+        
+        # Templates already compiled are skipped
+        self.assertEqual(self.env['report.template']._warmup_templates(), 0)
+
+    def test_trigger_warmup(self):
+        """Test that loading the registry adds a warm-up trigger only when none is pending"""
+        cron = self.env.ref('odoo_dynamic_report.ir_cron_report_template_warmup')
+        triggers = self.env['ir.cron.trigger'].sudo()
+        triggers.search([('cron_id', '=', cron.id)]).unlink()
+        
+        for _load in range(3):
+            self.env['report.template']._trigger_warmup()
+        self.assertEqual(triggers.search_count([('cron_id', '=', cron.id)]), 1)
+
+    def test_render_preview_html(self):
+        """Test rendering an inline HTML preview of a template"""
+        doc = Document()
+        doc.add_heading('Contact', 1)
+        doc.add_paragraph('Name: {{name}} <{{email}}>')
+        table = doc.add_table(rows=1, cols=2)
+        table.cell(0, 0).text = '{{city}}'
+        table.cell(0, 1).text = '{{zip}}'
+        template = self._create_template(doc)
+        
+        html = self.generator.render_preview_html(template, self.partner.id)
+        self.assertIn('<h1>Contact</h1>', html)
+        self.assertIn('Name: Test Partner &lt;test@example.com&gt;', html)
+        self.assertIn('<td><p>Test City</p></td><td><p>12345</p></td>', html)
+        
+        # The same record version is served from the cache
+        with patch.object(type(self.generator), '_fill_template_single', side_effect=AssertionError):
+            self.assertEqual(self.generator.render_preview_html(template, self.partner.id), html)
+
+    def test_render_preview_html_refresh(self):
+        """Test that cached previews are rendered again on refresh and template changes"""
+        child = self.env['res.partner'].create({'name': 'Child', 'parent_id': self.partner.id})
+        doc = Document()
+        doc.add_paragraph('{{#child_ids}}Contact: {{name}}{{/child_ids}}')
+        template = self._create_template(doc)
+        
+        self.assertIn('Contact: Child', self.generator.render_preview_html(template, self.partner.id))
+        
+        # Lines are not part of the cache key, the preview is refreshed on demand
+        child.write({'name': 'Renamed Child'})
+        self.assertIn('Contact: Child', self.generator.render_preview_html(template, self.partner.id))
+        self.assertIn('Contact: Renamed Child',
+                      self.generator.render_preview_html(template, self.partner.id, refresh=True))
+        
+        # Changing the template drops its previews
+        child.write({'name': 'Child Again'})
+        template.write({'name': 'Renamed Template'})
+        self.assertIn('Contact: Child Again', self.generator.render_preview_html(template, self.partner.id))
+
+    def test_preview_limits(self):
+        """Test that preview mode cuts loops and the body"""
+        self.env['res.partner'].create([
+            {'name': f'Contact {index}', 'parent_id': self.partner.id}
+            for index in range(5)
+        ])
+        doc = Document()
+        doc.add_paragraph('{{name}}')
+        table = doc.add_table(rows=1, cols=1)
+        table.cell(0, 0).text = '{{#child_ids|order:name}}{{name}}{{/child_ids}}'
+        for index in range(5):
+            doc.add_paragraph(f'Paragraph {index}')
+        template = self._create_template(doc)
+        
+        generator = self.generator._with_preview_limits(rows=2, blocks=3)
+        result = Document(BytesIO(generator.generate_report(template, [self.partner.id])))
+        self.assertEqual(
+            [row.cells[0].text for row in result.tables[0].rows],
+            ['Contact 0', 'Contact 1', '3 more lines not shown in preview'],
+        )
+        self.assertEqual(
+            [p.text for p in result.paragraphs],
+            ['Test Partner', 'Paragraph 0',
+             'Preview stops here, 4 more paragraphs and tables are not shown'],
+        )
+        
+        # Full rendering is unchanged
+        result = Document(BytesIO(self.generator.generate_report(template, [self.partner.id])))
+        self.assertEqual(len(result.tables[0].rows), 5)
+
+    def test_prerendered_document(self):
+        """Test pre-rendering documents when records change"""
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        template = self._create_template(doc)
+        name_field = self.env['ir.model.fields']._get('res.partner', 'name')
+        template.write({
+            'prerender_trigger': 'write',
+            'prerender_field_ids': [(6, 0, name_field.ids)],
+        })
+        Prerendered = self.env['report.prerendered.document']
+        
+        self.partner.write({'name': 'Prerendered Partner'})
+        document = Prerendered.search([('template_id', '=', template.id), ('res_id', '=', self.partner.id)])
+        self.assertEqual(document.state, 'pending')
+        self.assertFalse(template._get_prerendered(self.partner))
+        
+        Prerendered._process_pending()
+        self.assertEqual(document.state, 'done')
+        content = template._get_prerendered(self.partner)
+        self.assertEqual(Document(BytesIO(content)).paragraphs[0].text, 'Name: Prerendered Partner')
+        
+        # Writing an unrelated field does not queue the record again
+        self.partner.write({'phone': '+0987654321'})
+        self.assertEqual(document.state, 'done')
+        
+        self.partner.write({'name': 'Renamed Partner'})
+        self.assertEqual(document.state, 'pending')
+        self.assertFalse(template._get_prerendered(self.partner))
+
+    def test_prerendered_document_computed_field(self):
+        """Test pre-rendering when a stored computed field is recomputed"""
+        child = self.env['res.partner'].create({'name': 'Child', 'parent_id': self.partner.id})
+        doc = Document()
+        doc.add_paragraph('Name: {{complete_name}}')
+        template = self._create_template(doc)
+        complete_name_field = self.env['ir.model.fields']._get('res.partner', 'complete_name')
+        template.write({
+            'prerender_trigger': 'write',
+            'prerender_field_ids': [(6, 0, complete_name_field.ids)],
+        })
+        Prerendered = self.env['report.prerendered.document']
+        
+        # Renaming the parent recomputes the complete name of both partners
+        self.partner.write({'name': 'Renamed Parent'})
+        self.env.flush_all()
+        documents = Prerendered.search([('template_id', '=', template.id)])
+        self.assertEqual(set(documents.mapped('res_id')), {self.partner.id, child.id})
+        self.assertEqual(set(documents.mapped('state')), {'pending'})
+
+    def test_prerendered_document_freshness(self):
+        """Test that pre-rendered documents follow lines, users and failures"""
+        child = self.env['res.partner'].create({'name': 'Child', 'parent_id': self.partner.id})
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        doc.add_paragraph('{{#child_ids}}{{name}}{{/child_ids}}')
+        template = self._create_template(doc)
+        name_field = self.env['ir.model.fields']._get('res.partner', 'name')
+        template.write({
+            'prerender_trigger': 'write',
+            'prerender_field_ids': [(6, 0, name_field.ids)],
+        })
+        Prerendered = self.env['report.prerendered.document']
+
+        self.partner.write({'name': 'Prerendered Partner'})
+        Prerendered._process_pending()
+        self.assertTrue(template._get_prerendered(self.partner))
+
+        # Editing a line alone keeps the document until a trigger queues it
+        child.write({'name': 'Renamed Child'})
+        self._touch(child)
+        self.assertTrue(template._get_prerendered(self.partner))
+
+        # Any later update of the record itself makes the document stale
+        self._touch(self.partner)
+        self.assertFalse(template._get_prerendered(self.partner))
+
+        # Documents are only served to the user they were rendered as
+        self.partner.write({'name': 'Prerendered Again'})
+        Prerendered._process_pending()
+        user = self.env.ref('base.user_admin')
+        self.assertTrue(template._get_prerendered(self.partner))
+        self.assertFalse(template.with_user(user)._get_prerendered(self.partner.with_user(user)))
+
+        # Failed renderings are kept with their error
+        self.partner.write({'name': 'Failing Partner'})
+        with patch.object(type(self.generator), 'iter_record_reports', side_effect=ValueError('Broken')):
+            Prerendered._process_pending()
+        document = Prerendered.search([('template_id', '=', template.id), ('res_id', '=', self.partner.id)])
+        self.assertEqual(document.state, 'error')
+        self.assertIn('Broken', document.error)
+
+    def test_profile_report(self):
+        """Test attributing the rendering cost to placeholders and loops"""
+        self.env['res.partner'].create({'name': 'Contact', 'parent_id': self.partner.id})
+        doc = Document()
+        doc.add_paragraph('{{name}} {{country_id.name}}')
+        doc.add_paragraph('{{#child_ids}}{{name}}{{/child_ids}}')
+        template = self._create_template(doc)
+
+        costs = self.generator.profile_report(template, [self.partner.id])
+        by_path = {cost['path']: cost for cost in costs}
+        for path in ('(whole report)', 'name', 'country_id.name', '#child_ids', 'child_ids > name'):
+            self.assertIn(path, by_path)
+        self.assertEqual(costs[0]['path'], '(whole report)')
+        self.assertGreater(by_path['(whole report)']['query_count'], 0)
+
+        template.action_analyze_cost()
+        self.assertEqual(set(template.cost_ids.mapped('path')), set(by_path))
+
+    def test_generate_report_pack(self):
+        """Test rendering several templates from one prefetch"""
+        partners = self.env['res.partner'].create([
+            {'name': 'Pack A', 'ref': 'PA'},
+            {'name': 'Pack B', 'ref': 'PB'},
+        ])
+        
+        doc = Document()
+        doc.add_paragraph('Invoice {{name}}')
+        invoice = self._create_template(doc)
+        invoice.name = 'Invoice'
+        
+        doc = Document()
+        doc.add_paragraph('Delivery {{ref}}')
+        delivery = self._create_template(doc)
+        delivery.write({'name': 'Delivery', 'filename_pattern': '{{ref}}'})
+        
+        templates = invoice | delivery
+        result = self.generator.generate_report_pack(templates, partners.ids)
+        with zipfile.ZipFile(BytesIO(result)) as archive:
+            self.assertEqual(archive.namelist(), ['Invoice.docx', 'Delivery.docx'])
+            texts = [
+                [p.text for p in Document(BytesIO(archive.read(name))).paragraphs if p.text]
+                for name in archive.namelist()
+            ]
+        self.assertEqual(texts, [['Invoice Pack A', 'Invoice Pack B'], ['Delivery PA', 'Delivery PB']])
+        
+        result = self.generator.generate_report_pack(templates, partners.ids, output_mode='zip')
+        with zipfile.ZipFile(BytesIO(result)) as archive:
+            self.assertEqual(archive.namelist(), [
+                'Invoice/Pack A.docx', 'Delivery/PA.docx',
+                'Invoice/Pack B.docx', 'Delivery/PB.docx',
+            ])
+
+    def test_merged_cells(self):
+        """Test that merged cells are walked once from the table XML"""
+        doc = Document()
+        table = doc.add_table(rows=3, cols=3)
+        table.cell(0, 0).merge(table.cell(0, 2)).text = '{{name}} wide'
+        table.cell(1, 0).merge(table.cell(2, 0)).text = '{{email}}'
+        table.cell(1, 1).text = '{{phone}}'
+        
+        output = BytesIO()
+        doc.save(output)
+        placeholders = self.generator._extract_placeholders(base64.b64encode(output.getvalue()))
+        self.assertEqual(sorted(placeholders), ['email', 'name', 'phone'])
+        
+        self.generator._fill_template(doc, self.partner, None)
+        cells = [[cell.text for cell in row.cells] for row in doc.tables[0].rows]
+        self.assertEqual(cells[0], ['Test Partner wide'] * 3)
+        self.assertEqual(cells[1][:2], [self.partner.email, self.partner.phone])
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import common, tagged
+from .common import cleanup_template_store
+from concurrent.futures import ThreadPoolExecutor
+from docx import Document
+from io import BytesIO
+import base64
+import json
+import logging
+import threading
+import time
+
+import requests
+
+_logger = logging.getLogger(__name__)
+
+# Threads sending requests, and requests sent per endpoint
+LOAD_WORKERS = 8
+LOAD_REQUESTS = 40
+# Seconds allowed per request
+LOAD_TIMEOUT = 60
+# Share of failed requests tolerated
+MAX_ERROR_RATE = 0.0
+
+
+@tagged('post_install', '-at_install', '-standard', 'report_load')
+class TestReportLoad(common.HttpCase):
+    """Load harness for the report HTTP endpoints
+
+    Not part of the standard suite, run it with --test-tags report_load.
+    Requests are sent from a thread pool with the session of an
+    authenticated user; throughput, latency percentiles, and error and
+    serialization failure rates are logged per endpoint. The test server
+    runs every request in the test transaction one at a time, so figures
+    compare endpoints and changes with each other rather than measure the
+    capacity of a multi-worker deployment.
+    """
+
+    def setUp(self):
+        super(TestReportLoad, self).setUp()
+        cleanup_template_store(self)
+        self.authenticate('admin', 'admin')
+
+        self.partners = self.env['res.partner'].create([
+            {'name': f'Load Contact {index}', 'email': f'load{index}@example.com'}
+            for index in range(20)
+        ])
+        self.env['res.partner'].create([
+            {'name': f'Load Child {index}', 'parent_id': partner.id}
+            for partner in self.partners
+            for index in range(3)
+        ])
+
+        doc = Document()
+        doc.add_paragraph('{{name}} - {{email}}')
+        table = doc.add_table(rows=1, cols=2)
+        table.cell(0, 0).text = '{{#child_ids}}{{name}}'
+        table.cell(0, 1).text = '{{email}}{{/child_ids}}'
+        output = BytesIO()
+        doc.save(output)
+        self.template = self.env['report.template'].create({
+            'name': 'Load Template',
+            'model_id': self.env['ir.model']._get('res.partner').id,
+            'template_data': base64.b64encode(output.getvalue()),
+            'template_filename': 'load.docx',
+        })
+        # Requests read the test data from the database
+        self.env.flush_all()
+
+    def _json_request(self, url, params):
+        """Return the arguments of a JSON-RPC request"""
+        return 'POST', url, {
+            'data': json.dumps({'jsonrpc': '2.0', 'method': 'call', 'params': params}),
+            'headers': {'Content-Type': 'application/json'},
+        }
+
+    def _http_request(self, url, params):
+        """Return the arguments of a plain HTTP request"""
+        return 'GET', url, {'params': params}
+
+    def _check_response(self, response):
+        """Return None for a successful response, or its error message"""
+        if response.headers.get('Content-Type', '').startswith('application/json'):
+            result = response.json()
+            error = result.get('error') or (result.get('result') or {}).get('error')
+            if response.status_code != 200 or error:
+                return json.dumps(error) if not isinstance(error, str) else error
+            return None
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}"
+        return None
+
+    def _percentile(self, values, percent):
+        """Return the nearest-rank percentile of values"""
+        values = sorted(values)
+        return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+    def _run_load(self, label, make_request, count=LOAD_REQUESTS):
+        """Send count requests from LOAD_WORKERS threads and log their statistics
+
+        Args:
+            label: name of the scenario in the log
+            make_request: function of the request index returning the
+                (method, url, kwargs) of the request
+
+        Returns:
+            dict: throughput, latency percentiles in milliseconds, and
+            error and serialization failure rates
+        """
+        cookies = self.opener.cookies
+        sessions = threading.local()
+
+        def send(index):
+            if not hasattr(sessions, 'session'):
+                sessions.session = requests.Session()
+                sessions.session.cookies.update(cookies)
+            method, url, kwargs = make_request(index)
+            start = time.perf_counter()
+            try:
+                response = sessions.session.request(
+                    method, self.base_url() + url, timeout=LOAD_TIMEOUT, **kwargs
+                )
+                error = self._check_response(response)
+            except requests.RequestException as e:
+                error = str(e)
+            return time.perf_counter() - start, error
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+            results = list(executor.map(send, range(count)))
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency * 1000 for latency, _error in results]
+        errors = [error for _latency, error in results if error]
+        serialization = [error for error in errors if 'serializ' in error.lower()]
+        stats = {
+            'throughput': count / elapsed,
+            'p50': self._percentile(latencies, 50),
+            'p90': self._percentile(latencies, 90),
+            'p99': self._percentile(latencies, 99),
+            'error_rate': len(errors) / count,
+            'serialization_rate': len(serialization) / count,
+        }
+        _logger.info(
+            "%s: %s requests, %.1f req/s, p50 %.0f ms, p90 %.0f ms, p99 %.0f ms, "
+            "%.1f%% errors, %.1f%% serialization failures",
+            label, count, stats['throughput'], stats['p50'], stats['p90'], stats['p99'],
+            stats['error_rate'] * 100, stats['serialization_rate'] * 100,
+        )
+        for error in sorted(set(errors))[:5]:
+            _logger.warning("%s: %s", label, error)
+
+        self.assertLessEqual(stats['error_rate'], MAX_ERROR_RATE, f"{label} requests failed")
+        return stats
+
+    def _generate_request(self, index):
+        partner = self.partners[index % len(self.partners)]
+        return self._http_request('/report_template/generate', {
+            'template_id': self.template.id,
+            'record_ids': str(partner.id),
+        })
+
+    def _preview_request(self, index):
+        partner = self.partners[index % len(self.partners)]
+        return self._http_request('/report_template/preview', {
+            'template_id': self.template.id,
+            'record_id': partner.id,
+        })
+
+    def _model_fields_request(self, index):
+        return self._json_request('/report_template/get_model_fields', {
+            'model_name': 'res.partner',
+            'max_depth': 1,
+        })
+
+    def _parse_template_request(self, index):
+        return self._json_request('/report_template/parse_template', {
+            'template_id': self.template.id,
+        })
+
+    def test_load_generate(self):
+        """Test concurrent report generation"""
+        self._run_load('generate', self._generate_request)
+
+    def test_load_preview(self):
+        """Test concurrent previews"""
+        self._run_load('preview', self._preview_request)
+
+    def test_load_get_model_fields(self):
+        """Test concurrent model field requests"""
+        self._run_load('get_model_fields', self._model_fields_request)
+
+    def test_load_parse_template(self):
+        """Test concurrent template parsing"""
+        self._run_load('parse_template', self._parse_template_request)
+
+    def test_load_mixed(self):
+        """Test all endpoints at the same time"""
+        requests_by_index = (
+            self._generate_request,
+            self._preview_request,
+            self._model_fields_request,
+            self._parse_template_request,
+        )
+        self._run_load(
+            'mixed',
+            lambda index: requests_by_index[index % len(requests_by_index)](index),
+            count=LOAD_REQUESTS * len(requests_by_index),
+        )
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import common, tagged
+from .common import cleanup_template_store
+from odoo.addons.odoo_dynamic_report.report import report_docx_generator
+from odoo.addons.odoo_dynamic_report.report.image_cache import image_cache
+from docx import Document
+from docx.document import Document as DocumentObject
+from io import BytesIO
+import base64
+import gc
+import logging
+import tracemalloc
+
+_logger = logging.getLogger(__name__)
+
+# Runs of each scenario; memory still growing after the first run is a leak
+MEMORY_RUNS = 5
+# Growth of retained memory between the first and last run flagged as a leak
+LEAK_THRESHOLD = 512 * 1024
+# Frames kept per allocation and allocation sites logged for a leak
+TRACE_FRAMES = 10
+LEAK_TOP = 10
+
+
+@tagged('post_install', '-at_install', '-standard', 'report_memory')
+class TestReportMemory(common.TransactionCase):
+    """Memory harness for the generator and parser
+
+    Not part of the standard suite, run it with --test-tags report_memory.
+    Each scenario is run several times under tracemalloc: the peak and
+    retained memory of each are logged, and memory still retained by later
+    runs, Document objects left alive or growing caches fail the test with
+    the allocation sites responsible.
+    """
+
+    def setUp(self):
+        super(TestReportMemory, self).setUp()
+        cleanup_template_store(self)
+        self.generator = self.env['report.docx.generator']
+        self.parser = self.env['report.parser']
+        self.partners = self.env['res.partner'].create([
+            {'name': f'Memory Contact {index}', 'email': f'memory{index}@example.com'}
+            for index in range(100)
+        ])
+        self.env['res.partner'].create([
+            {'name': f'Memory Child {index}', 'parent_id': partner.id}
+            for partner in self.partners
+            for index in range(3)
+        ])
+        self.templates = {
+            'small': self._create_template(10),
+            'large': self._create_template(500),
+        }
+
+    def _create_template(self, paragraphs):
+        """Create a partner template with paragraphs and a table loop"""
+        doc = Document()
+        for index in range(paragraphs):
+            doc.add_paragraph(f'{index}: {{{{name}}}} {{{{email}}}} {{{{parent_id.name}}}}')
+        table = doc.add_table(rows=1, cols=2)
+        table.cell(0, 0).text = '{{#child_ids}}{{name}}'
+        table.cell(0, 1).text = '{{email}}{{/child_ids}}'
+        output = BytesIO()
+        doc.save(output)
+        return self.env['report.template'].create({
+            'name': f'Memory Template {paragraphs}',
+            'model_id': self.env['ir.model']._get('res.partner').id,
+            'template_data': base64.b64encode(output.getvalue()),
+            'template_filename': f'memory_{paragraphs}.docx',
+        })
+
+    def _count_documents(self):
+        """Return the number of python-docx documents alive, besides the parsed templates"""
+        gc.collect()
+        documents = sum(1 for obj in gc.get_objects() if isinstance(obj, DocumentObject))
+        return documents - len(report_docx_generator.parsed_templates)
+
+    def _profile(self, label, func):
+        """Run func MEMORY_RUNS times and check its memory is released
+
+        Returns:
+            dict: peak and retained memory of each run, and growth of
+            retained memory since the first run, in bytes
+        """
+        documents = self._count_documents()
+        trees = len(report_docx_generator._document_trees)
+
+        tracemalloc.start(TRACE_FRAMES)
+        try:
+            gc.collect()
+            start = tracemalloc.get_traced_memory()[0]
+            peaks, retained, first = [], [], None
+            for _run in range(MEMORY_RUNS):
+                self.env.invalidate_all()
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                func()
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+                gc.collect()
+                retained.append(tracemalloc.get_traced_memory()[0] - start)
+                if first is None:
+                    first = tracemalloc.take_snapshot()
+            growth = retained[-1] - retained[0]
+
+            _logger.info(
+                "%s: peak %.1f KiB, retained %.1f KiB after the first run, "
+                "%+.1f KiB after %s runs",
+                label, max(peaks) / 1024, retained[0] / 1024, growth / 1024, MEMORY_RUNS,
+            )
+            if growth > LEAK_THRESHOLD:
+                stats = tracemalloc.take_snapshot().compare_to(first, 'traceback')
+                for stat in stats[:LEAK_TOP]:
+                    _logger.warning("%s: %s\n%s", label, stat, '\n'.join(stat.traceback.format()))
+        finally:
+            tracemalloc.stop()
+
+        self.assertLessEqual(growth, LEAK_THRESHOLD, f"{label} keeps memory between runs")
+        self.assertEqual(self._count_documents(), documents, f"{label} leaves documents alive")
+        self.assertEqual(len(report_docx_generator._document_trees), trees,
+                         f"{label} leaves compiled trees alive")
+        self.assertLessEqual(image_cache._size, image_cache.max_bytes)
+        parsed_templates = report_docx_generator.parsed_templates
+        self.assertLessEqual(parsed_templates._size, parsed_templates.max_bytes)
+        return {'peaks': peaks, 'retained': retained, 'growth': growth}
+
+    def test_generate_report_memory(self):
+        """Test memory of generate_report by template size and record count"""
+        for size, template in self.templates.items():
+            for count in (1, 10, 100):
+                records = self.partners[:count]
+                self._profile(
+                    f"generate_report {size} template, {count} records",
+                    lambda: self.generator.generate_report(template, records.ids),
+                )
+
+    def test_parse_template_memory(self):
+        """Test memory of ReportParser.parse_template by template size"""
+        for size, template in self.templates.items():
+            self._profile(
+                f"parse_template {size} template",
+                lambda: self.parser.parse_template(template.template_data),
+            )
+
+    def test_extract_placeholders_memory(self):
+        """Test memory of _extract_placeholders by template size"""
+        for size, template in self.templates.items():
+            self._profile(
+                f"_extract_placeholders {size} template",
+                lambda: self.generator._extract_placeholders(template.template_data),
+            )
@@ -3,6 +3,7 @@
 
 from odoo.tests import common, tagged
 from odoo.exceptions import ValidationError
+from unittest.mock import patch
 import tempfile
 import os
 from docx import Document
@@ -225,3 +226,74 @@ class TestReportParser(common.TransactionCase):
             self.assertEqual(name_count, 1)
         finally:
             os.unlink(test_file)
+
+    def test_estimate_cost(self):
+        """Test the static cost estimate of a loop tree"""
+        self.env['ir.config_parameter'].sudo().set_param('odoo_dynamic_report.lint_max_hops', 1)
+        tree = {
+            'placeholders': {'name', 'parent_id.country_id.name', 'contact_address', 'missing_field'},
+            'loops': {
+                'child_ids|order:comment': {
+                    'placeholders': {'name', 'country_id.name'},
+                    'loops': {},
+                },
+            },
+        }
+        
+        # The contact address is formatted from the country of the partner
+        contact_address = self.env['res.partner']._fields['contact_address']
+        with patch.dict(self.env.registry.field_depends, {contact_address: ('country_id.address_format',)}):
+            estimate = self.parser.estimate_cost('res.partner', tree)
+        # Record, parent, parent country, contact address, lines, line countries
+        self.assertEqual(estimate['queries_per_record'], 6)
+        self.assertEqual(estimate['max_hops'], 2)
+        self.assertEqual(estimate['max_fanout'], 1)
+        
+        warnings = '\n'.join(estimate['warnings'])
+        self.assertIn('parent_id.country_id.name: 2 relational hops', warnings)
+        self.assertIn('res.partner.contact_address is a non-stored computed field', warnings)
+        self.assertIn("field 'missing_field' does not exist", warnings)
+        self.assertIn('sort field res.partner.comment is not indexed', warnings)
+        
+        with self.assertRaises(ValidationError):
+            self.parser.estimate_cost('non.existent.model', tree)
+
+    def test_estimate_cost_aggregates(self):
+        """Test that aggregates cost one grouped query per relation"""
+        tree = {
+            'placeholders': {'count(child_ids)', 'sum(child_ids.color)', 'max(child_ids.color)'},
+            'loops': {},
+        }
+        estimate = self.parser.estimate_cost('res.partner', tree)
+        # Record, lines grouped by parent
+        self.assertEqual(estimate['queries_per_record'], 2)
+        self.assertEqual(estimate['max_fanout'], 0)
+        self.assertFalse(estimate['warnings'])
+
+    def test_analyze_table_loops(self):
+        """Test that tables with loop modifiers or grouped loops have loops"""
+        doc = Document()
+        for loop in ('child_ids|limit:5', 'group child_ids by country_id'):
+            table = doc.add_table(rows=1, cols=1)
+            table.cell(0, 0).text = '{{#%s}}{{name}}{{/%s}}' % (loop, loop)
+        
+        structure = self.parser._analyze_document(doc)
+        self.assertEqual([table['has_loop'] for table in structure['tables']], [True, True])
+
+    def test_estimate_cost_computed_fields(self):
+        """Test that only computed fields reading other records are flagged"""
+        tree = {'placeholders': {'display_name', 'name', 'partner_id.name'}, 'loops': {}}
+        
+        # Related and computed from the record itself
+        estimate = self.parser.estimate_cost('res.users', tree)
+        self.assertFalse(estimate['warnings'])
+        
+        tree = {'placeholders': {'display_name', 'company_type', 'parent_id.name'}, 'loops': {}}
+        estimate = self.parser.estimate_cost('res.partner', tree)
+        self.assertFalse(estimate['warnings'])
+        
+        # Computed without dependencies
+        company_type = self.env['res.partner']._fields['company_type']
+        with patch.dict(self.env.registry.field_depends, {company_type: ()}):
+            estimate = self.parser.estimate_cost('res.partner', tree)
+        self.assertIn('res.partner.company_type is a non-stored computed field', '\n'.join(estimate['warnings']))
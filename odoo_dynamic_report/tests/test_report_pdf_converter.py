@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import common, tagged
+from .common import cleanup_template_store
+from odoo.exceptions import UserError
+from odoo.addons.odoo_dynamic_report.report import report_pdf_converter
+from odoo.addons.odoo_dynamic_report.report.report_pdf_converter import OfficeError, OfficeTimeout
+from docx import Document
+from io import BytesIO
+from unittest.mock import patch
+import base64
+import shutil
+import unittest
+
+
+class FakeOfficeProcess:
+    """Office process recording its calls, converting with a given function"""
+
+    def __init__(self, binary):
+        self.calls = []
+        self.alive = False
+        self.closed = False
+
+    def start(self):
+        self.calls.append('start')
+        self.alive = True
+
+    def stop(self):
+        self.calls.append('stop')
+        self.alive = False
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    def is_alive(self):
+        return self.alive
+
+    def convert(self, paths, output_dir, timeout):
+        self.calls.append('convert')
+        self.timeout = timeout
+        raise self.error
+
+
+@tagged('post_install', '-at_install')
+class TestReportPdfConverter(common.TransactionCase):
+    """Test suite for the DOCX to PDF conversion pool"""
+
+    def setUp(self):
+        super(TestReportPdfConverter, self).setUp()
+        cleanup_template_store(self)
+        self.converter = self.env['report.pdf.converter']
+
+    def _create_docx(self, text):
+        """Helper to create a DOCX file with a single paragraph"""
+        doc = Document()
+        doc.add_paragraph(text)
+        output = BytesIO()
+        doc.save(output)
+        return output.getvalue()
+
+    def test_empty_batch(self):
+        """Test that an empty batch does not start the pool"""
+        self.assertEqual(self.converter.convert([]), [])
+
+    def test_missing_office_binary(self):
+        """Test error when LibreOffice is not available"""
+        self.env['ir.config_parameter'].sudo().set_param(
+            'odoo_dynamic_report.soffice_binary', '/nonexistent/soffice'
+        )
+        
+        with self.assertRaises(UserError):
+            self.converter.convert([self._create_docx('Test')])
+
+    @unittest.skipUnless(shutil.which('soffice'), "LibreOffice is not installed")
+    def test_batch_conversion(self):
+        """Test conversion of several documents in one call"""
+        documents = [self._create_docx(f'Document {i}') for i in range(3)]
+        
+        pdfs = self.converter.convert(documents)
+        
+        self.assertEqual(len(pdfs), 3)
+        for pdf in pdfs:
+            self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def _create_pool(self, error):
+        """Return a pool of one fake process failing with error"""
+        with patch.object(report_pdf_converter, 'OfficeProcess', FakeOfficeProcess):
+            pool = report_pdf_converter.OfficePool('soffice', 1)
+        process = pool._processes[0]
+        process.error = error
+        return pool, process
+
+    def test_timeout_not_retried(self):
+        """Test that a timed out batch stops its process and fails at once"""
+        pool, process = self._create_pool(OfficeTimeout("Conversion timed out after 5s"))
+        with self.assertRaises(OfficeTimeout):
+            pool.convert([self._create_docx('Test')], 5)
+        self.assertEqual(process.calls, ['start', 'convert', 'stop'])
+        
+        # The process is started again on next use
+        with self.assertRaises(OfficeTimeout):
+            pool.convert([self._create_docx('Test')], 5)
+        self.assertEqual(process.calls[-3:], ['start', 'convert', 'stop'])
+
+    def test_single_deadline(self):
+        """Test that waiting for a free process counts against the batch timeout"""
+        pool, process = self._create_pool(OfficeTimeout("Conversion timed out after 5s"))
+        with self.assertRaises(OfficeTimeout):
+            pool.convert([self._create_docx('Test')], 5)
+        self.assertLessEqual(process.timeout, 5)
+        
+        # All processes busy: the batch times out without converting
+        busy = pool._idle.get()
+        with self.assertRaises(OfficeTimeout):
+            pool.convert([self._create_docx('Test')], 0.1)
+        pool._release(busy)
+        self.assertEqual(process.calls.count('convert'), 1)
+
+    def test_failure_retried(self):
+        """Test that a failed batch is retried once on a restarted process"""
+        pool, process = self._create_pool(OfficeError("Crashed"))
+        with self.assertRaises(OfficeError):
+            pool.convert([self._create_docx('Test')], 5)
+        self.assertEqual(process.calls, ['start', 'convert', 'stop', 'start', 'convert'])
+
+    def test_pool_resize(self):
+        """Test that a pool of another size replaces and closes the old one"""
+        with patch.object(report_pdf_converter, 'OfficeProcess', FakeOfficeProcess), \
+                patch.dict(report_pdf_converter._pools, clear=True):
+            pool = report_pdf_converter.get_pool('soffice', 1)
+            self.assertIs(report_pdf_converter.get_pool('soffice', 1), pool)
+            
+            resized = report_pdf_converter.get_pool('soffice', 2)
+            self.assertIsNot(resized, pool)
+            self.assertEqual(len(resized._processes), 2)
+            self.assertTrue(all(process.closed for process in pool._processes))
+            self.assertFalse(any(process.closed for process in resized._processes))
+
+    def test_print_several_records(self):
+        """Test that printing several records converts their documents as a batch"""
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        output = BytesIO()
+        doc.save(output)
+        template = self.env['report.template'].create({
+            'name': 'PDF Template',
+            'model_id': self.env['ir.model']._get('res.partner').id,
+            'template_data': base64.b64encode(output.getvalue()),
+            'template_filename': 'pdf.docx',
+            'output_format': 'pdf',
+        })
+        partners = self.env['res.partner'].create([{'name': f'PDF Partner {i}'} for i in range(3)])
+        
+        def convert(documents):
+            return [f'%PDF {Document(BytesIO(content)).paragraphs[0].text}'.encode() for content in documents]
+        
+        with patch.object(type(self.converter), 'convert', side_effect=convert) as mock_convert, \
+                patch('odoo.addons.odoo_dynamic_report.models.ir_actions_report.merge_pdf', side_effect=b'|'.join):
+            result = self.env['ir.actions.report']._render_docx_template_pdf(template, partners.ids)
+        
+        mock_convert.assert_called_once()
+        self.assertEqual(
+            result,
+            b'%PDF Name: PDF Partner 0|%PDF Name: PDF Partner 1|%PDF Name: PDF Partner 2',
+        )
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import common, tagged
+from .common import cleanup_template_store
+from docx import Document
+from io import BytesIO
+import base64
+
+# Queries allowed to render a report, whatever its number of records
+QUERY_BUDGET = 25
+# Queries a large print may run on top of a small one, e.g. an extra
+# prefetch batch, far below one query per record
+SCALE_SLACK = 2
+
+
+@tagged('post_install', '-at_install')
+class TestReportQueryCount(common.TransactionCase):
+    """Query budgets of report rendering, to catch per-record queries"""
+
+    def setUp(self):
+        super(TestReportQueryCount, self).setUp()
+        cleanup_template_store(self)
+        self.generator = self.env['report.docx.generator']
+        # Render every print below in a single chunk
+        self.env['ir.config_parameter'].sudo().set_param('odoo_dynamic_report.chunk_size', 1000)
+
+        countries = self.env['res.country'].search([], limit=3)
+        self.companies = self.env['res.partner'].create([
+            {'name': f'Company {index}', 'is_company': True, 'country_id': countries[index % len(countries)].id}
+            for index in range(10)
+        ])
+        self.tags = self.env['res.partner.category'].create([
+            {'name': f'Tag {index}'} for index in range(3)
+        ])
+
+        doc = Document()
+        doc.add_paragraph('{{name}} - {{email}}')
+        doc.add_paragraph('{{parent_id.name}} ({{parent_id.country_id.name}})')
+        doc.add_paragraph('{{country_id.code}}')
+        table = doc.add_table(rows=1, cols=2)
+        table.cell(0, 0).text = '{{#category_id}}{{name}}'
+        table.cell(0, 1).text = '{{color}}{{/category_id}}'
+        output = BytesIO()
+        doc.save(output)
+        self.template = self.env['report.template'].create({
+            'name': 'Query Count Template',
+            'model_id': self.env['ir.model']._get('res.partner').id,
+            'template_data': base64.b64encode(output.getvalue()),
+            'template_filename': 'query_count.docx',
+        })
+
+    def _create_partners(self, count):
+        """Create contacts of the test companies, with tags"""
+        return self.env['res.partner'].create([
+            {
+                'name': f'Contact {index}',
+                'email': f'contact{index}@example.com',
+                'parent_id': self.companies[index % len(self.companies)].id,
+                'category_id': [(6, 0, self.tags[:index % len(self.tags) + 1].ids)],
+            }
+            for index in range(count)
+        ])
+
+    def _count_queries(self, partners):
+        """Return the number of queries to render partners"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        count = self.cr.sql_log_count
+        self.generator.generate_report(self.template, partners.ids)
+        return self.cr.sql_log_count - count
+
+    def _assert_budget(self, count):
+        """Render count records within the query budget"""
+        partners = self._create_partners(count)
+        # Compile the template outside of the measured rendering
+        self._count_queries(partners[:1])
+
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(QUERY_BUDGET):
+            content = self.generator.generate_report(self.template, partners.ids)
+
+        result = Document(BytesIO(content))
+        self.assertEqual(len(result.tables), count)
+        self.assertEqual(result.paragraphs[0].text, 'Contact 0 - contact0@example.com')
+
+    def test_query_budget_1_record(self):
+        """Test rendering 1 record within the query budget"""
+        self._assert_budget(1)
+
+    def test_query_budget_10_records(self):
+        """Test rendering 10 records within the query budget"""
+        self._assert_budget(10)
+
+    def test_query_budget_100_records(self):
+        """Test rendering 100 records within the query budget"""
+        self._assert_budget(100)
+
+    def test_query_budget_1000_records(self):
+        """Test rendering 1,000 records within the query budget"""
+        self._assert_budget(1000)
+
+    def test_queries_independent_of_record_count(self):
+        """Test that 1,000 records take as many queries as 10"""
+        partners = self._create_partners(1000)
+        self._count_queries(partners[:1])
+
+        small = self._count_queries(partners[:10])
+        large = self._count_queries(partners)
+        self.assertLessEqual(large, small + SCALE_SLACK)
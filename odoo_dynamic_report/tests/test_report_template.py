@@ -2,7 +2,14 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo.tests import common, tagged
+from .common import cleanup_template_store
 from odoo.exceptions import ValidationError, UserError
+from odoo.addons.odoo_dynamic_report.models import report_template
+from odoo.addons.odoo_dynamic_report.report import report_docx_generator
+from docx import Document
+from io import BytesIO
+import base64
+from unittest.mock import patch
 
 
 @tagged('post_install', '-at_install')
@@ -11,6 +18,7 @@ class TestReportTemplate(common.TransactionCase):
 
     def setUp(self):
         super(TestReportTemplate, self).setUp()
+        cleanup_template_store(self)
         
         # Create test model reference
         self.partner_model = self.env['ir.model'].search([
@@ -91,6 +99,31 @@ class TestReportTemplate(common.TransactionCase):
         self.assertTrue(self.template.template_file)
         self.assertEqual(self.template.template_filename, 'test_template.docx')
 
+    def test_template_validation(self):
+        """Test that invalid template files are always rejected"""
+        import base64
+        for template in (self.template, self.template.with_context(report_template_validated=True)):
+            with self.assertRaises(ValidationError):
+                template.write({'template_data': base64.b64encode(b'Not a DOCX file')})
+
+    def test_upload_parses_once(self):
+        """Test that an uploaded file is parsed a single time"""
+        doc = Document()
+        doc.add_paragraph('Name: {{name}}')
+        output = BytesIO()
+        doc.save(output)
+        output.seek(0)
+        
+        with patch.object(report_template, 'Document', wraps=Document) as parse_model, \
+                patch.object(report_docx_generator, 'Document', wraps=Document) as parse_generator:
+            result = self.template._upload_template_file(output, 'upload.docx')
+        
+        self.assertEqual(parse_model.call_count + parse_generator.call_count, 1)
+        self.assertIn('name', result['placeholders'])
+        self.assertTrue(self.template.template_optimized)
+        self.assertEqual(base64.b64decode(self.template.template_data), output.getvalue())
+        self.assertEqual(self.template.template_filename, 'upload.docx')
+
     def test_parse_template_action(self):
         """Test parse template action"""
         # This would require actual DOCX content with placeholders
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import common, tagged
+from .common import cleanup_template_store
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from io import BytesIO
+import base64
+import zipfile
+
+
+@tagged('post_install', '-at_install')
+class TestReportTemplateNormalizer(common.TransactionCase):
+    """Test suite for the upload-time template normalizer"""
+
+    def setUp(self):
+        super(TestReportTemplateNormalizer, self).setUp()
+        cleanup_template_store(self)
+        self.normalizer = self.env['report.template.normalizer']
+
+    def _create_split_template(self):
+        """Helper to create a DOCX with a placeholder split across noisy runs"""
+        doc = Document()
+        paragraph = doc.add_paragraph()
+        for text in ['Name: {{', 'na', 'me}} ', 'Bold']:
+            paragraph.add_run(text)
+        paragraph.runs[3].bold = True
+        
+        proof_error = OxmlElement('w:proofErr')
+        proof_error.set(qn('w:type'), 'spellStart')
+        paragraph.runs[1]._r.addprevious(proof_error)
+        paragraph.runs[0]._r.set(qn('w:rsidR'), '00A1B2C3')
+        paragraph.runs[2]._r.insert(0, OxmlElement('w:lastRenderedPageBreak'))
+        
+        output = BytesIO()
+        doc.save(output)
+        return base64.b64encode(output.getvalue())
+
+    def _normalize(self, template_data):
+        """Helper to return the normalized DOCX content of a base64 template"""
+        doc = Document(BytesIO(base64.b64decode(template_data)))
+        self.normalizer.normalize_document(doc)
+        output = BytesIO()
+        doc.save(output)
+        return output.getvalue()
+
+    def test_merge_runs(self):
+        """Test that runs with the same formatting are merged"""
+        result = self._normalize(self._create_split_template())
+        
+        runs = Document(BytesIO(result)).paragraphs[0].runs
+        self.assertEqual([run.text for run in runs], ['Name: {{name}} ', 'Bold'])
+        self.assertEqual([run.bold for run in runs], [None, True])
+
+    def test_strip_noise(self):
+        """Test that proofing marks, rendering hints and revision ids are removed"""
+        result = self._normalize(self._create_split_template())
+        
+        with zipfile.ZipFile(BytesIO(result)) as archive:
+            xml = archive.read('word/document.xml')
+        self.assertNotIn(b'proofErr', xml)
+        self.assertNotIn(b'lastRenderedPageBreak', xml)
+        self.assertNotIn(b'w:rsid', xml)
+
+    def test_normalized_on_upload(self):
+        """Test that templates store and render their normalized copy"""
+        partner_model = self.env['ir.model'].search([('model', '=', 'res.partner')], limit=1)
+        template = self.env['report.template'].create({
+            'name': 'Normalized Template',
+            'model_id': partner_model.id,
+            'template_data': self._create_split_template(),
+        })
+        self.assertTrue(template.template_optimized)
+        
+        partner = self.env['res.partner'].create({'name': 'Normalized Partner'})
+        result = self.env['report.docx.generator'].generate_report(template, [partner.id])
+        self.assertEqual(Document(BytesIO(result)).paragraphs[0].text, 'Name: Normalized Partner Bold')
+        
+        template.template_data = False
+        self.assertFalse(template.template_optimized)
@@ -2,3 +2,4 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from . import report_preview_wizard
+from . import report_bulk_print_wizard
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+import ast
+
+
+class ReportBulkPrintWizard(models.TransientModel):
+    _name = 'report.bulk.print.wizard'
+    _description = 'Report Bulk Print Wizard'
+
+    template_id = fields.Many2one(
+        'report.template',
+        string='Template',
+        required=True,
+        readonly=True
+    )
+    
+    model_name = fields.Char(
+        related='template_id.model_name',
+        string='Model Name',
+        readonly=True
+    )
+    
+    domain = fields.Char(
+        string='Records',
+        default='[]',
+        help="Domain selecting the records to print"
+    )
+    
+    order = fields.Char(
+        string='Order',
+        help="Order of the printed records, e.g. 'date desc, id'"
+    )
+    
+    limit = fields.Integer(
+        string='Limit',
+        help="Maximum number of records to print, 0 for all"
+    )
+    
+    record_count = fields.Integer(
+        string='Matching Records',
+        compute='_compute_record_count'
+    )
+
+    @api.depends('template_id', 'domain', 'limit')
+    def _compute_record_count(self):
+        for wizard in self:
+            try:
+                count = self.env[wizard.model_name].search_count(wizard._get_domain())
+            except (KeyError, ValueError, SyntaxError):
+                count = 0
+            wizard.record_count = min(count, wizard.limit) if wizard.limit else count
+
+    def _get_domain(self):
+        """Return the domain as a list"""
+        self.ensure_one()
+        
+        domain = ast.literal_eval(self.domain or '[]')
+        if not isinstance(domain, list):
+            raise ValueError(f"Invalid domain: {self.domain}")
+        return domain
+
+    def action_print(self):
+        """Generate and download the report of the matching records"""
+        self.ensure_one()
+        
+        try:
+            self._get_domain()
+        except (ValueError, SyntaxError):
+            raise UserError(_("The domain is not valid"))
+        
+        if not self.record_count:
+            raise UserError(_("No records match the domain"))
+        
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/report_template/generate_domain?wizard_id={self.id}',
+            'target': 'self',
+        }